@@ -0,0 +1,462 @@
+"""
+近似最近邻（ANN）索引模块 - 基于 NumPy 的 IVF 倒排索引，用于大规模卡组的相关条目查询
+
+索引持久化在数据库文件旁边的目录中（例如 german_learning.db -> german_learning.ann/）：
+- vectors.npy  归一化后的 float32 向量（内存映射，增量写入单行）
+- meta.npz     条目 id、所属聚类、聚类中心和参数（包括 nprobe）的快照
+- delta.log    快照之后的增删记录，增量更新只追加一条记录，累积到一定数量后合并进快照
+
+app 在索引目录存在时自动启用（见 open_index），小卡组不需要建索引。
+
+用法（重建索引）：
+    python ann_index.py rebuild --db german_learning.db --lists 256 --nprobe 8
+    python ann_index.py rebuild --backend supabase
+"""
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_INDEX_PATH = "german_learning.ann"
+DEFAULT_NPROBE = 8
+# 增量记录超过 max(COMPACT_MIN_RECORDS, 条目数 / 4) 条时重写快照
+COMPACT_MIN_RECORDS = 1024
+# 增量记录：条目 id、行号、所属聚类（-1 表示删除）
+_DELTA_DTYPE = [("id", "<i8"), ("row", "<i8"), ("list", "<i4")]
+
+
+def index_path_for(db_path: str) -> str:
+    """返回数据库文件对应的索引目录路径"""
+    base, _ = os.path.splitext(db_path)
+    return base + ".ann"
+
+
+def open_index(path: str, embedding_manager=None, nprobe: Optional[int] = None) -> Optional["IVFIndex"]:
+    """
+    打开已构建的索引，索引不存在或 numpy 不可用时返回 None
+
+    索引由 `python ann_index.py rebuild` 创建；之后数据库的增删改会增量维护它
+    """
+    if not os.path.exists(os.path.join(path, "meta.npz")):
+        return None
+    if embedding_manager is None:
+        import model_registry
+        embedding_manager = model_registry.get_embedding_manager()
+    try:
+        return IVFIndex(path, embedding_manager=embedding_manager, nprobe=nprobe)
+    except ImportError:
+        return None
+
+
+class IVFIndex:
+    """
+    IVF（倒排文件）近似最近邻索引
+
+    - 用球面 k-means 将向量划分为 n_lists 个聚类
+    - 查询时只扫描与查询最接近的 nprobe 个聚类
+    - nprobe 是召回率与延迟之间的调节旋钮：越大越准确，越小越快；
+      随索引保存，未显式传入时使用上次保存的值
+    - add/update/delete 只改动单行并追加一条增量记录，不需要整体重建
+    """
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, embedding_manager=None,
+                 nprobe: Optional[int] = None):
+        self.path = path
+        self.embedding_manager = embedding_manager
+        self.nprobe = DEFAULT_NPROBE
+        self._lock = threading.RLock()
+        self._delta_records = 0
+        self._reset()
+        self.load()
+        if nprobe is not None:
+            self.nprobe = nprobe
+
+    def _reset(self, dim: int = 0):
+        import numpy as np
+
+        self.dim = dim
+        self.vectors = None                             # (capacity, dim) float32
+        self.ids = np.zeros(0, dtype=np.int64)          # 每行对应的条目 id，-1 表示空行
+        self.assign = np.zeros(0, dtype=np.int32)       # 每行所属的聚类
+        self.centroids = None                           # (n_lists, dim) float32，未训练时为 None
+        self.lists: List[List[int]] = [[]]              # 聚类 -> 行号列表
+        self.row_of: Dict[int, int] = {}
+        self.free_rows: List[int] = []
+
+    def __len__(self):
+        return len(self.row_of)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.lists)
+
+    # ----------------------
+    # 持久化
+    # ----------------------
+    def _vectors_file(self) -> str:
+        return os.path.join(self.path, "vectors.npy")
+
+    def _meta_file(self) -> str:
+        return os.path.join(self.path, "meta.npz")
+
+    def _delta_file(self) -> str:
+        return os.path.join(self.path, "delta.log")
+
+    def _read_delta(self):
+        """读取增量记录（忽略写了一半的最后一条）"""
+        import numpy as np
+
+        dtype = np.dtype(_DELTA_DTYPE)
+        if not os.path.exists(self._delta_file()):
+            return np.zeros(0, dtype=dtype)
+        with open(self._delta_file(), "rb") as f:
+            data = f.read()
+        return np.frombuffer(data[:len(data) - len(data) % dtype.itemsize], dtype=dtype)
+
+    def load(self) -> bool:
+        """从磁盘加载索引（快照加上增量记录），不存在时返回 False"""
+        import numpy as np
+
+        if not os.path.exists(self._meta_file()) or not os.path.exists(self._vectors_file()):
+            return False
+        with self._lock:
+            with np.load(self._meta_file()) as meta:
+                ids = meta["ids"]
+                assign = meta["assign"]
+                centroids = meta["centroids"]
+                dim = int(meta["dim"])
+                nprobe = int(meta["nprobe"]) if "nprobe" in meta.files else DEFAULT_NPROBE
+            self._reset(dim)
+            self.nprobe = nprobe
+            self.vectors = np.load(self._vectors_file(), mmap_mode="r+")
+            # 快照之后向量文件可能已经扩容
+            extra = self.vectors.shape[0] - len(ids)
+            self.ids = np.concatenate([ids, np.full(max(extra, 0), -1, dtype=np.int64)])
+            self.assign = np.concatenate([assign, np.zeros(max(extra, 0), dtype=np.int32)])
+            delta = self._read_delta()
+            for item_id, row, list_no in delta:
+                self.ids[row] = item_id if list_no >= 0 else -1
+                self.assign[row] = max(list_no, 0)
+            self._delta_records = len(delta)
+            self.centroids = centroids if centroids.size else None
+            n_lists = len(self.centroids) if self.centroids is not None else 1
+            self.lists = [[] for _ in range(n_lists)]
+            for row, item_id in enumerate(self.ids):
+                if item_id < 0:
+                    self.free_rows.append(row)
+                    continue
+                self.row_of[int(item_id)] = row
+                self.lists[self.assign[row]].append(row)
+        return True
+
+    def save(self):
+        """写入完整的元数据快照并清空增量记录（向量已通过内存映射写入磁盘）"""
+        import numpy as np
+
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            if self.vectors is not None:
+                self.vectors.flush()
+            centroids = self.centroids if self.centroids is not None else np.zeros((0, self.dim), dtype=np.float32)
+            tmp_file = self._meta_file() + ".tmp.npz"
+            np.savez(tmp_file, ids=self.ids, assign=self.assign,
+                     centroids=centroids, dim=np.int64(self.dim), nprobe=np.int64(self.nprobe))
+            os.replace(tmp_file, self._meta_file())
+            if os.path.exists(self._delta_file()):
+                os.remove(self._delta_file())
+            self._delta_records = 0
+
+    def _log(self, rows: Iterable[int]):
+        """
+        为改动过的行追加增量记录（调用方持有锁）
+
+        元数据快照与条目数成正比，每次增量更新都重写它太慢；
+        记录累积到一定数量后才合并为新快照
+        """
+        import numpy as np
+
+        rows = list(rows)
+        if not rows:
+            return
+        if self.vectors is not None:
+            self.vectors.flush()
+        if not os.path.exists(self._meta_file()):
+            self.save()
+            return
+        records = np.zeros(len(rows), dtype=_DELTA_DTYPE)
+        for record, row in zip(records, rows):
+            removed = self.ids[row] < 0
+            record["id"] = -1 if removed else self.ids[row]
+            record["row"] = row
+            record["list"] = -1 if removed else self.assign[row]
+        with open(self._delta_file(), "ab") as f:
+            f.write(records.tobytes())
+        self._delta_records += len(rows)
+        if self._delta_records > max(COMPACT_MIN_RECORDS, len(self) // 4):
+            self.save()
+
+    def _ensure_capacity(self, rows: int):
+        """确保向量文件至少有 rows 行，不足时按倍数扩容"""
+        import numpy as np
+
+        capacity = 0 if self.vectors is None else self.vectors.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 64)
+        os.makedirs(self.path, exist_ok=True)
+        tmp_file = self._vectors_file() + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_file, mode="w+", dtype=np.float32,
+                                          shape=(new_capacity, self.dim))
+        if capacity:
+            grown[:capacity] = self.vectors
+        grown.flush()
+        del grown
+        self.vectors = None
+        os.replace(tmp_file, self._vectors_file())
+        self.vectors = np.load(self._vectors_file(), mmap_mode="r+")
+
+        self.ids = np.concatenate([self.ids, np.full(new_capacity - capacity, -1, dtype=np.int64)])
+        self.assign = np.concatenate([self.assign, np.zeros(new_capacity - capacity, dtype=np.int32)])
+        self.free_rows.extend(range(new_capacity - 1, capacity - 1, -1))
+
+    # ----------------------
+    # 向量处理
+    # ----------------------
+    def _to_vector(self, embedding):
+        """将 BLOB 或数组转换为归一化的 float32 向量，无效时返回 None"""
+        import numpy as np
+
+        if embedding is None:
+            return None
+        if isinstance(embedding, (bytes, bytearray, memoryview, str)):
+            if self.embedding_manager is None:
+                raise ValueError("解码 embedding BLOB 需要 embedding_manager")
+            embedding = self.embedding_manager.load_embedding(embedding)
+            if embedding is None:
+                return None
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _nearest_lists(self, vectors):
+        """返回每个向量最接近的聚类编号"""
+        import numpy as np
+
+        if self.centroids is None:
+            return np.zeros(len(vectors), dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    @staticmethod
+    def _train(vectors, n_lists: int, iterations: int = 10, seed: int = 0):
+        """球面 k-means，在采样上训练聚类中心"""
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), n_lists * 256)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            filled = norms > 0
+            centroids[filled] = sums[filled] / norms[filled, None]
+        return np.ascontiguousarray(centroids, dtype=np.float32)
+
+    # ----------------------
+    # 构建与增量更新
+    # ----------------------
+    def rebuild(self, items: Iterable[Dict], n_lists: Optional[int] = None):
+        """
+        从条目列表完整重建索引
+
+        n_lists 默认取 sqrt(n)，条目很少时退化为单个聚类（精确扫描）
+        """
+        import numpy as np
+
+        ids, vectors = [], []
+        for item in items:
+            vector = self._to_vector(item.get('embedding'))
+            if vector is not None and (not vectors or vector.shape[0] == vectors[0].shape[0]):
+                ids.append(item['id'])
+                vectors.append(vector)
+
+        with self._lock:
+            dim = vectors[0].shape[0] if vectors else 0
+            self._reset(dim)
+            if os.path.exists(self._vectors_file()):
+                os.remove(self._vectors_file())
+            if not vectors:
+                self.save()
+                return self
+
+            matrix = np.stack(vectors).astype(np.float32)
+            if n_lists is None:
+                n_lists = int(np.sqrt(len(matrix)))
+            n_lists = max(1, min(n_lists, len(matrix)))
+            if n_lists > 1:
+                self.centroids = self._train(matrix, n_lists)
+            self.lists = [[] for _ in range(n_lists)]
+
+            self._ensure_capacity(len(matrix))
+            self.free_rows = list(range(self.vectors.shape[0] - 1, len(matrix) - 1, -1))
+            self.vectors[:len(matrix)] = matrix
+            self.ids[:len(matrix)] = ids
+            self.assign[:len(matrix)] = self._nearest_lists(matrix)
+            for row, item_id in enumerate(ids):
+                self.row_of[int(item_id)] = row
+                self.lists[self.assign[row]].append(row)
+            self.save()
+        return self
+
+    def _upsert_vector(self, item_id: int, vector) -> int:
+        """写入单个向量（调用方持有锁，不记录），返回所在行"""
+        if self.dim == 0:
+            self.dim = vector.shape[0]
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"embedding 维度不匹配: {vector.shape[0]} != {self.dim}")
+
+        row = self.row_of.get(int(item_id))
+        if row is not None:
+            self.lists[self.assign[row]].remove(row)
+        else:
+            if not self.free_rows:
+                self._ensure_capacity(len(self.ids) + 1)
+            row = self.free_rows.pop()
+            self.row_of[int(item_id)] = row
+
+        list_no = int(self._nearest_lists(vector[None, :])[0])
+        self.vectors[row] = vector
+        self.ids[row] = item_id
+        self.assign[row] = list_no
+        self.lists[list_no].append(row)
+        return row
+
+    def upsert(self, item_id: int, embedding):
+        """新增或更新单个条目的向量；embedding 无效时从索引中移除"""
+        vector = self._to_vector(embedding)
+        if vector is None:
+            self.remove(item_id)
+            return
+        with self._lock:
+            self._log([self._upsert_vector(item_id, vector)])
+
+    def upsert_many(self, pairs: Iterable[Tuple[int, object]]):
+        """批量新增或更新 [(item_id, embedding), ...]（embedding 无效的条目被移除）"""
+        vectors = [(item_id, self._to_vector(embedding)) for item_id, embedding in pairs]
+        with self._lock:
+            rows = []
+            for item_id, vector in vectors:
+                row = self._remove_row(item_id) if vector is None else self._upsert_vector(item_id, vector)
+                if row is not None:
+                    rows.append(row)
+            self._log(rows)
+
+    def _remove_row(self, item_id: int) -> Optional[int]:
+        """释放条目所在的行（调用方持有锁，不记录），返回该行，不存在时返回 None"""
+        row = self.row_of.pop(int(item_id), None)
+        if row is None:
+            return None
+        self.lists[self.assign[row]].remove(row)
+        self.ids[row] = -1
+        self.free_rows.append(row)
+        return row
+
+    def remove(self, item_id: int):
+        """从索引中删除条目"""
+        self.remove_many([item_id])
+
+    def remove_many(self, item_ids: Iterable[int]):
+        """批量删除条目"""
+        with self._lock:
+            rows = [self._remove_row(item_id) for item_id in item_ids]
+            self._log(row for row in rows if row is not None)
+
+    # ----------------------
+    # 查询
+    # ----------------------
+    def vector_of(self, item_id: int):
+        """返回条目在索引中的归一化向量，不存在时返回 None"""
+        row = self.row_of.get(item_id)
+        if row is None:
+            return None
+        return self.vectors[row]
+
+    def search(self, query, k: int, nprobe: Optional[int] = None,
+               allowed_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """
+        近似 top-k 查询
+
+        返回: [(item_id, similarity), ...] 按相似度降序排列
+        allowed_ids 用于标签等预筛选：先探测最近的 nprobe 个聚类，
+        其中符合条件的条目不足 k 个时按距离继续探测后面的聚类
+        """
+        import numpy as np
+
+        query = self._to_vector(query)
+        if query is None or k <= 0 or len(self) == 0:
+            return []
+        nprobe = nprobe or self.nprobe
+        allowed = None if allowed_ids is None else np.fromiter(allowed_ids, dtype=np.int64)
+
+        with self._lock:
+            if self.centroids is None:
+                order = range(self.n_lists)
+            else:
+                order = np.argsort(-(self.centroids @ query), kind='stable')
+            parts, found = [], 0
+            for probed, list_no in enumerate(order):
+                if probed >= nprobe and found >= k:
+                    break
+                rows = np.asarray(self.lists[list_no], dtype=np.int64)
+                if allowed is not None and rows.size:
+                    rows = rows[np.isin(self.ids[rows], allowed)]
+                parts.append(rows)
+                found += rows.size
+            if found == 0:
+                return []
+            rows = np.concatenate(parts)
+            scores = self.vectors[rows] @ query
+            item_ids = self.ids[rows]
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(item_ids[i]), float(scores[i])) for i in top]
+
+
+def main():
+    """命令行入口：重建索引"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DeutschNest ANN 索引工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="从数据库完整重建索引")
+    rebuild_parser.add_argument("--backend", choices=["sqlite", "supabase"], default="sqlite")
+    rebuild_parser.add_argument("--db", default="german_learning.db", help="SQLite 数据库路径")
+    rebuild_parser.add_argument("--path", default=None, help="索引目录（默认在数据库文件旁边）")
+    rebuild_parser.add_argument("--lists", type=int, default=None, help="聚类数量（默认 sqrt(n)）")
+    rebuild_parser.add_argument("--nprobe", type=int, default=None,
+                                help=f"查询时探测的聚类数量（随索引保存，默认沿用已保存的值或 {DEFAULT_NPROBE}）")
+    args = parser.parse_args()
+
+    from embedding_utils import EmbeddingManager
+
+    if args.backend == "sqlite":
+        from database import Database
+        db = Database(args.db)
+        path = args.path or index_path_for(args.db)
+    else:
+        from database_supabase import SupabaseDB
+        db = SupabaseDB()
+        path = args.path or DEFAULT_INDEX_PATH
+
+    index = IVFIndex(path, embedding_manager=EmbeddingManager(), nprobe=args.nprobe)
+    index.rebuild(db.iter_items(columns=('id', 'embedding')), n_lists=args.lists)
+    db.close()
+    print(f"✅ 索引已重建: {len(index)} 条向量, {index.n_lists} 个聚类, nprobe={index.nprobe} -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,21 @@
 """
 import streamlit as st
 import datetime
-from database import Database
-from database_supabase import SupabaseDB
-from nlp_parser import NLPParser
+import os
+import threading
+import time
+from database import Database, LIST_COLUMNS
+from supabase_cache import get_shared_db, DEFAULT_TTL
+from sync_engine import get_offline_db, get_sync_engine
 # from googletrans import Translator
 from deep_translator import GoogleTranslator
 
-from utils import cloze_deletion, create_anki_deck, batch_import_from_text
-from embedding_utils import EmbeddingManager, get_related_items
+from utils import cloze_deletion, create_anki_deck, batch_import_from_text, spool_to_file
+from embedding_utils import (
+    get_related_items, semantic_search, apply_neighbor_updates, ItemSnapshot
+)
+import model_registry
+from review_queue import get_review_queue
 from i18n import get_text, TEXTS
 # from vocab_sync import download_vocab, load_vocab, save_vocab
 
@@ -28,17 +35,70 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+
+@st.cache_resource
+def _write_generation():
+    """进程内的写入代数（所有会话共用一个数据库对象），每次写入后加一"""
+    return {"value": 0, "lock": threading.Lock()}
+
+
+def _bump(generation):
+    with generation["lock"]:
+        generation["value"] += 1
+
+
+def _version(generation):
+    return generation["value"], int(time.time() // DEFAULT_TTL)
+
+
+def bump_data_version():
+    """写入后调用：使相似度条目快照和矩阵在下次使用时重新加载"""
+    _bump(_write_generation())
+
+
+def data_version():
+    """
+    当前数据版本：写入代数加上时间段
+
+    其他进程的写入（共享的 Supabase）无法计数，按读缓存的 TTL 分段，最迟一个 TTL 后重新加载
+    """
+    return _version(_write_generation())
+
+
+def sync_pull_callbacks():
+    """
+    同步引擎拉取到远端修改后的回调（见 sync_engine.neighbor_list_refresher）：使快照失效，
+    并按与快照相同的数据版本重算相关条目列表
+
+    回调在同步线程中运行，不能调用 st.* 或读取 session_state，因此在这里（脚本线程中）
+    取得写入代数；异常由同步引擎记录在 last_error 中，设置页面会显示
+    """
+    generation = _write_generation()
+    return {"on_pull": lambda: _bump(generation), "version": lambda: _version(generation)}
+
+
 # 初始化 session state
+# 模型通过 model_registry 在进程内共享，每个会话只保存引用
 if 'db' not in st.session_state:
     # st.session_state.db = Database()
-    st.session_state.db = SupabaseDB()
-if 'parser' not in st.session_state:
-    try:
-        st.session_state.parser = NLPParser()
-    except Exception as e:
-        st.session_state.parser = None
+    if os.getenv("DEUTSCHNEST_OFFLINE"):
+        # 离线优先：读写本地 SQLite，后台同步引擎与 Supabase 交换增量
+        st.session_state.db = get_offline_db(**sync_pull_callbacks())
+    else:
+        # 所有会话共享一个带读缓存的 SupabaseDB，翻页和重新运行不再访问网络
+        st.session_state.db = get_shared_db()
+# 在后台线程中预热模型，页面无需等待模型加载即可渲染
+model_registry.start_warmup()
+
+if st.session_state.get('parser') is None:
+    st.session_state.parser = None
+    nlp_status = model_registry.status(model_registry.NLP_PARSER)
+    if nlp_status == model_registry.READY:
+        st.session_state.parser = model_registry.get_nlp_parser()
+    elif nlp_status == model_registry.FAILED and not st.session_state.get('_nlp_error_reported'):
         # 错误信息会在语言选择后显示
-        st.session_state._nlp_init_error = e
+        st.session_state._nlp_init_error = model_registry.error(model_registry.NLP_PARSER)
+        st.session_state._nlp_error_reported = True
 if 'embedding_manager' not in st.session_state:
     try:
         # 确保 numpy 可用（在 Streamlit Cloud 上可能需要延迟检查）
@@ -50,7 +110,9 @@ if 'embedding_manager' not in st.session_state:
             st.session_state.embedding_manager = None
             st.session_state._embedding_init_error = np_error
             raise
-        st.session_state.embedding_manager = EmbeddingManager()
+        st.session_state.embedding_manager = model_registry.get_embedding_manager()
+        # 量化索引重排时按 id 读取全精度 embedding，而不是在内存中保留全部 BLOB
+        st.session_state.embedding_manager.embedding_source = st.session_state.db.get_embeddings
     except ImportError as e:
         st.session_state.embedding_manager = None
         # 错误消息会在语言选择后显示
@@ -106,6 +168,129 @@ selected_page_text = st.sidebar.radio(
 st.session_state.current_page = page_mapping[selected_page_text]
 page = st.session_state.current_page
 
+# 模型仍在后台加载时显示提示
+if model_registry.is_loading():
+    st.sidebar.info(get_text("models_loading", language))
+
+
+def wait_for_models():
+    """需要模型时等待后台预热完成（显示加载提示而不是卡住页面）"""
+    if model_registry.is_loading():
+        with st.spinner(get_text("models_loading", language)):
+            model_registry.wait_ready()
+    if st.session_state.parser is None and model_registry.is_ready(model_registry.NLP_PARSER):
+        st.session_state.parser = model_registry.get_nlp_parser()
+
+
+@st.cache_resource(max_entries=1)
+def _similarity_snapshot(version):
+    """按数据版本缓存的条目快照（只含列表字段，embedding 在构建矩阵时按 id 读取）"""
+    return ItemSnapshot(st.session_state.db.get_all_items(columns=LIST_COLUMNS), version)
+
+
+def load_similarity_items():
+    """
+    相似度计算用的条目快照，数据版本未变时重新运行不再读取条目和 embedding，
+    EmbeddingManager 按版本号直接复用已构建的矩阵（快照在会话间共享，不要修改）
+    """
+    return _similarity_snapshot(data_version())
+
+
+def refresh_neighbor_lists(changed_ids=None, stale_ids=None):
+    """
+    写入后增量更新物化的相关条目列表（失败时显示警告，未更新的列表不影响写入本身）
+
+    stale_ids: 删除条目时 delete_item 返回的、引用了它的列表
+    """
+    bump_data_version()
+    if not st.session_state.embedding_manager:
+        return
+    try:
+        apply_neighbor_updates(st.session_state.db, st.session_state.embedding_manager, load_similarity_items(),
+                               changed_ids, stale_ids)
+    except Exception as e:
+        st.warning(f"{get_text('warning_neighbor_refresh_failed', language)} {e}")
+
+
+def import_batch(items):
+    """批量导入：一次生成全部 embedding，解析后通过 add_items 一次写入"""
+    # 批量生成 embedding（每批只调用一次模型）
+    embedding_blobs = [None] * len(items)
+    if st.session_state.embedding_manager:
+        try:
+            embeddings = st.session_state.embedding_manager.generate_embeddings(
+                [item['content'].strip() for item in items]
+            )
+            embedding_blobs = [st.session_state.embedding_manager.save_embedding(e) for e in embeddings]
+        except ImportError:
+            pass  # numpy 未安装时不生成 embedding
+        except Exception as e:
+            st.warning(f"{get_text('embedding_warning', language)} {e}")
+    
+    progress_bar = st.progress(0)
+    rows = []
+    for idx, item in enumerate(items):
+        if st.session_state.parser:
+            lemma_list, pos_list, tags = st.session_state.parser.parse_text(item['content'])
+        else:
+            lemma_list, pos_list, tags = [], [], []
+        
+        rows.append({
+            'type': item['type'],
+            'content': item['content'].strip(),
+            'translation': item['translation'].strip(),
+            'lemma': lemma_list,
+            'tags': tags,
+            'examples': [],
+            'embedding': embedding_blobs[idx]
+        })
+        progress_bar.progress((idx + 1) / len(items))
+    
+    new_ids, failures = st.session_state.db.add_items(rows)
+    new_ids = [item_id for item_id in new_ids if item_id is not None]
+    
+    refresh_neighbor_lists(changed_ids=new_ids)
+    st.success(get_text("success_batch_import", language).format(count=len(new_ids)))
+    if failures:
+        st.warning(get_text("warning_import_failures", language).format(count=len(failures)))
+        for index, message in failures[:10]:
+            st.caption(f"{items[index]['content'][:60]}: {message}")
+
+
+def render_related_items(item):
+    """显示相关条目：读取物化的相关列表，尚未计算（None）时现场计算并保存，空列表同样会保存"""
+    st.markdown("---")
+    st.subheader(get_text("related_items", language))
+    if not st.session_state.embedding_manager:
+        st.info(get_text("embedding_not_initialized", language))
+        return
+    try:
+        related_items = st.session_state.db.get_related(item['id'])
+        if related_items is None:
+            all_items = load_similarity_items()
+            related_items = get_related_items(
+                item, 
+                all_items, 
+                top_k=5,
+                embedding_manager=st.session_state.embedding_manager,
+                ann_index=st.session_state.db.ann_index
+            )
+            st.session_state.db.set_related(item['id'], [(r['id'], score) for r, score in related_items])
+        
+        if related_items:
+            for related_item, similarity in related_items:
+                similarity_pct = f"{similarity * 100:.1f}%"
+                with st.expander(f"🔗 {related_item['content'][:50]}... ({get_text('similarity', language)} {similarity_pct})"):
+                    st.write(f"**{get_text('label_german', language)}** {related_item['content']}")
+                    st.write(f"**{get_text('label_translation', language)}** {related_item['translation']}")
+                    if related_item['tags']:
+                        st.write(f"**{get_text('label_tags', language)}** {', '.join(related_item['tags'])}")
+                    st.write(f"**{get_text('label_type', language)}** {related_item['type']}")
+        else:
+            st.info(get_text("no_related_items", language))
+    except Exception as e:
+        st.warning(f"{get_text('get_related_failed', language)} {e}")
+
 # 显示初始化错误（如果有）
 if hasattr(st.session_state, '_nlp_init_error'):
     st.error(f"{get_text('nlp_init_failed', language)} {st.session_state._nlp_init_error}")
@@ -127,33 +312,36 @@ if page == "home":
     st.title(get_text("title_home", language))
     st.markdown("---")
     
-    # 统计信息
+    # 统计信息（在数据库中聚合，不读取条目）；先写回队列中的复习记录
+    get_review_queue(st.session_state.db).flush()
+    stats = st.session_state.db.get_stats()
     col1, col2, col3, col4 = st.columns(4)
     
-    all_items = st.session_state.db.get_all_items()
-    
     with col1:
-        st.metric(get_text("metric_total", language), len(all_items))
+        st.metric(get_text("metric_total", language), stats['total'])
     
     with col2:
-        # 数据库中使用中文存储类型
-        word_count = len([i for i in all_items if i['type'] == "Word"])
-        st.metric(get_text("metric_word", language), word_count)
+        st.metric(get_text("metric_word", language), stats['by_type'].get("Word", 0))
     
     with col3:
-        phrase_count = len([i for i in all_items if i['type'] == "Phrase"])
-        st.metric(get_text("metric_phrase", language), phrase_count)
+        st.metric(get_text("metric_phrase", language), stats['by_type'].get("Phrase", 0))
     
     with col4:
-        sentence_count = len([i for i in all_items if i['type'] == "Sentence"])
-        st.metric(get_text("metric_sentence", language), sentence_count)
+        st.metric(get_text("metric_sentence", language), stats['by_type'].get("Sentence", 0))
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric(get_text("metric_reviewed_today", language), stats['reviewed_today'])
+    with col2:
+        st.metric(get_text("metric_never_reviewed", language), stats['never_reviewed'])
     
     st.markdown("---")
     
     # 最近添加
     st.subheader(get_text("recent_added", language))
-    if all_items:
-        recent_items = all_items[:10]
+    # 列表视图不需要 embedding
+    recent_items, _ = st.session_state.db.get_items_page(page_size=10, columns=LIST_COLUMNS)
+    if recent_items:
         for item in recent_items:
             with st.expander(f"{item['type']} | {item['content'][:50]}..."):
                 col1, col2 = st.columns(2)
@@ -201,6 +389,7 @@ elif page == "add":
         )
     
     if st.button(get_text("button_save", language), type="primary"):
+        wait_for_models()
         if content_de.strip():
             # 自动翻译（如果用户没输入）
             if not translation_en.strip():
@@ -231,7 +420,7 @@ elif page == "add":
                         st.warning(f"{get_text('embedding_warning', language)} {e}")
                         st.info(get_text("embedding_info", language))
                 
-                st.session_state.db.add_item(
+                new_id = st.session_state.db.add_item(
                     type_=item_type,
                     content=content_de.strip(),
                     translation=translation_en.strip(),
@@ -240,6 +429,7 @@ elif page == "add":
                     examples=[],
                     embedding=embedding_blob
                 )
+                refresh_neighbor_lists(changed_ids=[new_id])
 
                 # # 同步到 JSON + 云端
                 # st.session_state.vocab_list.append({
@@ -302,44 +492,10 @@ elif page == "add":
         )
         
         if st.button(get_text("button_batch_import", language)):
+            wait_for_models()
             if batch_text.strip():
                 items = batch_import_from_text(batch_text, import_type)
-                
-                progress_bar = st.progress(0)
-                success_count = 0
-                
-                for idx, item in enumerate(items):
-                    if st.session_state.parser:
-                        lemma_list, pos_list, tags = st.session_state.parser.parse_text(item['content'])
-                    else:
-                        lemma_list, pos_list, tags = [], [], []
-                    
-                    # 生成 embedding
-                    embedding_blob = None
-                    if st.session_state.embedding_manager:
-                        try:
-                            # 确保 numpy 可用
-                            import numpy as np
-                            embedding = st.session_state.embedding_manager.generate_embedding(item['content'].strip())
-                            embedding_blob = st.session_state.embedding_manager.save_embedding(embedding)
-                        except ImportError:
-                            pass  # 批量导入时静默失败（numpy 未安装）
-                        except Exception:
-                            pass  # 批量导入时静默失败
-                    
-                    st.session_state.db.add_item(
-                        type_=item['type'],
-                        content=item['content'].strip(),
-                        translation=item['translation'].strip(),
-                        lemma=lemma_list,
-                        tags=tags,
-                        examples=[],
-                        embedding=embedding_blob
-                    )
-                    success_count += 1
-                    progress_bar.progress((idx + 1) / len(items))
-                
-                st.success(get_text("success_batch_import", language).format(count=success_count))
+                import_batch(items)
             else:
                 st.warning(get_text("warning_empty_text", language))
     
@@ -351,49 +507,20 @@ elif page == "add":
             st.text_area(get_text("label_file_preview", language), content, height=200)
             
             if st.button(get_text("button_import_file", language)):
+                wait_for_models()
                 items = batch_import_from_text(content, import_type)
-                
-                progress_bar = st.progress(0)
-                success_count = 0
-                
-                for idx, item in enumerate(items):
-                    if st.session_state.parser:
-                        lemma_list, pos_list, tags = st.session_state.parser.parse_text(item['content'])
-                    else:
-                        lemma_list, pos_list, tags = [], [], []
-                    
-                    # 生成 embedding
-                    embedding_blob = None
-                    if st.session_state.embedding_manager:
-                        try:
-                            # 确保 numpy 可用
-                            import numpy as np
-                            embedding = st.session_state.embedding_manager.generate_embedding(item['content'].strip())
-                            embedding_blob = st.session_state.embedding_manager.save_embedding(embedding)
-                        except ImportError:
-                            pass  # 批量导入时静默失败（numpy 未安装）
-                        except Exception:
-                            pass  # 批量导入时静默失败
-                    
-                    st.session_state.db.add_item(
-                        type_=item['type'],
-                        content=item['content'].strip(),
-                        translation=item['translation'].strip(),
-                        lemma=lemma_list,
-                        tags=tags,
-                        examples=[],
-                        embedding=embedding_blob
-                    )
-                    success_count += 1
-                    progress_bar.progress((idx + 1) / len(items))
-                
-                st.success(get_text("success_batch_import", language).format(count=success_count))
+                import_batch(items)
 
 # ==================== 搜索/管理页面 ====================
 elif page == "search":
     st.title(get_text("title_search", language))
     st.markdown("---")
     
+    # 搜索模式：关键词（子串匹配）或语义（embedding 相似度）
+    search_mode_options = [get_text("search_mode_keyword", language), get_text("search_mode_semantic", language)]
+    search_mode_display = st.radio(get_text("label_search_mode", language), search_mode_options, horizontal=True)
+    semantic_mode = search_mode_display == get_text("search_mode_semantic", language)
+    
     # 搜索栏
     col1, col2, col3 = st.columns(3)
     
@@ -413,30 +540,67 @@ elif page == "search":
         type_filter_val = type_options_map[type_filter_display]
     
     with col3:
-        all_items = st.session_state.db.get_all_items()
-        all_tags = set()
-        for item in all_items:
-            all_tags.update(item.get('tags', []))
-        tag_filter = st.selectbox(get_text("label_tag_filter", language), [get_text("filter_all", language)] + sorted(list(all_tags)))
+        tag_counts = dict(st.session_state.db.list_tags())
+        tag_filter = st.selectbox(
+            get_text("label_tag_filter", language),
+            [get_text("filter_all", language)] + list(tag_counts),
+            format_func=lambda tag: f"{tag} ({tag_counts[tag]})" if tag in tag_counts else tag
+        )
     
     # 执行搜索（type_filter_val 已在上面设置）
     tag_filter_val = None if tag_filter == get_text("filter_all", language) else tag_filter
     
-    results = st.session_state.db.search_items(
-        keyword=search_keyword,
-        type_filter=type_filter_val,
-        tag_filter=tag_filter_val
-    )
-    
-    st.write(get_text("results_found", language).format(count=len(results)))
+    semantic_scores = {}
+    if semantic_mode and search_keyword.strip() and not st.session_state.embedding_manager:
+        st.info(get_text("embedding_not_initialized", language))
+    elif semantic_mode and search_keyword.strip() and not model_registry.is_ready(model_registry.EMBEDDING_MODEL):
+        st.info(get_text("models_loading", language))
+    elif semantic_mode and search_keyword.strip():
+        try:
+            all_items = load_similarity_items()
+            semantic_results = semantic_search(
+                search_keyword,
+                all_items,
+                st.session_state.embedding_manager,
+                top_k=50,
+                type_filter=type_filter_val,
+                tag_filter=tag_filter_val
+            )
+            semantic_scores = {item['id']: score for item, score in semantic_results}
+        except Exception as e:
+            st.warning(f"{get_text('semantic_search_failed', language)} {e}")
+    
+    next_cursor = None
+    if semantic_scores:
+        results = [item for item in all_items if item['id'] in semantic_scores]
+        results.sort(key=lambda item: semantic_scores[item['id']], reverse=True)
+        st.write(get_text("results_found", language).format(count=len(results)))
+    else:
+        # 关键词搜索按页读取；筛选条件变化时回到第一页
+        # search_cursors 保存每一页的起始游标，用于返回上一页
+        search_filters = (search_keyword, type_filter_val, tag_filter_val)
+        if st.session_state.get('search_filters') != search_filters:
+            st.session_state.search_filters = search_filters
+            st.session_state.search_cursors = [None]
+        results, next_cursor = st.session_state.db.search_items_page(
+            keyword=search_keyword,
+            type_filter=type_filter_val,
+            tag_filter=tag_filter_val,
+            cursor=st.session_state.search_cursors[-1],
+            columns=LIST_COLUMNS
+        )
+        st.write(get_text("label_page", language).format(page=len(st.session_state.search_cursors)))
     st.markdown("---")
     
     # 显示结果
     for item in results:
-        with st.expander(f"ID: {item['id']} | {item['type']} | {item['content'][:60]}..."):
+        score_label = f" ({get_text('similarity', language)} {semantic_scores[item['id']] * 100:.1f}%)" if item['id'] in semantic_scores else ""
+        with st.expander(f"ID: {item['id']} | {item['type']} | {item['content'][:60]}...{score_label}"):
             col1, col2 = st.columns([2, 1])
             
             with col1:
+                if item.get('snippet'):
+                    st.markdown(f"🔎 {item['snippet']}")
                 st.write(f"**{get_text('label_german', language)}** {item['content']}")
                 st.write(f"**{get_text('label_translation', language)}** {item['translation']}")
                 if item['lemma']:
@@ -450,7 +614,8 @@ elif page == "search":
             
             with col2:
                 if st.button(get_text("button_delete", language), key=f"delete_{item['id']}"):
-                    st.session_state.db.delete_item(item['id'])
+                    referencing = st.session_state.db.delete_item(item['id'])
+                    refresh_neighbor_lists(stale_ids=referencing)
                     st.rerun()
                 
                 if st.button(get_text("button_edit", language), key=f"edit_{item['id']}"):
@@ -466,37 +631,24 @@ elif page == "search":
                             content=new_content,
                             translation=new_translation
                         )
+                        refresh_neighbor_lists(changed_ids=[item['id']])
                         st.session_state[f"editing_{item['id']}"] = False
                         st.rerun()
             
             # 显示相关条目
-            st.markdown("---")
-            st.subheader(get_text("related_items", language))
-            if st.session_state.embedding_manager:
-                try:
-                    all_items = st.session_state.db.get_all_items()
-                    related_items = get_related_items(
-                        item, 
-                        all_items, 
-                        top_k=5,
-                        embedding_manager=st.session_state.embedding_manager
-                    )
-                    
-                    if related_items:
-                        for related_item, similarity in related_items:
-                            similarity_pct = f"{similarity * 100:.1f}%"
-                            with st.expander(f"🔗 {related_item['content'][:50]}... ({get_text('similarity', language)} {similarity_pct})"):
-                                st.write(f"**{get_text('label_german', language)}** {related_item['content']}")
-                                st.write(f"**{get_text('label_translation', language)}** {related_item['translation']}")
-                                if related_item['tags']:
-                                    st.write(f"**{get_text('label_tags', language)}** {', '.join(related_item['tags'])}")
-                                st.write(f"**{get_text('label_type', language)}** {related_item['type']}")
-                    else:
-                        st.info(get_text("no_related_items", language))
-                except Exception as e:
-                    st.warning(f"{get_text('get_related_failed', language)} {e}")
-            else:
-                st.info(get_text("embedding_not_initialized", language))
+            render_related_items(item)
+    
+    # 翻页
+    if not semantic_scores:
+        col_prev, col_next = st.columns(2)
+        with col_prev:
+            if len(st.session_state.search_cursors) > 1 and st.button(get_text("button_prev_page", language)):
+                st.session_state.search_cursors.pop()
+                st.rerun()
+        with col_next:
+            if next_cursor is not None and st.button(get_text("button_next_page", language)):
+                st.session_state.search_cursors.append(next_cursor)
+                st.rerun()
 
 # ==================== 复习页面 ====================
 elif page == "review":
@@ -522,18 +674,22 @@ elif page == "review":
         review_mode = review_mode_map[review_mode_display]
     
     with col2:
-        all_items = st.session_state.db.get_all_items()
-        all_tags = set()
-        for item in all_items:
-            all_tags.update(item.get('tags', []))
-        review_tag = st.selectbox(get_text("label_tag_filter_optional", language), [get_text("filter_all", language)] + sorted(list(all_tags)))
+        tag_counts = dict(st.session_state.db.list_tags())
+        review_tag = st.selectbox(
+            get_text("label_tag_filter_optional", language),
+            [get_text("filter_all", language)] + list(tag_counts),
+            format_func=lambda tag: f"{tag} ({tag_counts[tag]})" if tag in tag_counts else tag
+        )
+        # 加权抽样：复习次数越少越容易被抽到
+        review_weighted = st.checkbox(get_text("label_prefer_less_reviewed", language), value=True)
     
     st.markdown("---")
     
     # 开始复习
     if 'current_review_item' not in st.session_state or st.button(get_text("button_random", language)):
         tag_filter = None if review_tag == get_text("filter_all", language) else review_tag
-        items = st.session_state.db.get_random_items(limit=1, tag_filter=tag_filter)
+        items = st.session_state.db.get_random_items(limit=1, tag_filter=tag_filter, columns=LIST_COLUMNS,
+                                                    weighted=review_weighted)
         
         if items:
             st.session_state.current_review_item = items[0]
@@ -578,36 +734,13 @@ elif page == "review":
                         st.balloons()
                 
                 if st.button(get_text("button_mark_reviewed", language)):
-                    st.session_state.db.update_review(item['id'])
+                    # 写入后台队列，批量写回数据库
+                    get_review_queue(st.session_state.db).mark(item['id'])
                     st.success(get_text("review_recorded", language))
                     del st.session_state.current_review_item
                 
                 # 显示相关条目
-                st.markdown("---")
-                st.subheader(get_text("related_items", language))
-                if st.session_state.embedding_manager:
-                    try:
-                        all_items = st.session_state.db.get_all_items()
-                        related_items = get_related_items(
-                            item, 
-                            all_items, 
-                            top_k=5,
-                            embedding_manager=st.session_state.embedding_manager
-                        )
-                        
-                        if related_items:
-                            for related_item, similarity in related_items:
-                                similarity_pct = f"{similarity * 100:.1f}%"
-                                with st.expander(f"🔗 {related_item['content'][:50]}... ({get_text('similarity', language)} {similarity_pct})"):
-                                    st.write(f"**{get_text('label_german', language)}** {related_item['content']}")
-                                    st.write(f"**{get_text('label_translation', language)}** {related_item['translation']}")
-                                    if related_item['tags']:
-                                        st.write(f"**{get_text('label_tags', language)}** {', '.join(related_item['tags'])}")
-                                    st.write(f"**{get_text('label_type', language)}** {related_item['type']}")
-                        else:
-                            st.info(get_text("no_related_items", language))
-                    except Exception as e:
-                        st.warning(f"{get_text('get_related_failed', language)} {e}")
+                render_related_items(item)
         
         elif review_mode == "reverse":
             st.write(f"**{get_text('review_reverse_label', language)}** {item['translation']}")
@@ -628,36 +761,13 @@ elif page == "review":
                         st.write(f"**{get_text('match_score', language)}** {score:.1%}")
                 
                 if st.button(get_text("button_mark_reviewed", language)):
-                    st.session_state.db.update_review(item['id'])
+                    # 写入后台队列，批量写回数据库
+                    get_review_queue(st.session_state.db).mark(item['id'])
                     st.success(get_text("review_recorded", language))
                     del st.session_state.current_review_item
                 
                 # 显示相关条目
-                st.markdown("---")
-                st.subheader(get_text("related_items", language))
-                if st.session_state.embedding_manager:
-                    try:
-                        all_items = st.session_state.db.get_all_items()
-                        related_items = get_related_items(
-                            item, 
-                            all_items, 
-                            top_k=5,
-                            embedding_manager=st.session_state.embedding_manager
-                        )
-                        
-                        if related_items:
-                            for related_item, similarity in related_items:
-                                similarity_pct = f"{similarity * 100:.1f}%"
-                                with st.expander(f"🔗 {related_item['content'][:50]}... ({get_text('similarity', language)} {similarity_pct})"):
-                                    st.write(f"**{get_text('label_german', language)}** {related_item['content']}")
-                                    st.write(f"**{get_text('label_translation', language)}** {related_item['translation']}")
-                                    if related_item['tags']:
-                                        st.write(f"**{get_text('label_tags', language)}** {', '.join(related_item['tags'])}")
-                                    st.write(f"**{get_text('label_type', language)}** {related_item['type']}")
-                        else:
-                            st.info(get_text("no_related_items", language))
-                    except Exception as e:
-                        st.warning(f"{get_text('get_related_failed', language)} {e}")
+                render_related_items(item)
         
         elif review_mode == "dictation":
             st.write(f"**{get_text('review_dictation_label', language)}**")
@@ -690,36 +800,13 @@ elif page == "review":
                         st.success(get_text("perfect_correct", language))
                 
                 if st.button(get_text("button_mark_reviewed", language)):
-                    st.session_state.db.update_review(item['id'])
+                    # 写入后台队列，批量写回数据库
+                    get_review_queue(st.session_state.db).mark(item['id'])
                     st.success(get_text("review_recorded", language))
                     del st.session_state.current_review_item
                 
                 # 显示相关条目
-                st.markdown("---")
-                st.subheader(get_text("related_items", language))
-                if st.session_state.embedding_manager:
-                    try:
-                        all_items = st.session_state.db.get_all_items()
-                        related_items = get_related_items(
-                            item, 
-                            all_items, 
-                            top_k=5,
-                            embedding_manager=st.session_state.embedding_manager
-                        )
-                        
-                        if related_items:
-                            for related_item, similarity in related_items:
-                                similarity_pct = f"{similarity * 100:.1f}%"
-                                with st.expander(f"🔗 {related_item['content'][:50]}... ({get_text('similarity', language)} {similarity_pct})"):
-                                    st.write(f"**{get_text('label_german', language)}** {related_item['content']}")
-                                    st.write(f"**{get_text('label_translation', language)}** {related_item['translation']}")
-                                    if related_item['tags']:
-                                        st.write(f"**{get_text('label_tags', language)}** {', '.join(related_item['tags'])}")
-                                    st.write(f"**{get_text('label_type', language)}** {related_item['type']}")
-                        else:
-                            st.info(get_text("no_related_items", language))
-                    except Exception as e:
-                        st.warning(f"{get_text('get_related_failed', language)} {e}")
+                render_related_items(item)
 
 # ==================== 设置/导出页面 ====================
 elif page == "settings":
@@ -731,18 +818,24 @@ elif page == "settings":
     col1, col2 = st.columns(2)
     
     with col1:
+        include_embeddings = st.checkbox(get_text("label_export_embeddings", language))
         if st.button(get_text("button_export_csv", language), type="primary"):
-            csv_data = st.session_state.db.export_to_csv()
+            # 分块读取并写入临时文件，生成时不在内存中拼出整个 CSV；
+            # st.download_button 仍会把整个文件读进内存（Streamlit 没有流式下载，见 spool_to_file）
+            csv_file = spool_to_file(
+                st.session_state.db.iter_csv(embeddings='base64' if include_embeddings else 'skip'),
+                suffix=".csv"
+            )
             st.download_button(
                 label=get_text("button_download_csv", language),
-                data=csv_data,
+                data=csv_file,
                 file_name=f"german_learning_{datetime.datetime.now().strftime('%Y%m%d')}.csv",
                 mime="text/csv"
             )
     
     with col2:
         if st.button(get_text("button_export_anki", language), type="primary"):
-            all_items = st.session_state.db.get_all_items()
+            all_items = st.session_state.db.get_all_items(columns=LIST_COLUMNS)
             if all_items:
                 try:
                     anki_data = create_anki_deck(all_items, "German Learning")
@@ -776,7 +869,44 @@ elif page == "settings":
     st.markdown("---")
     
     st.subheader(get_text("subtitle_system_info", language))
-    st.write(f"{get_text('label_db_count', language)} {len(st.session_state.db.get_all_items())}")
+    st.write(f"{get_text('label_db_count', language)} {st.session_state.db.get_stats()['total']}")
     nlp_status = get_text("status_initialized", language) if st.session_state.parser else get_text("status_not_initialized", language)
     st.write(f"{get_text('label_nlp_status', language)} {nlp_status}")
+    model_memory = model_registry.memory_report()
+    st.write(f"{get_text('label_model_memory', language)} {model_memory['total'] / 1024 / 1024:.1f} MB")
+    if st.session_state.embedding_manager:
+        precisions = ["float32", "float16", "int8"]
+        index_precision = st.selectbox(
+            get_text("label_index_precision", language), precisions,
+            index=precisions.index(st.session_state.embedding_manager.index_precision),
+            help=get_text("help_index_precision", language)
+        )
+        st.session_state.embedding_manager.set_index_precision(index_precision)
+    if hasattr(st.session_state.db, 'cache_stats'):
+        cache_stats = st.session_state.db.cache_stats()
+        st.write(get_text("label_db_cache", language).format(
+            entries=cache_stats['entries'], hit_rate=cache_stats['hit_rate'] * 100
+        ))
+    if hasattr(st.session_state.db, 'payload_stats'):
+        payload_stats = st.session_state.db.payload_stats()
+        st.write(get_text("label_db_payload", language).format(
+            requests=payload_stats['requests'], mb=payload_stats['payload_bytes'] / 1024 / 1024
+        ))
+    sync_engine = get_sync_engine()
+    if sync_engine is not None:
+        sync_status = sync_engine.status()
+        last_sync = sync_status['last_sync']
+        st.write(get_text("label_sync_status", language).format(
+            time=datetime.datetime.fromtimestamp(last_sync).strftime('%H:%M:%S') if last_sync else "-"
+        ))
+        if sync_status['last_error']:
+            st.warning(f"{get_text('warning_sync_failed', language)} {sync_status['last_error']}")
+        if st.button(get_text("button_sync_now", language)):
+            get_review_queue(st.session_state.db).flush()
+            if sync_engine.try_sync() is None:
+                st.warning(f"{get_text('warning_sync_failed', language)} {sync_engine.status()['last_error']}")
+    startup_timings = model_registry.startup_timings()
+    if startup_timings:
+        st.write(f"**{get_text('label_startup_timings', language)}**")
+        st.write({phase: f"{seconds:.2f}s" for phase, seconds in startup_timings.items()})
 
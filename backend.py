@@ -0,0 +1,97 @@
+"""
+Storage backend protocol
+
+Database (SQLite), SupabaseDB and MemoryDB (the in-memory reference in
+database_memory.py) all implement StorageBackend; the app and the helper
+modules only rely on these methods. backend_bench.py checks that every
+backend returns the same results for the same workload.
+
+Shared semantics:
+- items are dicts with the ITEM_COLUMNS keys (only the requested ones when
+  a `columns` projection is given; the id is always included where paging
+  or sampling needs it). get_item without a projection returns every
+  column; list reads without one may leave out the embedding (Supabase
+  does), so callers pass LIST_COLUMNS or ITEM_COLUMNS explicitly
+- lemma / tags / examples are lists, review_count is an int
+- keyword search is a case-insensitive match on content or translation;
+  listings are ordered by (created_at, id) descending. Keyword pages may be
+  ordered by relevance instead (SQLite's bm25, Supabase's search_entries
+  RPC), so callers treat cursors as opaque and do not rely on the order of
+  keyword results across backends
+- embeddings are returned in the backend's storage format (bytes for
+  SQLite and memory, base64 text for Supabase)
+- get_related returns None for a neighbour list that was never computed and
+  [] for one computed as empty; get_related_lists maps the latter to []
+- delete_item also deletes the item's neighbour list and its appearances in
+  other lists, and returns the ids of those other lists for recomputation
+"""
+from typing import Dict, Iterator, List, Optional, Protocol, Sequence, Tuple, Union, runtime_checkable
+
+# (created_at, id), or (rank, id) for relevance-ordered keyword pages
+Cursor = Tuple[Union[str, float], int]
+
+
+@runtime_checkable
+class StorageBackend(Protocol):
+    # Writes
+    def add_item(self, type_: str, content: str, translation: str, lemma: List[str], tags: List[str],
+                 examples: List[str] = None, embedding=None) -> int: ...
+
+    def add_items(self, items: List[Dict]) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]: ...
+
+    def update_item(self, item_id: int, **kwargs): ...
+
+    def delete_item(self, item_id: int) -> List[int]: ...
+
+    def update_review(self, item_id: int): ...
+
+    def update_reviews(self, reviews: Dict[int, Tuple[int, str]]): ...
+
+    # Reads
+    def get_item(self, item_id: int, columns: Optional[Sequence[str]] = None) -> Optional[Dict]: ...
+
+    def search_items(self, keyword: str = "", type_filter: str = None, tag_filter: str = None,
+                     columns: Optional[Sequence[str]] = None) -> List[Dict]: ...
+
+    def search_items_page(self, keyword: str = "", type_filter: str = None, tag_filter: str = None,
+                          page_size: int = ..., cursor: Optional[Cursor] = None,
+                          columns: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[Cursor]]: ...
+
+    def get_items_page(self, page_size: int = ..., cursor: Optional[Cursor] = None,
+                       columns: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[Cursor]]: ...
+
+    def get_random_items(self, limit: int = 1, tag_filter: str = None,
+                         columns: Optional[Sequence[str]] = None, weighted: bool = False) -> List[Dict]: ...
+
+    def iter_item_chunks(self, chunk_size: int = ...,
+                         columns: Optional[Sequence[str]] = None) -> Iterator[List[Dict]]: ...
+
+    def iter_items(self, chunk_size: int = ..., columns: Optional[Sequence[str]] = None) -> Iterator[Dict]: ...
+
+    def get_all_items(self, columns: Optional[Sequence[str]] = None) -> List[Dict]: ...
+
+    def get_embeddings(self, item_ids: Sequence[int]) -> Dict[int, object]: ...
+
+    def list_tags(self) -> List[Tuple[str, int]]: ...
+
+    def get_stats(self) -> Dict: ...
+
+    # Materialized related lists
+    def get_related(self, item_id: int,
+                    columns: Optional[Sequence[str]] = None) -> Optional[List[Tuple[Dict, float]]]: ...
+
+    def get_related_lists(self, item_ids: Optional[Sequence[int]] = None,
+                          referencing: Optional[Sequence[int]] = None) -> Dict[int, List[Tuple[int, float]]]: ...
+
+    def set_related_many(self, lists: Dict[int, List[Tuple[int, float]]]): ...
+
+    def set_related(self, item_id: int, pairs: List[Tuple[int, float]]): ...
+
+    def delete_related(self, item_id: int) -> List[int]: ...
+
+    # Export / lifecycle
+    def iter_csv(self, embeddings: str = "skip", chunk_size: int = ...) -> Iterator[bytes]: ...
+
+    def export_to_csv(self, embeddings: str = "skip") -> str: ...
+
+    def close(self): ...
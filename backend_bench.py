@@ -0,0 +1,339 @@
+"""
+Cross-backend conformance checks and benchmarks
+
+Every backend runs the same workloads. The conformance pass compares each
+backend's results with MemoryDB, the reference implementation, then lists
+the German search cases (compounds, umlauts, ß) where backends are allowed
+to differ: SQLite folds umlauts and ß, the others match substrings. The
+benchmark reports ops/sec and p95 latency for insert, search, filter,
+sample, review and weighted sample at each table size.
+
+Limitation: the Supabase backend runs against
+supabase_local.LocalSupabaseClient, an in-process fake of the client, not a
+PostgREST-compatible server. Its numbers cover SupabaseDB's query building
+and result handling plus a Python scan of the fake table; they include no
+HTTP, JSON encoding or Postgres query planning, so they don't predict
+server-side cost. --latency adds a fixed round trip per request, which
+shows how many requests each operation makes.
+
+Usage:
+    python backend_bench.py
+    python backend_bench.py --sizes 1000 10000
+    python backend_bench.py --backends supabase --latency 0.02
+    python backend_bench.py --backends sqlite memory --check-only
+"""
+import base64
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend import StorageBackend
+from database import LIST_COLUMNS
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+CONFORMANCE_SIZE = 300
+INSERT_BATCH = 500
+
+# No word contains another one, so substring search (LIKE/ilike) and
+# prefix search (FTS5) return the same rows
+WORDS = ["hund", "katze", "vogel", "baum", "blume", "wasser", "feuer", "stadt", "fluss", "berg",
+         "tisch", "stuhl", "fenster", "garten", "schule", "arbeit", "zeitung", "bahnhof", "kirche", "markt"]
+TRANSLATIONS = ["dog", "cat", "bird", "tree", "flower", "water", "fire", "city", "river", "mountain",
+                "table", "chair", "window", "garden", "school", "work", "newspaper", "station", "church", "market"]
+TYPES = ["Word", "Phrase", "Sentence"]
+TAGS = ["A1", "A2", "B1", "B2", "travel", "home"]
+
+# German search cases whose results may differ per backend: (label, keyword)
+GERMAN_ITEMS = ["Hausaufgabe", "Haustür", "zu Hause", "Bahnhofstraße", "Straße", "Strasse",
+                "Mäuse", "über", "Übung", "Fluss", "Fluß", "100% sicher", "1000 Euro"]
+GERMAN_CASES = [
+    ("compound prefix", "haus"),
+    ("compound infix", "aufgabe"),
+    ("compound suffix", "tür"),
+    ("ß as ss", "strasse"),
+    ("ss as ß", "straße"),
+    ("umlaut", "über"),
+    ("umlaut transliterated", "ueber"),
+    ("umlaut stripped", "uber"),
+    ("umlaut case", "ÜBUNG"),
+    ("infix with umlaut", "äuse"),
+    ("LIKE wildcard", "100%"),
+]
+
+
+# ----------------------
+# Backends
+# ----------------------
+def make_backend(name: str, seed: int = 0, latency: float = 0.0) -> Tuple[StorageBackend, Callable[[], None]]:
+    """Empty backend plus its cleanup function"""
+    if name == "memory":
+        from database_memory import MemoryDB
+        db = MemoryDB(seed=seed)
+        return db, db.close
+    if name == "sqlite":
+        from database import Database
+        directory = tempfile.mkdtemp(prefix="backend_bench_")
+        db = Database(os.path.join(directory, "bench.db"))
+
+        def cleanup():
+            db.close()
+            shutil.rmtree(directory, ignore_errors=True)
+        return db, cleanup
+    if name == "supabase":
+        from database_supabase import SupabaseDB
+        from supabase_local import LocalSupabaseClient
+        db = SupabaseDB(client=LocalSupabaseClient(seed=seed, latency=latency))
+        return db, db.close
+    raise ValueError(f"Unknown backend: {name}")
+
+
+def make_items(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        words = rng.sample(range(len(WORDS)), 2)
+        items.append({
+            "type": TYPES[i % len(TYPES)],
+            "content": f"{WORDS[words[0]]} {i}",
+            "translation": f"{TRANSLATIONS[words[1]]} {i}",
+            "lemma": [WORDS[words[0]]],
+            "tags": rng.sample(TAGS, rng.randint(0, 2)),
+            "examples": [],
+            "embedding": rng.getrandbits(128).to_bytes(16, "little"),
+        })
+    return items
+
+
+# ----------------------
+# Conformance
+# ----------------------
+def _normalize(item: Optional[Dict]) -> Optional[Dict]:
+    """Drop timestamps and backend extras, decode base64 embeddings"""
+    if item is None:
+        return None
+    item = {k: v for k, v in dict(item).items() if k not in ("created_at", "last_reviewed", "snippet")}
+    if isinstance(item.get("embedding"), str):
+        item["embedding"] = base64.b64decode(item["embedding"])
+    return item
+
+
+def _contents(items: List[Dict]) -> List[str]:
+    return sorted(item["content"] for item in items)
+
+
+def _walk_pages(page: Callable, page_size: int = 7) -> List[int]:
+    ids, cursor = [], None
+    while True:
+        items, cursor = page(page_size=page_size, cursor=cursor)
+        ids.extend(item["id"] for item in items)
+        if cursor is None:
+            return ids
+
+
+def workload(db: StorageBackend, n: int = CONFORMANCE_SIZE) -> List[Tuple[str, object]]:
+    """Run the shared workload, returning named results that must match across backends"""
+    results = []
+    items = make_items(n)
+    ids, failures = db.add_items(items + [{"type": "Word"}])
+    results.append(("add_items", (ids[:n] == list(range(1, n + 1)), ids[n], [index for index, _ in failures])))
+    results.append(("get_item", _normalize(db.get_item(5))))
+    results.append(("get_item projected", _normalize(db.get_item(5, columns=("id", "content", "tags")))))
+    results.append(("get_item missing", db.get_item(n + 100)))
+
+    results.append(("search content", _contents(db.search_items(WORDS[3], columns=LIST_COLUMNS))))
+    results.append(("search translation", _contents(db.search_items(TRANSLATIONS[4], columns=LIST_COLUMNS))))
+    results.append(("search case", _contents(db.search_items(WORDS[5].upper(), columns=LIST_COLUMNS))))
+    results.append(("filter type", _contents(db.search_items(type_filter="Phrase", columns=LIST_COLUMNS))))
+    results.append(("filter tag", _contents(db.search_items(tag_filter="B1", columns=LIST_COLUMNS))))
+    results.append(("search + filters", _contents(db.search_items(
+        WORDS[7], type_filter="Word", tag_filter="A1", columns=LIST_COLUMNS))))
+    results.append(("page all", _walk_pages(lambda **kw: db.get_items_page(columns=LIST_COLUMNS, **kw))))
+    # Keyword pages may be ordered by relevance, which differs per backend
+    results.append(("page search", sorted(_walk_pages(lambda **kw: db.search_items_page(
+        WORDS[2], tag_filter="A2", columns=("content",), **kw)))))
+
+    db.update_item(7, translation="changed", tags=["B2", "new"])
+    results.append(("update_item", _normalize(db.get_item(7, columns=LIST_COLUMNS))))
+    db.update_review(8)
+    db.update_review(8)
+    db.update_reviews({9: (3, "2000-01-01T00:00:00"), 10: (1, "2000-01-01T00:00:00")})
+    results.append(("reviews", [db.get_item(i, columns=("review_count",))["review_count"] for i in (8, 9, 10, 11)]))
+
+    for weighted in (False, True):
+        tagged = {item["id"] for item in db.search_items(tag_filter="home", columns=("id",))}
+        sample = db.get_random_items(10, tag_filter="home", columns=("id", "tags"), weighted=weighted)
+        sample_ids = [item["id"] for item in sample]
+        results.append((f"sample weighted={weighted}", (
+            len(sample_ids) == min(10, len(tagged)),
+            len(set(sample_ids)) == len(sample_ids),
+            set(sample_ids) <= tagged,
+        )))
+
+    db.delete_item(11)
+    results.append(("delete_item", (db.get_item(11), db.get_stats()["total"])))
+    results.append(("iter_items", [item["id"] for item in db.iter_items(chunk_size=64, columns=("id",))]))
+    results.append(("get_all_items", [item["id"] for item in db.get_all_items(columns=("id", "content"))]))
+    results.append(("get_embeddings", {
+        item_id: base64.b64decode(value) if isinstance(value, str) else value
+        for item_id, value in db.get_embeddings([1, 2, 11]).items()
+    }))
+    results.append(("list_tags", db.list_tags()))
+    stats = db.get_stats()
+    results.append(("get_stats", {**stats, "by_type": dict(sorted(stats["by_type"].items())),
+                                  "by_tag": dict(sorted(stats["by_tag"].items()))}))
+
+    db.set_related_many({1: [(2, 0.9), (3, 0.8)], 4: [(1, 0.7), (2, 0.5)]})
+    db.set_related(5, [(2, 0.6)])
+    results.append(("get_related", [(item["id"], score) for item, score in db.get_related(1)]))
+    results.append(("get_related uncomputed", db.get_related(6)))
+    db.set_related(6, [])
+    results.append(("get_related empty", db.get_related(6)))
+    results.append(("get_related_lists filtered", db.get_related_lists(item_ids=[6], referencing=[3])))
+    results.append(("delete_related", sorted(db.delete_related(2))))
+    results.append(("get_related_lists", {k: sorted(v) for k, v in db.get_related_lists().items() if v}))
+    results.append(("delete_item related", (sorted(db.delete_item(1)),
+                                            {k: sorted(v) for k, v in db.get_related_lists().items()})))
+
+    csv_lines = db.export_to_csv().splitlines()
+    results.append(("export_to_csv", (csv_lines[0], len(csv_lines) - 1)))
+    return results
+
+
+def check(backends: List[str]) -> bool:
+    reference_db, cleanup = make_backend("memory")
+    try:
+        expected = dict(workload(reference_db))
+    finally:
+        cleanup()
+
+    ok = True
+    for name in backends:
+        db, cleanup = make_backend(name)
+        try:
+            results = workload(db)
+        finally:
+            cleanup()
+        mismatches = [(check_name, value) for check_name, value in results if value != expected[check_name]]
+        print(f"[{name}] {len(results) - len(mismatches)}/{len(results)} checks match the reference")
+        for check_name, value in mismatches:
+            ok = False
+            print(f"  MISMATCH {check_name}:\n    expected {expected[check_name]!r:.300}\n    got      {value!r:.300}")
+    return ok
+
+
+def german_search(backends: List[str]) -> Dict[str, Dict[str, List[str]]]:
+    """{case: {backend: matching contents}} for GERMAN_CASES"""
+    results: Dict[str, Dict[str, List[str]]] = {}
+    for name in backends:
+        db, cleanup = make_backend(name)
+        try:
+            db.add_items([{"type": "Word", "content": content, "translation": ""} for content in GERMAN_ITEMS])
+            for label, keyword in GERMAN_CASES:
+                results.setdefault(f"{label} ({keyword})", {})[name] = _contents(
+                    db.search_items(keyword, columns=LIST_COLUMNS))
+        finally:
+            cleanup()
+    return results
+
+
+def report_search_differences(backends: List[str]):
+    """Print the German search cases whose results differ between backends (not a failure)"""
+    names = ["memory"] + [name for name in backends if name != "memory"]
+    results = german_search(names)
+    differing = {case: by_backend for case, by_backend in results.items()
+                 if len({tuple(contents) for contents in by_backend.values()}) > 1}
+    print(f"\nGerman search: {len(results) - len(differing)}/{len(results)} cases agree across {', '.join(names)}")
+    for case, by_backend in differing.items():
+        print(f"  {case}")
+        for name, contents in by_backend.items():
+            print(f"    {name:<10}{contents}")
+
+
+# ----------------------
+# Benchmark
+# ----------------------
+def _measure(op: Callable[[], object], repeat: int, budget: float) -> List[float]:
+    """Latencies (seconds) of up to `repeat` calls, stopping once `budget` seconds are spent"""
+    latencies = []
+    deadline = time.perf_counter() + budget
+    while len(latencies) < repeat and (not latencies or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        op()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _summary(latencies: List[float]) -> Tuple[float, float]:
+    """(ops/sec, p95 latency in ms)"""
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return len(ordered) / sum(ordered), p95 * 1000
+
+
+def bench(name: str, n: int, repeat: int, budget: float, seed: int = 0,
+          latency: float = 0.0) -> Dict[str, Tuple[int, float, float]]:
+    """{operation: (calls, ops/sec, p95 ms)}; one insert call adds INSERT_BATCH rows"""
+    rng = random.Random(seed)
+    db, cleanup = make_backend(name, seed, latency)
+    try:
+        items = make_items(n, seed)
+        insert = []
+        for start in range(0, n, INSERT_BATCH):
+            batch = items[start:start + INSERT_BATCH]
+            began = time.perf_counter()
+            db.add_items(batch)
+            insert.append(time.perf_counter() - began)
+
+        ops = {
+            "search": lambda: db.search_items_page(rng.choice(WORDS), columns=LIST_COLUMNS),
+            "filter": lambda: db.search_items_page(type_filter=rng.choice(TYPES), tag_filter=rng.choice(TAGS),
+                                                   columns=LIST_COLUMNS),
+            "sample": lambda: db.get_random_items(10, columns=LIST_COLUMNS),
+            "review": lambda: db.update_review(rng.randint(1, n)),
+            # After "review", so review counts (and weights) vary
+            "weighted": lambda: db.get_random_items(10, columns=LIST_COLUMNS, weighted=True),
+        }
+        report = {"insert": (len(insert), *_summary(insert))}
+        for op_name, op in ops.items():
+            latencies = _measure(op, repeat, budget)
+            report[op_name] = (len(latencies), *_summary(latencies))
+        return report
+    finally:
+        cleanup()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Storage backend conformance checks and benchmarks")
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite", "supabase"],
+                        choices=["memory", "sqlite", "supabase"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=200, help="maximum calls per operation")
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds per operation before stopping early")
+    parser.add_argument("--check-only", action="store_true", help="skip the benchmark")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds of simulated round trip per Supabase request")
+    args = parser.parse_args()
+
+    ok = check(args.backends)
+    report_search_differences(args.backends)
+    if not args.check_only:
+        print(f"\n{'backend':<10}{'rows':>8}  {'operation':<10}{'calls':>7}{'ops/sec':>12}{'p95 ms':>10}")
+        for n in args.sizes:
+            for name in args.backends:
+                report = bench(name, n, args.repeat, args.budget, latency=args.latency)
+                for op_name, (calls, ops_per_sec, p95) in report.items():
+                    print(f"{name:<10}{n:>8}  {op_name:<10}{calls:>7}{ops_per_sec:>12.1f}{p95:>10.2f}")
+        print(f"\ninsert: one call adds {INSERT_BATCH} rows")
+        if "supabase" in args.backends:
+            print("supabase: in-process LocalSupabaseClient, no HTTP or Postgres (see the module docstring)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,403 @@
 """
 import sqlite3
 import json
+import base64
 import datetime
-from typing import List, Dict, Optional, Tuple
+import itertools
+import re
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from sampling import bucket_weighted_sample, rejection_weighted_sample, review_weight, uniform_id_sample
+
+# 条目的全部字段（按名称映射，不依赖列的位置）
+ITEM_COLUMNS = ('id', 'type', 'content', 'translation', 'lemma', 'tags', 'examples',
+                'created_at', 'last_reviewed', 'review_count', 'embedding')
+# 列表视图的投影：不包含 embedding BLOB
+LIST_COLUMNS = tuple(column for column in ITEM_COLUMNS if column != 'embedding')
+# 以 JSON 字符串存储的字段
+JSON_COLUMNS = ('lemma', 'tags', 'examples')
+
+# 分页大小
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+# 流式读取全表时每块的条目数
+DEFAULT_CHUNK_SIZE = 1000
+# 有未推送到 Supabase 的内容的条目（新增、修改或复习）
+_UNSYNCED = "remote_id IS NULL OR dirty > 0 OR review_delta > 0"
+
+
+class LazyItem(dict):
+    """
+    条目字典：JSON 字段（lemma、tags、examples）在首次访问时才解码
+
+    对外表现与普通 dict 一致，遍历 items()/values() 或复制时会先解码全部字段
+    """
+    __slots__ = ('_pending',)
+
+    def __init__(self, values: Dict, pending: Dict[str, Optional[str]]):
+        super().__init__(values)
+        self._pending = pending
+
+    def _decode(self, key):
+        raw = self._pending.pop(key)
+        value = json.loads(raw) if raw else []
+        dict.__setitem__(self, key, value)
+        return value
+
+    def _decode_all(self):
+        for key in list(self._pending):
+            self._decode(key)
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            return self._decode(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key in self._pending:
+            return self._decode(key)
+        return dict.get(self, key, default)
+
+    def __setitem__(self, key, value):
+        self._pending.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __iter__(self):
+        # 覆盖 __iter__ 使 dict(item) / {**item} 通过 keys() + __getitem__ 复制
+        return dict.__iter__(self)
+
+    def pop(self, key, *args):
+        if key in self._pending:
+            self._decode(key)
+        return dict.pop(self, key, *args)
+
+    def items(self):
+        self._decode_all()
+        return dict.items(self)
+
+    def values(self):
+        self._decode_all()
+        return dict.values(self)
+
+    def copy(self):
+        self._decode_all()
+        return dict(dict.items(self))
+
+    def __eq__(self, other):
+        self._decode_all()
+        return dict.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._decode_all()
+        return dict.__repr__(self)
+
+    def __reduce__(self):
+        return (dict, (self.copy(),))
+
+
+_GERMAN_FOLDING = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss', 'ẞ': 'ss'})
+_GERMAN_STRIPPING = str.maketrans({'ä': 'a', 'ö': 'o', 'ü': 'u', 'ß': 'ss', 'ẞ': 'ss'})
+
+
+def fold_german(text: Optional[str]) -> str:
+    """
+    德语规范化：小写并展开变音和 ß（ä→ae、ö→oe、ü→ue、ß→ss）
+
+    索引和查询都经过同样的处理，因此 "strasse" 能找到 "Straße"，"ueber" 能找到 "über"
+    """
+    if not text:
+        return ""
+    return text.lower().translate(_GERMAN_FOLDING)
+
+
+def strip_german(text: Optional[str]) -> str:
+    """小写并去掉变音符号（ä→a、ö→o、ü→u、ß→ss），不写变音的关键词（uber）也能找到 über"""
+    if not text:
+        return ""
+    return text.lower().translate(_GERMAN_STRIPPING)
+
+
+def register_functions(conn: sqlite3.Connection):
+    """
+    在连接上注册数据库需要的自定义函数
+
+    items 表的全文索引触发器会调用 de_fold()，没有注册的连接写入 items 时会报
+    "no such function: de_fold"。Database 的连接会自动注册；其他 Python 程序直接
+    写入数据库文件前需要先在自己的连接上调用本函数
+    """
+    conn.create_function("de_fold", 1, fold_german, deterministic=True)
+    conn.create_function("de_strip", 1, strip_german, deterministic=True)
+
+
+def _like_pattern(text: str) -> str:
+    """子串匹配的 LIKE 模式（转义 %、_ 和 \\，配合 ESCAPE '\\' 使用）"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _infix_condition(keyword: str, fts: bool = False) -> Tuple[str, List]:
+    """
+    关键词的子串匹配条件：按空白分词，每个词都要出现在规范化后的原文或译文中（词之间为 AND），
+    词中的标点按字面匹配（"100%" 不会找到 "1000"）
+
+    按 de_fold（ä→ae）比较；不含变音/ß 的词还按 de_strip（ä→a）比较，"uber" 能找到 "über"，
+    而 "äuse" 不会找到 "zu Hause"
+    fts: 从全文索引表读取已经 de_fold 的文本，不必逐行调用 Python 函数
+    """
+    conditions, params = [], []
+    for term in keyword.split():
+        folded = _like_pattern(fold_german(term))
+        if fts:
+            condition = ("items.id IN (SELECT rowid FROM items_fts"
+                         " WHERE content LIKE ? ESCAPE '\\' OR translation LIKE ? ESCAPE '\\')")
+        else:
+            condition = ("de_fold(items.content) LIKE ? ESCAPE '\\'"
+                         " OR de_fold(items.translation) LIKE ? ESCAPE '\\'")
+        params.extend([folded, folded])
+        if strip_german(term) == term.lower():
+            # 只有含变音的文本 de_strip 和 de_fold 的结果才不同，先用 GLOB 排除其余的行
+            stripped = _like_pattern(strip_german(term))
+            condition += (
+                " OR (items.content GLOB '*[äöüÄÖÜ]*' AND de_strip(items.content) LIKE ? ESCAPE '\\')"
+                " OR (items.translation GLOB '*[äöüÄÖÜ]*' AND de_strip(items.translation) LIKE ? ESCAPE '\\')"
+            )
+            params.extend([stripped, stripped])
+        conditions.append(f"({condition})")
+    return " AND ".join(conditions), params
+
+
+def _fts_query(keyword: str) -> Optional[str]:
+    """
+    将关键词转换为 FTS5 查询：每个词按前缀匹配，词之间为 AND
+
+    只有每个词都由字母数字组成时才使用全文索引，含标点的关键词（"100%"）只按子串字面匹配
+    """
+    terms = fold_german(keyword).split()
+    if not terms or not all(re.fullmatch(r"\w+", term) for term in terms):
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def highlight_snippet(text: Optional[str], keyword: str, width: int = 80) -> str:
+    """
+    生成高亮摘要：匹配的词用 ** 包裹（Markdown 粗体），并截取第一个匹配附近的文本
+    """
+    if not text:
+        return ""
+    terms = re.findall(r"\w+", fold_german(keyword))
+    first_match = None
+
+    def mark(match):
+        nonlocal first_match
+        word = match.group(0)
+        folded, stripped = fold_german(word), strip_german(word)
+        if any(term in folded or term in stripped for term in terms):
+            if first_match is None:
+                first_match = match.start()
+            return f"**{word}**"
+        return word
+
+    marked = re.sub(r"\w+", mark, text)
+    if first_match is None or len(text) <= width:
+        return marked
+    # 按原文位置估算截取起点（标记只会让文本变长，起点仍在匹配之前）
+    start = max(first_match - width // 4, 0)
+    prefix = "…" if start > 0 else ""
+    snippet = re.sub(r"\w+", mark, text[start:start + width])
+    suffix = "…" if start + width < len(text) else ""
+    return prefix + snippet + suffix
+
+
+def _column_list(columns: Optional[Sequence[str]], table: str = "items") -> str:
+    """生成 SELECT 的列清单，只允许已知字段"""
+    columns = ITEM_COLUMNS if columns is None else columns
+    unknown = [column for column in columns if column not in ITEM_COLUMNS]
+    if unknown:
+        raise ValueError(f"未知字段: {unknown}")
+    return ", ".join(f"{table}.{column}" for column in columns)
+
+
+def _insert_row(item: Dict, created_at: str) -> Tuple:
+    """把 add_items 的输入转换为 INSERT 参数（缺少 type/content 时抛出 KeyError）"""
+    return (
+        item['type'],
+        item['content'],
+        item.get('translation'),
+        json.dumps(item.get('lemma') or []),
+        json.dumps(item.get('tags') or []),
+        json.dumps(item.get('examples') or []),
+        created_at,
+        None,
+        0,
+        item.get('embedding'),
+    )
+
+
+def _row_to_item(row: Sequence, columns: Sequence[str]) -> LazyItem:
+    """按列名将查询结果的一行转换为条目字典"""
+    values = {}
+    pending = {}
+    for column, value in zip(columns, row):
+        if column in JSON_COLUMNS:
+            pending[column] = value
+            values[column] = None
+        else:
+            values[column] = value
+    return LazyItem(values, pending)
+
+
+# CSV 导出时 embedding 的处理：'skip' 不导出该列，'base64' 导出为 base64 文本
+CSV_EMBEDDING_MODES = ('skip', 'base64')
+
+
+def csv_columns(embeddings: str = 'skip') -> Tuple[str, ...]:
+    """CSV 导出的列"""
+    if embeddings not in CSV_EMBEDDING_MODES:
+        raise ValueError(f"embeddings 只能是 {CSV_EMBEDDING_MODES}，收到 {embeddings!r}")
+    return ITEM_COLUMNS if embeddings == 'base64' else LIST_COLUMNS
+
+
+def encode_csv(chunks: Iterable[List[Dict]], columns: Sequence[str]) -> Iterator[bytes]:
+    """
+    把分块读取的条目逐块转换为 UTF-8 编码的 CSV，先产出表头，之后每块产出一段
+    
+    只保留当前块，内存占用与条目总数无关；BLOB 格式的 embedding 转为 base64 文本
+    """
+    import csv
+    import io
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns), extrasaction='ignore', lineterminator='\n')
+    writer.writeheader()
+    for chunk in chunks:
+        for item in chunk:
+            row = dict(item)
+            if isinstance(row.get('embedding'), bytes):
+                row['embedding'] = base64.b64encode(row['embedding']).decode('ascii')
+            writer.writerow(row)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # 没有任何条目时只有表头
+        yield buffer.getvalue().encode('utf-8')
+
+
+# 内存数据库共享缓存 URI 的序号
+_memory_db_numbers = itertools.count(1)
+
+
+class ConnectionManager:
+    """
+    SQLite 连接管理：每个线程使用自己的连接和游标
+
+    文件数据库使用 WAL 日志模式，读操作不会被正在写入（例如批量导入）的线程阻塞；
+    写操作之间由 SQLite 串行化，忙时最多等待 timeout 秒。
+    Streamlit 每次重新运行脚本都可能换一个线程，新建连接时会关闭已退出线程的连接。
+    """
+    def __init__(self, db_path: str, timeout: float = 30.0, cached_statements: int = 256,
+                 cache_size_kb: int = 16384, on_connect=None):
+        """
+        cached_statements: 每个连接缓存的预编译语句数量
+        cache_size_kb: 每个连接的页缓存大小（KB）
+        on_connect: 新连接创建后的回调，例如注册自定义函数
+        """
+        self.db_path = db_path
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.cache_size_kb = cache_size_kb
+        self.on_connect = on_connect
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        # 内存数据库改用共享缓存的 URI，所有线程看到同一个数据库
+        self._uri = db_path == ":memory:"
+        if self._uri:
+            # 名称在进程内唯一（id(self) 会在对象回收后复用，新实例可能打开仍有连接的旧数据库）
+            self.db_path = f"file:deutschnest-{next(_memory_db_numbers)}?mode=memory&cache=shared"
+            # 共享缓存的内存数据库在最后一个连接关闭时销毁，保留一个连接
+            self._keepalive = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,  # 允许 close_all() 从其他线程关闭
+            cached_statements=self.cached_statements,
+            uri=self._uri,
+        )
+        if not self._uri:
+            conn.execute("PRAGMA journal_mode = WAL")
+            # WAL 模式下 NORMAL 不会损坏数据库，只可能在断电时丢失最近的事务
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """返回当前线程的连接（首次调用时创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            with self._lock:
+                self._close_dead_threads()
+                self._connections[threading.current_thread()] = conn
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+        return conn
+
+    def cursor(self) -> sqlite3.Cursor:
+        """返回当前线程的游标"""
+        self.connection()
+        return self._local.cursor
+
+    def _close_dead_threads(self):
+        for thread in [t for t in self._connections if not t.is_alive()]:
+            self._connections.pop(thread).close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._connections)
+
+    def close_all(self):
+        """关闭所有线程的连接"""
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+            if self._uri:
+                self._keepalive.close()
+        self._local = threading.local()
+
 
 class Database:
-    def __init__(self, db_path: str = "german_learning.db"):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.c = self.conn.cursor()
+    def __init__(self, db_path: str = "german_learning.db", ann_index=None, sync: bool = False):
+        """
+        ann_index: 可选的 ann_index.IVFIndex，增删改条目时会增量更新
+        sync: 离线模式下为 True，添加与 Supabase 同步用的字段和表（见 enable_sync）
+        """
+        # 全文索引的触发器会调用 de_fold()，每个连接都需要注册（其他程序写入时见 register_functions）
+        self.connections = ConnectionManager(db_path, on_connect=register_functions)
+        self.fts_enabled = False
+        self.sync_enabled = False
+        self.ann_index = ann_index
         self.init_db()
+        if sync:
+            self.enable_sync()
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程的连接"""
+        return self.connections.connection()
+    
+    @property
+    def c(self) -> sqlite3.Cursor:
+        """当前线程的游标"""
+        return self.connections.cursor()
     
     def init_db(self):
         """初始化数据库表"""
@@ -37,6 +426,122 @@ class Database:
         except sqlite3.OperationalError:
             # 字段已存在，忽略错误
             pass
+        
+        # 物化的相关条目列表：每个条目的 top-k 相关条目及相似度
+        # 每个已计算的列表另有一行 (item_id, item_id, NULL) 作为标记，列表为空时也能与"尚未计算"区分
+        self.c.execute("""
+            CREATE TABLE IF NOT EXISTS related (
+                item_id INTEGER NOT NULL,
+                related_id INTEGER NOT NULL,
+                score REAL,
+                PRIMARY KEY (item_id, related_id)
+            )
+        """)
+        self.c.execute("CREATE INDEX IF NOT EXISTS idx_related_related_id ON related (related_id)")
+        self.conn.commit()
+        
+        # 标签关联表：每个 (条目, 标签) 一行，按标签建索引
+        self.c.execute("""
+            CREATE TABLE IF NOT EXISTS item_tags (
+                item_id INTEGER NOT NULL,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (item_id, tag)
+            )
+        """)
+        self.c.execute("CREATE INDEX IF NOT EXISTS idx_item_tags_tag ON item_tags (tag, item_id)")
+        # 分页按 (created_at, id) 倒序遍历
+        self.c.execute("CREATE INDEX IF NOT EXISTS idx_items_created_id ON items (created_at, id)")
+        # 加权抽样按复习次数分组计数、按排名读取
+        self.c.execute("CREATE INDEX IF NOT EXISTS idx_items_review ON items (review_count, id)")
+        self.conn.commit()
+        
+        self._migrate()
+        # 曾以离线模式打开过的文件保留同步字段，之后的写入都要继续记录
+        self.c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_state'")
+        self.sync_enabled = self.c.fetchone() is not None
+    
+    def enable_sync(self):
+        """
+        添加与 Supabase 同步用的字段和表（见 sync_engine.py，只在离线模式下执行）：
+        remote_id 为条目在 Supabase 中的 id（未上传时为 NULL），
+        dirty 为尚未推送的修改次数，review_delta 为尚未推送的复习次数
+        """
+        for column in ("remote_id INTEGER", "dirty INTEGER DEFAULT 0", "review_delta INTEGER DEFAULT 0"):
+            try:
+                self.c.execute(f"ALTER TABLE items ADD COLUMN {column}")
+                self.conn.commit()
+            except sqlite3.OperationalError:
+                pass
+        self.c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_items_remote_id ON items (remote_id)")
+        self.c.execute(f"CREATE INDEX IF NOT EXISTS idx_items_unsynced ON items (id) WHERE {_UNSYNCED}")
+        # 已在本地删除、尚未在 Supabase 删除的条目
+        self.c.execute("""
+            CREATE TABLE IF NOT EXISTS sync_tombstones (
+                remote_id INTEGER PRIMARY KEY,
+                deleted_at TEXT
+            )
+        """)
+        # sync_state 最后创建，它的存在表示迁移已完成
+        self.c.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.sync_enabled = True
+    
+    def _migrate(self):
+        """按 PRAGMA user_version 执行数据迁移"""
+        version = self.c.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # 版本 1：从 JSON 格式的 tags 字段填充 item_tags
+            self.c.execute("SELECT id, tags FROM items")
+            rows = [
+                (item_id, tag)
+                for item_id, tags in self.c.fetchall()
+                for tag in set(json.loads(tags) if tags else [])
+            ]
+            self.c.executemany("INSERT OR IGNORE INTO item_tags (item_id, tag) VALUES (?, ?)", rows)
+            self.c.execute("PRAGMA user_version = 1")
+            self.conn.commit()
+            version = 1
+        if version < 2:
+            # 版本 2：FTS5 全文索引（存储德语规范化后的文本），由触发器保持同步
+            try:
+                self.c.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+                        content, translation,
+                        tokenize = "unicode61 remove_diacritics 2"
+                    )
+                """)
+            except sqlite3.OperationalError:
+                # 当前 SQLite 未编译 FTS5，关键词搜索退回 LIKE
+                pass
+            else:
+                self.c.executescript("""
+                    CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+                        INSERT INTO items_fts (rowid, content, translation)
+                        VALUES (new.id, de_fold(new.content), de_fold(new.translation));
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF content, translation ON items BEGIN
+                        UPDATE items_fts SET content = de_fold(new.content), translation = de_fold(new.translation)
+                        WHERE rowid = new.id;
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+                        DELETE FROM items_fts WHERE rowid = old.id;
+                    END;
+                    DELETE FROM items_fts;
+                    INSERT INTO items_fts (rowid, content, translation)
+                        SELECT id, de_fold(content), de_fold(translation) FROM items;
+                    PRAGMA user_version = 2;
+                """)
+                self.conn.commit()
+        self.c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'")
+        self.fts_enabled = self.c.fetchone() is not None
+    
+    def _set_tags(self, item_id: int, tags: List[str]):
+        """替换条目在 item_tags 中的标签（不提交事务）"""
+        self.c.execute("DELETE FROM item_tags WHERE item_id = ?", (item_id,))
+        self.c.executemany(
+            "INSERT OR IGNORE INTO item_tags (item_id, tag) VALUES (?, ?)",
+            [(item_id, tag) for tag in set(tags or [])]
+        )
     
     def add_item(self, type_: str, content: str, translation: str, 
                  lemma: List[str], tags: List[str], examples: List[str] = None,
@@ -61,74 +566,215 @@ class Database:
             0,
             embedding
         ))
+        item_id = self.c.lastrowid
+        self._set_tags(item_id, tags)
         self.conn.commit()
-        return self.c.lastrowid
-    
-    def get_item(self, item_id: int) -> Optional[Dict]:
+        if self.ann_index is not None and embedding is not None:
+            self.ann_index.upsert(item_id, embedding)
+        return item_id
+
+    def add_items(self, items: List[Dict]) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+        """
+        批量添加条目，整批在一个事务中提交
+
+        items: 每项为 dict，键与 add_item 的参数相同（类型使用 'type'）
+        返回: (ids, failures)
+            ids 与 items 一一对应，失败的行为 None
+            failures 为 [(行号, 错误信息), ...]
+        """
+        ids: List[Optional[int]] = [None] * len(items)
+        failures: List[Tuple[int, str]] = []
+        now = datetime.datetime.now().isoformat()
+
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                rows.append((index, _insert_row(item, now)))
+            except (KeyError, TypeError, ValueError) as e:
+                failures.append((index, f"{type(e).__name__}: {e}"))
+        if not rows:
+            return ids, failures
+
+        insert = """
+            INSERT INTO items (type, content, translation, lemma, tags, examples,
+                             created_at, last_reviewed, review_count, embedding)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        try:
+            self.c.executemany(insert, [row for _, row in rows])
+            # 同一事务内的自增 id 连续分配
+            last_id = self.c.execute("SELECT last_insert_rowid()").fetchone()[0]
+            for offset, (index, _) in enumerate(rows):
+                ids[index] = last_id - len(rows) + 1 + offset
+        except sqlite3.Error:
+            # 有行出错时回滚整批，改为在同一事务中逐行插入以定位失败的行
+            self.conn.rollback()
+            for index, row in rows:
+                try:
+                    self.c.execute(insert, row)
+                    ids[index] = self.c.lastrowid
+                except sqlite3.Error as e:
+                    failures.append((index, f"{type(e).__name__}: {e}"))
+            failures.sort()
+
+        self.c.executemany(
+            "INSERT OR IGNORE INTO item_tags (item_id, tag) VALUES (?, ?)",
+            [
+                (ids[index], tag)
+                for index, _ in rows if ids[index] is not None
+                for tag in set(items[index].get('tags') or [])
+            ]
+        )
+        self.conn.commit()
+
+        if self.ann_index is not None:
+            self.ann_index.upsert_many([
+                (ids[index], items[index]['embedding'])
+                for index, _ in rows
+                if ids[index] is not None and items[index].get('embedding') is not None
+            ])
+        return ids, failures
+
+    def get_item(self, item_id: int, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
         """获取单个条目"""
-        self.c.execute("SELECT * FROM items WHERE id = ?", (item_id,))
+        columns = ITEM_COLUMNS if columns is None else columns
+        self.c.execute(f"SELECT {_column_list(columns)} FROM items WHERE id = ?", (item_id,))
         row = self.c.fetchone()
         if not row:
             return None
-        
-        # 处理可能不存在的 embedding 字段（向后兼容）
-        embedding = row[10] if len(row) > 10 else None
-        
-        return {
-            'id': row[0],
-            'type': row[1],
-            'content': row[2],
-            'translation': row[3],
-            'lemma': json.loads(row[4]) if row[4] else [],
-            'tags': json.loads(row[5]) if row[5] else [],
-            'examples': json.loads(row[6]) if row[6] else [],
-            'created_at': row[7],
-            'last_reviewed': row[8],
-            'review_count': row[9],
-            'embedding': embedding
-        }
+        return _row_to_item(row, columns)
     
-    def search_items(self, keyword: str = "", type_filter: str = None, 
-                    tag_filter: str = None) -> List[Dict]:
-        """搜索条目"""
-        query = "SELECT * FROM items WHERE 1=1"
+    def _search_query(self, keyword: str, type_filter: Optional[str], tag_filter: Optional[str],
+                      columns: Sequence[str], ranked: bool = False) -> Tuple[str, List, Optional[str]]:
+        """
+        构建搜索的 SELECT ... WHERE 部分
+        
+        有关键词且有全文索引时，结果是全文索引命中（按词前缀）和子串匹配（见 _infix_condition）
+        的并集，相关度为 bm25（越小越相关），只有子串匹配的条目相关度为 1.0，排在所有全文索引
+        命中之后（bm25 不大于 0）
+        ranked: 在 columns 之后多选一列相关度
+        返回: (SQL, 参数, 相关度表达式)，不按相关度排序时表达式为 None
+        """
         params = []
+        rank = None
         
-        if keyword:
-            query += " AND (content LIKE ? OR translation LIKE ?)"
-            params.extend([f'%{keyword}%', f'%{keyword}%'])
+        if keyword and self.fts_enabled:
+            fts_query = _fts_query(keyword)
+            rank = "COALESCE(fts.rank, 1.0)" if fts_query else "1.0"
+            rank_column = f", {rank}" if ranked else ""
+            query = f"SELECT {_column_list(columns)}{rank_column} FROM items"
+            if fts_query:
+                query += """
+                    LEFT JOIN (SELECT rowid, bm25(items_fts) AS rank FROM items_fts WHERE items_fts MATCH ?) AS fts
+                    ON fts.rowid = items.id
+                """
+                params.append(fts_query)
+            condition, condition_params = _infix_condition(keyword, fts=True)
+            if fts_query:
+                condition = f"fts.rowid IS NOT NULL OR {condition}"
+            query += f" WHERE ({condition})"
+            params.extend(condition_params)
+        else:
+            query = f"SELECT {_column_list(columns)} FROM items WHERE 1=1"
+            if keyword:
+                condition, condition_params = _infix_condition(keyword)
+                query += f" AND {condition}"
+                params.extend(condition_params)
         
         if type_filter:
-            query += " AND type = ?"
+            query += " AND items.type = ?"
             params.append(type_filter)
         
         if tag_filter:
-            query += " AND tags LIKE ?"
-            params.append(f'%{tag_filter}%')
+            query += " AND items.id IN (SELECT item_id FROM item_tags WHERE tag = ?)"
+            params.append(tag_filter)
         
-        query += " ORDER BY created_at DESC"
+        return query, params, rank
+    
+    @staticmethod
+    def _add_snippets(results: List[Dict], keyword: str):
+        """为搜索结果附加高亮摘要"""
+        if not keyword:
+            return
+        for item in results:
+            # 优先显示德语原文中的匹配，原文没有匹配时显示译文
+            snippet = highlight_snippet(item.get('content'), keyword)
+            if '**' not in snippet and item.get('translation'):
+                snippet = highlight_snippet(item.get('translation'), keyword)
+            item['snippet'] = snippet
+    
+    def search_items(self, keyword: str = "", type_filter: str = None, 
+                    tag_filter: str = None, columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        搜索条目
         
+        有关键词时返回 FTS5 全文索引（支持变音/ß 规范化）和子串匹配（"ause" 找到 "Hause"，
+        "strasse" 找到 "Bahnhofstraße"）的并集，全文索引命中按 bm25 相关度排在前面，
+        每个结果附带 'snippet' 字段（匹配词高亮）；否则按创建时间倒序
+        
+        columns: 要读取的字段（投影），例如 LIST_COLUMNS 不读取 embedding
+        """
+        columns = ITEM_COLUMNS if columns is None else columns
+        query, params, rank = self._search_query(keyword, type_filter, tag_filter, columns)
+        if rank:
+            query += f" ORDER BY {rank}, items.id"
+        else:
+            query += " ORDER BY items.created_at DESC"
         self.c.execute(query, params)
         rows = self.c.fetchall()
+        results = [_row_to_item(row, columns) for row in rows]
+        self._add_snippets(results, keyword)
+        return results
+    
+    def search_items_page(self, keyword: str = "", type_filter: str = None, tag_filter: str = None,
+                          page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[Union[str, float], int]] = None,
+                          columns: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[Tuple[Union[str, float], int]]]:
+        """
+        分页搜索条目（游标分页）
         
-        result = []
-        for row in rows:
-            # 处理可能不存在的 embedding 字段（向后兼容）
-            embedding = row[10] if len(row) > 10 else None
-            result.append({
-                'id': row[0],
-                'type': row[1],
-                'content': row[2],
-                'translation': row[3],
-                'lemma': json.loads(row[4]) if row[4] else [],
-                'tags': json.loads(row[5]) if row[5] else [],
-                'examples': json.loads(row[6]) if row[6] else [],
-                'created_at': row[7],
-                'last_reviewed': row[8],
-                'review_count': row[9],
-                'embedding': embedding
-            })
-        return result
+        有关键词时按相关度排序（全文索引命中在前，见 _search_query），游标为 (rank, id)；
+        否则按创建时间倒序，游标为 (created_at, id)。
+        相关度随全文索引的统计变化，翻页期间有写入时个别条目可能重复或跳过
+        
+        cursor: 上一页返回的游标，None 表示第一页
+        返回: (本页条目, 下一页游标)，没有下一页时游标为 None
+        """
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        columns = ITEM_COLUMNS if columns is None else columns
+        # 游标需要 id 和 created_at
+        query_columns = tuple(columns) + tuple(c for c in ('id', 'created_at') if c not in columns)
+        query, params, rank = self._search_query(keyword, type_filter, tag_filter, query_columns, ranked=True)
+        
+        if rank:
+            # 相关度越小越相关
+            if cursor is not None:
+                query += f" AND ({rank}, items.id) > (?, ?)"
+                params.extend(cursor)
+            query += f" ORDER BY {rank}, items.id LIMIT ?"
+        else:
+            if cursor is not None:
+                query += " AND (items.created_at, items.id) < (?, ?)"
+                params.extend(cursor)
+            query += " ORDER BY items.created_at DESC, items.id DESC LIMIT ?"
+        params.append(page_size + 1)
+        
+        self.c.execute(query, params)
+        rows = self.c.fetchall()
+        results = [_row_to_item(row, query_columns) for row in rows]
+        next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            if rank:
+                next_cursor = (rows[page_size - 1][-1], results[-1]['id'])
+            else:
+                next_cursor = (results[-1]['created_at'], results[-1]['id'])
+        self._add_snippets(results, keyword)
+        return results, next_cursor
+    
+    def get_items_page(self, page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[str, int]] = None,
+                       columns: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """分页获取所有条目，返回 (本页条目, 下一页游标)"""
+        return self.search_items_page(page_size=page_size, cursor=cursor, columns=columns)
     
     def update_item(self, item_id: int, **kwargs):
         """更新条目"""
@@ -146,86 +792,474 @@ class Database:
         if not updates:
             return
         
+        if self.sync_enabled:
+            updates.append("dirty = dirty + 1")
         values.append(item_id)
         query = f"UPDATE items SET {', '.join(updates)} WHERE id = ?"
         self.c.execute(query, values)
+        if 'tags' in kwargs:
+            self._set_tags(item_id, kwargs['tags'])
         self.conn.commit()
+        if self.ann_index is not None and 'embedding' in kwargs:
+            self.ann_index.upsert(item_id, kwargs['embedding'])
     
-    def delete_item(self, item_id: int):
-        """删除条目"""
+    def delete_item(self, item_id: int) -> List[int]:
+        """
+        删除条目，并在同一事务中删除它的相关条目列表及其在其他列表中的出现
+
+        返回引用了它的条目 id（这些列表需要重算）
+        """
+        if self.sync_enabled:
+            # 已上传的条目留下墓碑，由同步引擎在 Supabase 中删除
+            self.c.execute("""
+                INSERT OR REPLACE INTO sync_tombstones (remote_id, deleted_at)
+                SELECT remote_id, ? FROM items WHERE id = ? AND remote_id IS NOT NULL
+            """, (datetime.datetime.now().isoformat(), item_id))
+        referencing = self._unlink_related([item_id])
         self.c.execute("DELETE FROM items WHERE id = ?", (item_id,))
+        self.c.execute("DELETE FROM item_tags WHERE item_id = ?", (item_id,))
         self.conn.commit()
+        if self.ann_index is not None:
+            self.ann_index.remove(item_id)
+        return referencing
     
     def update_review(self, item_id: int):
         """更新复习记录"""
-        self.c.execute("""
+        self.update_reviews({item_id: (1, datetime.datetime.now().isoformat())})
+    
+    def update_reviews(self, reviews: Dict[int, Tuple[int, str]]):
+        """
+        批量更新复习记录（一个事务）
+        
+        reviews: {item_id: (复习次数增量, 最后复习时间)}
+        """
+        if not reviews:
+            return
+        # review_delta 只在启用同步时记录（取同一个增量）
+        delta = ", review_delta = review_delta + ?2" if self.sync_enabled else ""
+        self.c.executemany(f"""
             UPDATE items 
-            SET last_reviewed = ?, review_count = review_count + 1 
-            WHERE id = ?
-        """, (datetime.datetime.now().isoformat(), item_id))
+            SET last_reviewed = ?1, review_count = review_count + ?2{delta}
+            WHERE id = ?3
+        """, [(last_reviewed, count, item_id) for item_id, (count, last_reviewed) in reviews.items()])
         self.conn.commit()
     
-    def get_random_items(self, limit: int = 1, tag_filter: str = None) -> List[Dict]:
-        """随机获取条目用于复习"""
+    def get_random_items(self, limit: int = 1, tag_filter: str = None,
+                         columns: Optional[Sequence[str]] = None, weighted: bool = False) -> List[Dict]:
+        """
+        随机获取条目用于复习
+        
+        默认均匀抽样（见 _probe_random_ids）：每个样本一次索引查找，不对整表排序；
+        weighted=True 时按 review_weight（复习次数越少权重越大）加权抽样（见 _weighted_random_ids），
+        两种方式都不把整表读到 Python 中
+        """
+        columns = ITEM_COLUMNS if columns is None else columns
+        if weighted:
+            ids = self._weighted_random_ids(limit, tag_filter)
+        else:
+            ids = self._probe_random_ids(limit, tag_filter)
+        
+        if not ids:
+            return []
+        # 按抽样顺序返回，需要 id 对应结果
+        query_columns = tuple(columns) + (() if 'id' in columns else ('id',))
+        placeholders = ", ".join("?" * len(ids))
+        self.c.execute(f"SELECT {_column_list(query_columns)} FROM items WHERE id IN ({placeholders})", ids)
+        rows = {item['id']: item for item in (_row_to_item(row, query_columns) for row in self.c.fetchall())}
+        return [rows[item_id] for item_id in ids if item_id in rows]
+    
+    def _id_set(self, tag_filter: Optional[str]) -> Tuple[int, Optional[int], Optional[int], Callable, Callable]:
+        """
+        抽样用的 id 集合（全部条目或某个标签的条目）
+
+        返回 (元素数, 最小 id, 最大 id, contains(id), at_rank(r))，
+        使用 items 主键或 item_tags 的 (tag, item_id) 索引
+        """
         if tag_filter:
-            query = "SELECT * FROM items WHERE tags LIKE ? ORDER BY RANDOM() LIMIT ?"
-            self.c.execute(query, (f'%{tag_filter}%', limit))
+            # 各自作为子查询，MIN/MAX 才会只查索引的两端
+            count, low, high = self.c.execute("""
+                SELECT (SELECT COUNT(*) FROM item_tags WHERE tag = ?1),
+                       (SELECT MIN(item_id) FROM item_tags WHERE tag = ?1),
+                       (SELECT MAX(item_id) FROM item_tags WHERE tag = ?1)
+            """, (tag_filter,)).fetchone()
+            member_query = "SELECT 1 FROM item_tags WHERE tag = ? AND item_id = ?"
+            rank_query = "SELECT item_id FROM item_tags WHERE tag = ? ORDER BY item_id LIMIT 1 OFFSET ?"
+            params = (tag_filter,)
         else:
-            query = "SELECT * FROM items ORDER BY RANDOM() LIMIT ?"
-            self.c.execute(query, (limit,))
+            count, low, high = self.c.execute(
+                "SELECT (SELECT COUNT(*) FROM items), (SELECT MIN(id) FROM items), (SELECT MAX(id) FROM items)"
+            ).fetchone()
+            member_query = "SELECT 1 FROM items WHERE id = ?"
+            rank_query = "SELECT id FROM items ORDER BY id LIMIT 1 OFFSET ?"
+            params = ()
         
-        rows = self.c.fetchall()
-        result = []
-        for row in rows:
-            # 处理可能不存在的 embedding 字段（向后兼容）
-            embedding = row[10] if len(row) > 10 else None
-            result.append({
-                'id': row[0],
-                'type': row[1],
-                'content': row[2],
-                'translation': row[3],
-                'lemma': json.loads(row[4]) if row[4] else [],
-                'tags': json.loads(row[5]) if row[5] else [],
-                'examples': json.loads(row[6]) if row[6] else [],
-                'created_at': row[7],
-                'last_reviewed': row[8],
-                'review_count': row[9],
-                'embedding': embedding
-            })
-        return result
-    
-    def get_all_items(self) -> List[Dict]:
+        def contains(item_id):
+            return self.c.execute(member_query, params + (item_id,)).fetchone() is not None
+        
+        def at_rank(rank):
+            row = self.c.execute(rank_query, params + (rank,)).fetchone()
+            return row[0] if row else None
+        
+        return count, low, high, contains, at_rank
+    
+    def _probe_random_ids(self, limit: int, tag_filter: Optional[str]) -> List[int]:
+        """
+        均匀抽取不重复的 id
+
+        id 较密时随机探测并拒绝落在间隙上的探测，否则按随机排名 OFFSET 读取，
+        id 聚集成几段时也不会偏向间隙之后的 id（见 sampling.uniform_id_sample）
+        """
+        return uniform_id_sample(limit, *self._id_set(tag_filter))
+    
+    def _weighted_random_ids(self, limit: int, tag_filter: Optional[str]) -> List[int]:
+        """
+        按 review_weight 加权抽取不重复的 id
+
+        均匀抽候选并按 权重 / 最大权重 接受（最大权重来自最小的复习次数，走 (review_count, id) 索引），
+        每个样本只需要几次索引查找。复习次数相差悬殊、探测次数用完时，改为按 review_count
+        分组计数后逐个按排名读取的精确抽样（见 sampling.bucket_weighted_sample）
+        """
+        count, low, high, contains, at_rank = self._id_set(tag_filter)
+        if not count:
+            return []
+        limit = min(limit, count)
+        min_reviews = self.c.execute("SELECT MIN(review_count) FROM items").fetchone()[0]
+        
+        def draw():
+            sample = uniform_id_sample(1, count, low, high, contains, at_rank)
+            return sample[0] if sample else None
+        
+        def weight_of(item_id):
+            row = self.c.execute("SELECT review_count FROM items WHERE id = ?", (item_id,)).fetchone()
+            return review_weight(row[0]) if row else 0.0
+        
+        ids = rejection_weighted_sample(limit, draw, weight_of, review_weight(min_reviews))
+        if len(ids) >= limit:
+            return ids
+        
+        if tag_filter:
+            source = "item_tags JOIN items ON items.id = item_tags.item_id WHERE item_tags.tag = ?"
+            params = (tag_filter,)
+        else:
+            source = "items WHERE 1=1"
+            params = ()
+        self.c.execute(f"SELECT items.review_count, COUNT(*) FROM {source} GROUP BY items.review_count", params)
+        buckets = {reviews: (n, review_weight(reviews)) for reviews, n in self.c.fetchall()}
+        
+        def pick(reviews, rank):
+            row = self.c.execute(
+                f"SELECT items.id FROM {source} AND items.review_count IS ? ORDER BY items.id LIMIT 1 OFFSET ?",
+                params + (reviews, rank)
+            ).fetchone()
+            return row[0] if row else None
+        
+        return bucket_weighted_sample(limit, buckets, pick)
+    
+    def iter_item_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         columns: Optional[Sequence[str]] = None) -> Iterator[List[Dict]]:
+        """
+        按 id 顺序分块读取全部条目（基于 id 的游标分页，每块一次查询）
+        
+        内存只保留当前块；迭代期间可以安全地修改已读取的条目
+        """
+        columns = ITEM_COLUMNS if columns is None else columns
+        # 游标需要 id
+        query_columns = tuple(columns) + (() if 'id' in columns else ('id',))
+        query = f"SELECT {_column_list(query_columns)} FROM items WHERE id > ? ORDER BY id LIMIT ?"
+        last_id = 0
+        while True:
+            self.c.execute(query, (last_id, chunk_size))
+            chunk = [_row_to_item(row, query_columns) for row in self.c.fetchall()]
+            if not chunk:
+                return
+            last_id = chunk[-1]['id']
+            yield chunk
+    
+    def iter_items(self, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   columns: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        """逐条遍历全部条目（按 id 顺序，分块读取）"""
+        for chunk in self.iter_item_chunks(chunk_size, columns):
+            yield from chunk
+    
+    def get_all_items(self, columns: Optional[Sequence[str]] = None) -> List[Dict]:
         """获取所有条目"""
-        self.c.execute("SELECT * FROM items ORDER BY created_at DESC")
-        rows = self.c.fetchall()
+        columns = ITEM_COLUMNS if columns is None else columns
+        self.c.execute(f"SELECT {_column_list(columns)} FROM items ORDER BY created_at DESC")
+        return [_row_to_item(row, columns) for row in self.c.fetchall()]
+    
+    def get_embeddings(self, item_ids: Sequence[int], chunk_size: int = 500) -> Dict[int, Optional[bytes]]:
+        """只读取指定条目的 embedding：{id: embedding}"""
+        embeddings = {}
+        item_ids = list(item_ids)
+        for start in range(0, len(item_ids), chunk_size):
+            chunk = item_ids[start:start + chunk_size]
+            placeholders = ", ".join("?" * len(chunk))
+            self.c.execute(f"SELECT id, embedding FROM items WHERE id IN ({placeholders})", chunk)
+            embeddings.update(self.c.fetchall())
+        return embeddings
+    
+    def list_tags(self) -> List[Tuple[str, int]]:
+        """返回所有标签及其条目数量：[(tag, count), ...]，按标签排序"""
+        self.c.execute("SELECT tag, COUNT(*) FROM item_tags GROUP BY tag ORDER BY tag")
+        return self.c.fetchall()
+
+    def get_stats(self) -> Dict:
+        """
+        汇总统计（在数据库中聚合，不读取条目）
+
+        返回: {'total', 'by_type': {类型: 数量}, 'by_tag': {标签: 数量},
+               'reviewed_today', 'never_reviewed'}
+        """
+        today = datetime.date.today().isoformat()
+        self.c.execute("SELECT type, COUNT(*) FROM items GROUP BY type")
+        by_type = dict(self.c.fetchall())
+        self.c.execute("""
+            SELECT COUNT(*),
+                   COALESCE(SUM(last_reviewed >= ?), 0),
+                   COALESCE(SUM(last_reviewed IS NULL), 0)
+            FROM items
+        """, (today,))
+        total, reviewed_today, never_reviewed = self.c.fetchone()
+        return {
+            'total': total,
+            'by_type': by_type,
+            'by_tag': dict(self.list_tags()),
+            'reviewed_today': reviewed_today,
+            'never_reviewed': never_reviewed,
+        }
+
+    # ==================== 相关条目列表 ====================
+    
+    def get_related(self, item_id: int,
+                    columns: Optional[Sequence[str]] = None) -> Optional[List[Tuple[Dict, float]]]:
+        """读取物化的相关条目列表，返回 [(item, score), ...]；尚未计算时返回 None"""
+        columns = LIST_COLUMNS if columns is None else columns
+        self.c.execute(f"""
+            SELECT {_column_list(columns)}, related.score FROM related
+            JOIN items ON items.id = related.related_id
+            WHERE related.item_id = ? AND related.related_id != related.item_id
+            ORDER BY related.score DESC
+        """, (item_id,))
+        related = [(_row_to_item(row[:-1], columns), row[-1]) for row in self.c.fetchall()]
+        if not related:
+            self.c.execute("SELECT 1 FROM related WHERE item_id = ? LIMIT 1", (item_id,))
+            if self.c.fetchone() is None:
+                return None
+        return related
+    
+    def get_related_lists(self, item_ids: Optional[Sequence[int]] = None,
+                          referencing: Optional[Sequence[int]] = None) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        读取相关条目列表：{item_id: [(related_id, score), ...]}，已计算的空列表为 []
+
+        item_ids / referencing 都为 None 时读取全部列表；否则只读取 item_ids 的列表
+        以及包含 referencing 中任一条目的列表
+        """
+        query = "SELECT item_id, related_id, score FROM related"
+        if item_ids is None and referencing is None:
+            self.c.execute(query + " ORDER BY item_id, score DESC")
+            rows = self.c.fetchall()
+        else:
+            wanted = set(item_ids or ())
+            referencing = list(referencing or ())
+            for start in range(0, len(referencing), 500):
+                chunk = referencing[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                self.c.execute(f"SELECT item_id FROM related WHERE related_id IN ({placeholders}) "
+                               f"AND related_id != item_id", chunk)
+                wanted.update(row[0] for row in self.c.fetchall())
+            wanted, rows = sorted(wanted), []
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                self.c.execute(f"{query} WHERE item_id IN ({placeholders}) ORDER BY item_id, score DESC", chunk)
+                rows.extend(self.c.fetchall())
+        lists = {}
+        for item_id, related_id, score in rows:
+            pairs = lists.setdefault(item_id, [])
+            if related_id != item_id:
+                pairs.append((related_id, score))
+        return lists
+    
+    def set_related_many(self, lists: Dict[int, List[Tuple[int, float]]]):
+        """在一个事务中替换多个条目的相关条目列表（同时写入"已计算"标记）"""
+        if not lists:
+            return
+        self.c.executemany("DELETE FROM related WHERE item_id = ?", [(item_id,) for item_id in lists])
+        self.c.executemany(
+            "INSERT INTO related (item_id, related_id, score) VALUES (?, ?, ?)",
+            [(item_id, item_id, None) for item_id in lists] +
+            [(item_id, related_id, score)
+             for item_id, pairs in lists.items()
+             for related_id, score in pairs]
+        )
+        self.conn.commit()
+    
+    def set_related(self, item_id: int, pairs: List[Tuple[int, float]]):
+        """替换单个条目的相关条目列表"""
+        self.set_related_many({item_id: pairs})
+    
+    def _unlink_related(self, item_ids: Sequence[int]) -> List[int]:
+        """删除这些条目的列表及其在其他列表中的出现（不提交事务），返回引用了它们的其他条目 id"""
+        item_ids = list(item_ids)
+        referencing = set()
+        for start in range(0, len(item_ids), 500):
+            chunk = item_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            self.c.execute(f"SELECT item_id FROM related WHERE related_id IN ({placeholders}) "
+                           f"AND related_id != item_id", chunk)
+            referencing.update(row[0] for row in self.c.fetchall())
+            self.c.execute(f"DELETE FROM related WHERE item_id IN ({placeholders}) "
+                           f"OR related_id IN ({placeholders})", chunk + chunk)
+        return sorted(referencing - set(item_ids))
+    
+    def delete_related(self, item_id: int) -> List[int]:
+        """删除条目自己的列表及其在其他列表中的出现，返回受影响的条目 id"""
+        referencing = self._unlink_related([item_id])
+        self.conn.commit()
+        return referencing
+    
+    # ==================== 同步（sync_engine.py，需要 enable_sync） ====================
+    
+    def get_sync_state(self, key: str) -> Optional[str]:
+        """读取同步状态（如拉取水位线）"""
+        self.c.execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+        row = self.c.fetchone()
+        return row[0] if row else None
+    
+    def set_sync_state(self, key: str, value: Optional[str]):
+        """保存同步状态"""
+        self.c.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+        self.conn.commit()
+    
+    def get_unsynced_items(self, limit: int = 500) -> List[Tuple[Dict, Optional[int], int, int]]:
+        """
+        有未推送内容的条目
+        
+        返回: [(item, remote_id, dirty, review_delta), ...]，按 id 排序
+        """
+        self.c.execute(f"""
+            SELECT {_column_list(ITEM_COLUMNS)}, remote_id, dirty, review_delta FROM items
+            WHERE {_UNSYNCED}
+            ORDER BY id LIMIT ?
+        """, (limit,))
+        return [(_row_to_item(row[:-3], ITEM_COLUMNS), *row[-3:]) for row in self.c.fetchall()]
+    
+    def mark_synced(self, synced: List[Tuple[int, int, int, int]]):
+        """
+        记录已推送的条目: [(item_id, remote_id, dirty, review_delta), ...]
+        
+        dirty 和 review_delta 为推送时读到的值，只扣除这部分，推送期间的新修改保留到下一轮
+        """
+        self.c.executemany(
+            "UPDATE items SET remote_id = ?, dirty = dirty - ?, review_delta = review_delta - ? WHERE id = ?",
+            [(remote_id, dirty, review_delta, item_id) for item_id, remote_id, dirty, review_delta in synced]
+        )
+        self.conn.commit()
+    
+    def get_tombstones(self) -> List[int]:
+        """等待在 Supabase 中删除的 remote_id"""
+        self.c.execute("SELECT remote_id FROM sync_tombstones ORDER BY remote_id")
+        return [row[0] for row in self.c.fetchall()]
+    
+    def clear_tombstones(self, remote_ids: Sequence[int]):
+        """删除已推送的墓碑"""
+        self.c.executemany("DELETE FROM sync_tombstones WHERE remote_id = ?", [(rid,) for rid in remote_ids])
+        self.conn.commit()
+    
+    def apply_remote_items(self, rows: List[Dict]) -> List[int]:
+        """
+        写入从 Supabase 拉取的条目（按 remote_id 新增或更新），返回本地 id
         
-        result = []
+        rows 为 SupabaseDB 格式的条目（embedding 为 base64 文本）。
+        有未推送修改的条目保留本地内容；复习次数取远端的值加上本地未推送的次数，
+        最后复习时间取两者中较晚的一个
+        """
+        ids = []
+        embeddings = []
         for row in rows:
-            # 处理可能不存在的 embedding 字段（向后兼容）
-            embedding = row[10] if len(row) > 10 else None
-            result.append({
-                'id': row[0],
-                'type': row[1],
-                'content': row[2],
-                'translation': row[3],
-                'lemma': json.loads(row[4]) if row[4] else [],
-                'tags': json.loads(row[5]) if row[5] else [],
-                'examples': json.loads(row[6]) if row[6] else [],
-                'created_at': row[7],
-                'last_reviewed': row[8],
-                'review_count': row[9],
-                'embedding': embedding
-            })
-        return result
-    
-    def export_to_csv(self) -> str:
-        """导出为 CSV 格式"""
-        import pandas as pd
-        items = self.get_all_items()
-        df = pd.DataFrame(items)
-        return df.to_csv(index=False)
+            embedding = base64.b64decode(row['embedding']) if row.get('embedding') else None
+            fields = (
+                row.get('type'),
+                row.get('content'),
+                row.get('translation'),
+                json.dumps(row.get('lemma') or []),
+                json.dumps(row.get('tags') or []),
+                json.dumps(row.get('examples') or []),
+                embedding,
+            )
+            self.c.execute("SELECT id, dirty FROM items WHERE remote_id = ?", (row['id'],))
+            existing = self.c.fetchone()
+            if existing is None:
+                self.c.execute("""
+                    INSERT INTO items (type, content, translation, lemma, tags, examples, embedding,
+                                       created_at, last_reviewed, review_count, remote_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, fields + (row.get('created_at'), row.get('last_reviewed'), row.get('review_count') or 0, row['id']))
+                item_id = self.c.lastrowid
+                dirty = 0
+            else:
+                item_id, dirty = existing
+                if not dirty:
+                    self.c.execute("""
+                        UPDATE items SET type = ?, content = ?, translation = ?, lemma = ?, tags = ?,
+                                         examples = ?, embedding = ?
+                        WHERE id = ?
+                    """, fields + (item_id,))
+                self.c.execute("""
+                    UPDATE items SET review_count = ? + review_delta,
+                                     last_reviewed = CASE WHEN last_reviewed IS NULL OR last_reviewed < ?
+                                                          THEN ? ELSE last_reviewed END
+                    WHERE id = ?
+                """, (row.get('review_count') or 0, row.get('last_reviewed'), row.get('last_reviewed'), item_id))
+            if not dirty:
+                self._set_tags(item_id, row.get('tags'))
+                if embedding is not None:
+                    embeddings.append((item_id, embedding))
+            ids.append(item_id)
+        self.conn.commit()
+        if self.ann_index is not None:
+            self.ann_index.upsert_many(embeddings)
+        return ids
+    
+    def delete_by_remote_ids(self, remote_ids: Sequence[int]) -> Tuple[List[int], List[int]]:
+        """
+        删除在 Supabase 中已删除的条目（不留墓碑）
+
+        与 delete_item 一样在同一事务中删除它们的相关条目列表及其出现。
+        返回 (被删除的本地 id, 引用了它们、需要重算列表的其他条目 id)
+        """
+        ids = []
+        for start in range(0, len(remote_ids), 500):
+            chunk = list(remote_ids[start:start + 500])
+            placeholders = ", ".join("?" * len(chunk))
+            self.c.execute(f"SELECT id FROM items WHERE remote_id IN ({placeholders})", chunk)
+            ids.extend(row[0] for row in self.c.fetchall())
+        if not ids:
+            return ids, []
+        referencing = self._unlink_related(ids)
+        params = [(item_id,) for item_id in ids]
+        self.c.executemany("DELETE FROM items WHERE id = ?", params)
+        self.c.executemany("DELETE FROM item_tags WHERE item_id = ?", params)
+        self.conn.commit()
+        if self.ann_index is not None:
+            self.ann_index.remove_many(ids)
+        return ids, referencing
+    
+    def iter_csv(self, embeddings: str = 'skip', chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        流式导出 CSV：分块读取条目，逐块产出 UTF-8 字节
+        
+        embeddings: 'skip' 不读取也不导出 embedding，'base64' 导出为 base64 文本
+        """
+        columns = csv_columns(embeddings)
+        return encode_csv(self.iter_item_chunks(chunk_size, columns=columns), columns)
+    
+    def export_to_csv(self, embeddings: str = 'skip') -> str:
+        """导出为 CSV 字符串（小数据量时使用，大数据量请用 iter_csv）"""
+        return b"".join(self.iter_csv(embeddings)).decode('utf-8')
     
     def close(self):
-        """关闭数据库连接"""
-        self.conn.close()
+        """关闭所有线程的数据库连接"""
+        self.connections.close_all()
 
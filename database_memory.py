@@ -0,0 +1,322 @@
+"""
+In-memory reference backend
+
+MemoryDB implements backend.StorageBackend with plain dicts and no I/O. It
+defines the expected results for backend_bench.py's conformance checks and
+serves as a baseline in its benchmarks; it can also stand in for a real
+database in scripts. Nothing is persisted.
+"""
+import copy
+import datetime
+import heapq
+import random
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from database import ITEM_COLUMNS, LIST_COLUMNS, DEFAULT_CHUNK_SIZE, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, csv_columns, encode_csv
+from sampling import review_weight, weighted_reservoir_sample
+
+_LIST_FIELDS = ("lemma", "tags", "examples")
+_UPDATABLE_FIELDS = ("type", "content", "translation", "lemma", "tags", "examples", "embedding")
+
+
+class MemoryDB:
+    def __init__(self, ann_index=None, seed: Optional[int] = None):
+        self.ann_index = ann_index
+        self.rng = random.Random(seed)
+        self._rows: Dict[int, Dict] = {}
+        # tag -> ids, the counterpart of SQLite's item_tags
+        self._tags: Dict[str, Set[int]] = {}
+        self._related: Dict[int, List[Tuple[int, float]]] = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+
+    # ----------------------
+    # helpers
+    # ----------------------
+    @staticmethod
+    def _project(row: Dict, columns: Optional[Sequence[str]]) -> Dict:
+        columns = ITEM_COLUMNS if columns is None else columns
+        unknown = [column for column in columns if column not in ITEM_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+        return {column: copy.copy(row[column]) for column in columns}
+
+    def _index_tags(self, item_id: int, tags: Sequence[str]):
+        for tag in set(tags):
+            self._tags.setdefault(tag, set()).add(item_id)
+
+    def _unindex_tags(self, item_id: int, tags: Sequence[str]):
+        for tag in set(tags):
+            ids = self._tags.get(tag)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self._tags[tag]
+
+    def _insert(self, item: Dict, created_at: str) -> int:
+        row = {
+            "type": item["type"],
+            "content": item["content"],
+            "translation": item.get("translation"),
+            "lemma": list(item.get("lemma") or []),
+            "tags": list(item.get("tags") or []),
+            "examples": list(item.get("examples") or []),
+            "created_at": created_at,
+            "last_reviewed": None,
+            "review_count": 0,
+            "embedding": item.get("embedding"),
+        }
+        item_id = self._next_id
+        self._next_id += 1
+        row["id"] = item_id
+        self._rows[item_id] = row
+        self._index_tags(item_id, row["tags"])
+        return item_id
+
+    def _matching(self, keyword: str, type_filter: Optional[str], tag_filter: Optional[str]):
+        ids = self._tags.get(tag_filter, ()) if tag_filter else self._rows
+        keyword = keyword.lower() if keyword else ""
+        for item_id in ids:
+            row = self._rows[item_id]
+            if type_filter and row["type"] != type_filter:
+                continue
+            if keyword and keyword not in (row["content"] or "").lower() \
+                    and keyword not in (row["translation"] or "").lower():
+                continue
+            yield row
+
+    @staticmethod
+    def _order_key(row: Dict):
+        return row["created_at"] or "", row["id"]
+
+    # ----------------------
+    # Writes
+    # ----------------------
+    def add_item(self, type_: str, content: str, translation: str, lemma: List[str], tags: List[str],
+                 examples: List[str] = None, embedding=None) -> int:
+        with self._lock:
+            item_id = self._insert({
+                "type": type_, "content": content, "translation": translation, "lemma": lemma,
+                "tags": tags, "examples": examples, "embedding": embedding,
+            }, datetime.datetime.now().isoformat())
+        if self.ann_index is not None and embedding is not None:
+            self.ann_index.upsert(item_id, embedding)
+        return item_id
+
+    def add_items(self, items: List[Dict]) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+        ids: List[Optional[int]] = [None] * len(items)
+        failures: List[Tuple[int, str]] = []
+        now = datetime.datetime.now().isoformat()
+        with self._lock:
+            for index, item in enumerate(items):
+                try:
+                    ids[index] = self._insert(item, now)
+                except (KeyError, TypeError) as e:
+                    failures.append((index, f"{type(e).__name__}: {e}"))
+        if self.ann_index is not None:
+            self.ann_index.upsert_many([
+                (item_id, item["embedding"])
+                for item_id, item in zip(ids, items)
+                if item_id is not None and item.get("embedding") is not None
+            ])
+        return ids, failures
+
+    def update_item(self, item_id: int, **kwargs):
+        updates = {field: value for field, value in kwargs.items() if field in _UPDATABLE_FIELDS}
+        if not updates:
+            return
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None:
+                return
+            for field in _LIST_FIELDS:
+                if field in updates:
+                    updates[field] = list(updates[field] or [])
+            if "tags" in updates:
+                self._unindex_tags(item_id, row["tags"])
+                self._index_tags(item_id, updates["tags"])
+            row.update(updates)
+        if self.ann_index is not None and "embedding" in updates:
+            self.ann_index.upsert(item_id, updates["embedding"])
+
+    def delete_item(self, item_id: int) -> List[int]:
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is not None:
+                self._unindex_tags(item_id, row["tags"])
+            referencing = self.delete_related(item_id)
+        if self.ann_index is not None:
+            self.ann_index.remove(item_id)
+        return referencing
+
+    def update_review(self, item_id: int):
+        self.update_reviews({item_id: (1, datetime.datetime.now().isoformat())})
+
+    def update_reviews(self, reviews: Dict[int, Tuple[int, str]]):
+        with self._lock:
+            for item_id, (count, last_reviewed) in reviews.items():
+                row = self._rows.get(item_id)
+                if row is not None:
+                    row["review_count"] += count
+                    row["last_reviewed"] = last_reviewed
+
+    # ----------------------
+    # Reads
+    # ----------------------
+    def get_item(self, item_id: int, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        with self._lock:
+            row = self._rows.get(item_id)
+            return None if row is None else self._project(row, columns)
+
+    def search_items(self, keyword: str = "", type_filter: str = None, tag_filter: str = None,
+                     columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        with self._lock:
+            rows = sorted(self._matching(keyword, type_filter, tag_filter), key=self._order_key, reverse=True)
+            return [self._project(row, columns) for row in rows]
+
+    def search_items_page(self, keyword: str = "", type_filter: str = None, tag_filter: str = None,
+                          page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[str, int]] = None,
+                          columns: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        if columns is not None:
+            columns = tuple(columns) + tuple(c for c in ("id", "created_at") if c not in columns)
+        with self._lock:
+            rows = self._matching(keyword, type_filter, tag_filter)
+            if cursor is not None:
+                cursor = tuple(cursor)
+                rows = (row for row in rows if self._order_key(row) < cursor)
+            # Top page_size + 1 without sorting everything
+            rows = heapq.nlargest(page_size + 1, rows, key=self._order_key)
+            items = [self._project(row, columns) for row in rows]
+        next_cursor = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            next_cursor = (items[-1]["created_at"], items[-1]["id"])
+        return items, next_cursor
+
+    def get_items_page(self, page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[str, int]] = None,
+                       columns: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        return self.search_items_page(page_size=page_size, cursor=cursor, columns=columns)
+
+    def get_random_items(self, limit: int = 1, tag_filter: str = None,
+                         columns: Optional[Sequence[str]] = None, weighted: bool = False) -> List[Dict]:
+        if columns is not None and "id" not in columns:
+            columns = tuple(columns) + ("id",)
+        with self._lock:
+            ids = self._tags.get(tag_filter, ()) if tag_filter else self._rows
+            if weighted:
+                sample = weighted_reservoir_sample(
+                    ((item_id, review_weight(self._rows[item_id]["review_count"])) for item_id in ids),
+                    limit, self.rng
+                )
+            else:
+                sample = self.rng.sample(sorted(ids), min(limit, len(ids)))
+            return [self._project(self._rows[item_id], columns) for item_id in sample]
+
+    def iter_item_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         columns: Optional[Sequence[str]] = None) -> Iterator[List[Dict]]:
+        columns = ITEM_COLUMNS if columns is None else tuple(columns)
+        if "id" not in columns:
+            columns = columns + ("id",)
+        with self._lock:
+            # Ids are assigned in increasing order, so insertion order is id order
+            ids = list(self._rows)
+        for start in range(0, len(ids), chunk_size):
+            with self._lock:
+                chunk = [
+                    self._project(self._rows[item_id], columns)
+                    for item_id in ids[start:start + chunk_size] if item_id in self._rows
+                ]
+            if chunk:
+                yield chunk
+
+    def iter_items(self, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   columns: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        for chunk in self.iter_item_chunks(chunk_size, columns):
+            yield from chunk
+
+    def get_all_items(self, columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        return self.search_items(columns=columns)
+
+    def get_embeddings(self, item_ids: Sequence[int]) -> Dict[int, Optional[bytes]]:
+        with self._lock:
+            return {item_id: self._rows[item_id]["embedding"] for item_id in item_ids if item_id in self._rows}
+
+    def list_tags(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            return sorted((tag, len(ids)) for tag, ids in self._tags.items())
+
+    def get_stats(self) -> Dict:
+        today = datetime.date.today().isoformat()
+        with self._lock:
+            by_type: Dict[str, int] = {}
+            for row in self._rows.values():
+                by_type[row["type"]] = by_type.get(row["type"], 0) + 1
+            return {
+                "total": len(self._rows),
+                "by_type": by_type,
+                "by_tag": dict(self.list_tags()),
+                "reviewed_today": sum(1 for row in self._rows.values() if (row["last_reviewed"] or "") >= today),
+                "never_reviewed": sum(1 for row in self._rows.values() if row["last_reviewed"] is None),
+            }
+
+    # ----------------------
+    # Materialized related lists
+    # ----------------------
+    def get_related(self, item_id: int,
+                    columns: Optional[Sequence[str]] = None) -> Optional[List[Tuple[Dict, float]]]:
+        columns = LIST_COLUMNS if columns is None else columns
+        with self._lock:
+            if item_id not in self._related:
+                return None
+            return [
+                (self._project(self._rows[related_id], columns), score)
+                for related_id, score in self._related[item_id]
+                if related_id in self._rows
+            ]
+
+    def get_related_lists(self, item_ids: Optional[Sequence[int]] = None,
+                          referencing: Optional[Sequence[int]] = None) -> Dict[int, List[Tuple[int, float]]]:
+        with self._lock:
+            if item_ids is None and referencing is None:
+                wanted = set(self._related)
+            else:
+                referencing = set(referencing or ())
+                wanted = set(item_ids or ()) | {
+                    other for other, pairs in self._related.items()
+                    if any(related_id in referencing for related_id, _ in pairs)
+                }
+            return {item_id: list(self._related[item_id]) for item_id in sorted(wanted) if item_id in self._related}
+
+    def set_related_many(self, lists: Dict[int, List[Tuple[int, float]]]):
+        with self._lock:
+            for item_id, pairs in lists.items():
+                self._related[item_id] = sorted(pairs, key=lambda pair: pair[1], reverse=True)
+
+    def set_related(self, item_id: int, pairs: List[Tuple[int, float]]):
+        self.set_related_many({item_id: pairs})
+
+    def delete_related(self, item_id: int) -> List[int]:
+        with self._lock:
+            referencing = [
+                other for other, pairs in self._related.items()
+                if any(related_id == item_id for related_id, _ in pairs)
+            ]
+            self._related.pop(item_id, None)
+            for other in referencing:
+                self._related[other] = [pair for pair in self._related[other] if pair[0] != item_id]
+            return referencing
+
+    # ----------------------
+    # Export / lifecycle
+    # ----------------------
+    def iter_csv(self, embeddings: str = "skip", chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        columns = csv_columns(embeddings)
+        return encode_csv(self.iter_item_chunks(chunk_size, columns=columns), columns)
+
+    def export_to_csv(self, embeddings: str = "skip") -> str:
+        return b"".join(self.iter_csv(embeddings)).decode("utf-8")
+
+    def close(self):
+        pass
@@ -4,42 +4,164 @@ Supabase version of the DB manager
 import os
 import json
 import datetime
-from typing import List, Dict, Optional
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import base64
-from typing import List, Union, Optional
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from database import ITEM_COLUMNS, LIST_COLUMNS, DEFAULT_CHUNK_SIZE, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, csv_columns, encode_csv
+from sampling import review_weight, weighted_reservoir_sample
 
 load_dotenv()
 
+# Without access to HTTP response sizes (e.g. LocalSupabaseClient), measure the
+# JSON of one response in this many and count it for all of them
+PAYLOAD_SAMPLE_EVERY = 16
+
+
+def _missing_function(error: Exception) -> bool:
+    """True if a PostgREST error says the called function is not installed"""
+    text = str(error)
+    return ("PGRST202" in text or "Could not find the function" in text
+            or ("function" in text and "does not exist" in text))
+
 
 class SupabaseDB:
-    def __init__(self):
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_KEY")
-        assert url and key, "⚠️ Missing SUPABASE_URL or SUPABASE_KEY in .env"
+    def __init__(self, ann_index=None, client=None):
+        """
+        client: an already configured client; defaults to one created from
+        SUPABASE_URL / SUPABASE_KEY. Pass supabase_local.LocalSupabaseClient()
+        to run without a server.
+        """
+        if client is None:
+            url = os.getenv("SUPABASE_URL")
+            key = os.getenv("SUPABASE_KEY")
+            assert url and key, "⚠️ Missing SUPABASE_URL or SUPABASE_KEY in .env"
+            client = create_client(url, key)
 
-        self.supabase: Client = create_client(url, key)
+        self.supabase: Client = client
         self.table_name = "entries"
+        # Materialized top-k neighbour lists (item_id, related_id, score). Every
+        # computed list also has a marker row (item_id, item_id, null), so an
+        # empty list is told apart from one that was never computed
+        self.related_table = "related"
+        # Optional ann_index.IVFIndex, kept in sync on add/update/delete
+        self.ann_index = ann_index
+        # Read traffic, see payload_stats(). Updated from iter_items' prefetch
+        # thread as well, hence the lock
+        self.requests = 0
+        self.payload_bytes = 0
+        self._stats_lock = threading.Lock()
+        self._watched_session = None
+        # Server-side functions found missing, not called again
+        self._missing_functions = set()
 
     # ----------------------
     # helper method
     # ----------------------
     def _normalize_row(self, row: Dict) -> Dict:
-        """Convert row to same format as SQLite version"""
-        return {
-            'id': row.get('id'),
-            'type': row.get('type'),
-            'content': row.get('content'),
-            'translation': row.get('translation'),
-            'lemma': row.get('lemma') or [],
-            'tags': row.get('tags') or [],
-            'examples': row.get('examples') or [],
-            'created_at': row.get('created_at'),
-            'last_reviewed': row.get('last_reviewed'),
-            'review_count': row.get('review_count', 0),
-            'embedding': row.get('embedding'),
-        }
+        """Convert row to same format as SQLite version (only the selected columns)"""
+        item = dict(row)
+        for column in ('lemma', 'tags', 'examples'):
+            if column in item:
+                item[column] = item[column] or []
+        if 'review_count' in item:
+            item['review_count'] = item['review_count'] or 0
+        return item
+
+    def _select(self, columns: Optional[Sequence[str]] = None):
+        """
+        Start a select on the entries table with an explicit column projection
+
+        Defaults to LIST_COLUMNS: embeddings are only sent when asked for
+        (ITEM_COLUMNS, or get_embeddings for specific ids)
+        """
+        if columns is None:
+            columns = LIST_COLUMNS
+        unknown = [column for column in columns if column not in ITEM_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+        return self.supabase.table(self.table_name).select(",".join(columns))
+
+    def _watch_http(self) -> bool:
+        """
+        Count response sizes in the HTTP client when there is one (supabase-py's
+        postgrest httpx session): the Content-Length, or the body length when the
+        response is chunked. Returns False for clients without an HTTP session
+        """
+        session = getattr(getattr(self.supabase, "postgrest", None), "session", None)
+        hooks = getattr(session, "event_hooks", None)
+        if hooks is None:
+            return False
+        if session is not self._watched_session:
+            # The client recreates the session when the auth token changes
+            hooks = dict(hooks)
+            hooks["response"] = list(hooks.get("response", ())) + [self._count_response]
+            session.event_hooks = hooks
+            self._watched_session = session
+        return True
+
+    def _count_response(self, response):
+        length = response.headers.get("content-length")
+        if length is None:
+            response.read()
+            length = len(response.content)
+        with self._stats_lock:
+            self.payload_bytes += int(length)
+
+    def _execute(self, query):
+        """Execute a read and count the request and the size of its response"""
+        measured = self._watch_http()
+        result = query.execute()
+        with self._stats_lock:
+            self.requests += 1
+            sample = not measured and self.requests % PAYLOAD_SAMPLE_EVERY == 1
+        if sample and result.data:
+            size = len(json.dumps(result.data, separators=(",", ":"))) * PAYLOAD_SAMPLE_EVERY
+            with self._stats_lock:
+                self.payload_bytes += size
+        return result
+
+    def _rpc(self, name: str, params: Dict):
+        """
+        Call a server-side function, or return None if it is not installed
+
+        A missing function is reported once with a warning and not called
+        again; any other error is raised.
+        """
+        if name in self._missing_functions:
+            return None
+        try:
+            return self._execute(self.supabase.rpc(name, params))
+        except Exception as e:
+            if not _missing_function(e):
+                raise
+            self._missing_functions.add(name)
+            warnings.warn(f"Supabase function {name} is not installed, using the client-side fallback: {e}",
+                          RuntimeWarning, stacklevel=3)
+            return None
+
+    def payload_stats(self) -> Dict:
+        """
+        Number of read requests and total response payload in bytes: measured
+        by the HTTP client (every response, writes included), or estimated
+        from a sample of responses without one
+        """
+        with self._stats_lock:
+            return {"requests": self.requests, "payload_bytes": self.payload_bytes}
+
+    def _encode_embedding(self, embedding: Optional[Union[bytes, str]]) -> Optional[str]:
+        """Encode an embedding BLOB as base64 text for the JSON API"""
+        if embedding is None:
+            return None
+        if isinstance(embedding, bytes):
+            return base64.b64encode(embedding).decode('utf-8')
+        if isinstance(embedding, str):
+            return base64.b64encode(embedding.encode('utf-8')).decode('utf-8')
+        raise TypeError(f"Unsupported type for embedding: {type(embedding)}")
 
     # ----------------------
     # CRUD
@@ -61,15 +183,7 @@ class SupabaseDB:
             examples = []
 
         # 处理 embedding
-        if embedding is not None:
-            if isinstance(embedding, bytes):
-                embedding_str = base64.b64encode(embedding).decode('utf-8')
-            elif isinstance(embedding, str):
-                embedding_str = base64.b64encode(embedding.encode('utf-8')).decode('utf-8')
-            else:
-                raise TypeError(f"Unsupported type for embedding: {type(embedding)}")
-        else:
-            embedding_str = None
+        embedding_str = self._encode_embedding(embedding)
 
         # 构建数据字典
         data = {
@@ -86,55 +200,175 @@ class SupabaseDB:
         }
 
         # 插入到 Supabase
-        result = (
+        result = self._execute(
             self.supabase.table(self.table_name)
             .insert(data)
-            .execute()
         )
 
-        return result.data[0]["id"]
+        item_id = result.data[0]["id"]
+        if self.ann_index is not None and embedding is not None:
+            self.ann_index.upsert(item_id, embedding)
+        return item_id
 
-    def get_item(self, item_id: int) -> Optional[Dict]:
-        result = (
-            self.supabase.table(self.table_name)
-            .select("*")
+    def add_items(self, items: List[Dict], chunk_size: int = 500) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+        """
+        Bulk insert with one multi-row request per chunk
+
+        items: dicts with the same keys as add_item's arguments ('type' instead of 'type_')
+        Returns (ids, failures): ids line up with items (None for failed rows),
+        failures is [(row_index, error_message), ...]. A chunk the server rejects
+        is retried row by row so only the offending rows fail.
+        """
+        ids: List[Optional[int]] = [None] * len(items)
+        failures: List[Tuple[int, str]] = []
+        now = datetime.datetime.now().isoformat()
+
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                rows.append((index, {
+                    "type": item["type"],
+                    "content": item["content"],
+                    "translation": item.get("translation"),
+                    "lemma": item.get("lemma") or [],
+                    "tags": item.get("tags") or [],
+                    "examples": item.get("examples") or [],
+                    "created_at": now,
+                    "last_reviewed": None,
+                    "review_count": 0,
+                    "embedding": self._encode_embedding(item.get("embedding")),
+                }))
+            except (KeyError, TypeError) as e:
+                failures.append((index, f"{type(e).__name__}: {e}"))
+
+        table = self.supabase.table(self.table_name)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                result = table.insert([data for _, data in chunk]).execute()
+                # PostgREST returns the inserted rows in request order
+                for (index, _), row in zip(chunk, result.data):
+                    ids[index] = row["id"]
+            except Exception:
+                for index, data in chunk:
+                    try:
+                        ids[index] = table.insert(data).execute().data[0]["id"]
+                    except Exception as e:
+                        failures.append((index, f"{type(e).__name__}: {e}"))
+        failures.sort()
+
+        if self.ann_index is not None:
+            self.ann_index.upsert_many([
+                (ids[index], items[index]["embedding"])
+                for index, _ in rows
+                if ids[index] is not None and items[index].get("embedding") is not None
+            ])
+        return ids, failures
+
+    def get_item(self, item_id: int, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """One row; without a projection every column, embedding included (like SQLite)"""
+        result = self._execute(
+            self._select(ITEM_COLUMNS if columns is None else columns)
             .eq("id", item_id)
-            .execute()
         )
         if not result.data:
             return None
 
         return self._normalize_row(result.data[0])
 
-    def delete_item(self, item_id: int):
+    def delete_item(self, item_id: int) -> List[int]:
+        """
+        Delete the item and its neighbour list rows; returns the ids whose lists referenced it
+
+        PostgREST has no multi-statement transaction, so the related rows are
+        deleted right after the item (an `on delete cascade` foreign key makes
+        this atomic on the server)
+        """
         self.supabase.table(self.table_name).delete().eq("id", item_id).execute()
+        referencing = self.delete_related(item_id)
+        if self.ann_index is not None:
+            self.ann_index.remove(item_id)
+        return referencing
 
     def update_item(self, item_id: int, **kwargs):
         allowed = ['type', 'content', 'translation', 'lemma', 'tags', 'examples', 'embedding']
         update_data = {k: v for k, v in kwargs.items() if k in allowed}
         if not update_data:
             return
+        if 'embedding' in update_data:
+            update_data['embedding'] = self._encode_embedding(update_data['embedding'])
         self.supabase.table(self.table_name).update(update_data).eq("id", item_id).execute()
+        if self.ann_index is not None and 'embedding' in update_data:
+            self.ann_index.upsert(item_id, kwargs['embedding'])
 
     # ----------------------
     # Review tracking
     # ----------------------
     def update_review(self, item_id: int):
-        self.supabase.table(self.table_name).update({
-            "last_reviewed": datetime.datetime.now().isoformat(),
-            "review_count": "review_count + 1"
-        }).eq("id", item_id).execute()
+        self.update_reviews({item_id: (1, datetime.datetime.now().isoformat())})
+
+    def update_reviews(self, reviews: Dict[int, Tuple[int, str]]):
+        """
+        Apply {item_id: (review_count_increment, last_reviewed)} in one request.
+
+        The increment runs on the server, so concurrent reviews are not lost:
+
+            create or replace function increment_reviews(reviews json) returns void
+            language sql as $$
+              update entries e
+              set review_count = coalesce(e.review_count, 0) + r.count,
+                  last_reviewed = r.last_reviewed
+              from json_to_recordset(reviews) as r(id bigint, count int, last_reviewed text)
+              where e.id = r.id;
+            $$;
+
+        Only a missing function falls back to the client-side update (with a
+        one-time warning). Any other error is raised, so the caller (for
+        example ReviewQueue) retries the batch instead of applying it twice.
+        """
+        if not reviews:
+            return
+        payload = [
+            {"id": item_id, "count": count, "last_reviewed": last_reviewed}
+            for item_id, (count, last_reviewed) in reviews.items()
+        ]
+        if self._rpc("increment_reviews", {"reviews": payload}) is not None:
+            return
+        # Without the RPC: read-modify-write per item (not atomic across clients)
+        current = self._execute(
+            self.supabase.table(self.table_name)
+            .select("id,review_count")
+            .in_("id", list(reviews))
+        )
+        for row in current.data:
+            count, last_reviewed = reviews[row["id"]]
+            self.supabase.table(self.table_name).update({
+                "last_reviewed": last_reviewed,
+                "review_count": (row.get("review_count") or 0) + count,
+            }).eq("id", row["id"]).execute()
 
     # ----------------------
     # Query
     # ----------------------
-    def search_items(self, keyword: str = "", type_filter: str = None, tag_filter: str = None) -> List[Dict]:
-        q = self.supabase.table(self.table_name).select("*")
+    @staticmethod
+    def _keyword_filter(q, keyword: str):
+        """
+        Content or translation contains keyword, case-insensitive (SQLite's LIKE fallback)
+
+        % and _ in the keyword are escaped with backslashes (ilike's escape
+        character) so they match literally, then the pattern is quoted for
+        PostgREST's logic syntax, where backslash escapes quotes and itself
+        """
+        like = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{like}%".replace("\\", "\\\\").replace('"', '\\"')
+        return q.or_(f'content.ilike."{pattern}",translation.ilike."{pattern}"')
+
+    def search_items(self, keyword: str = "", type_filter: str = None, tag_filter: str = None,
+                     columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        q = self._select(columns)
 
         if keyword:
-            q = q.ilike("content", f"%{keyword}%")
-            # translation search also?
-            # Could do OR query later if needed
+            q = self._keyword_filter(q, keyword)
 
         if type_filter:
             q = q.eq("type", type_filter)
@@ -142,36 +376,449 @@ class SupabaseDB:
         if tag_filter:
             q = q.contains("tags", [tag_filter])
 
-        result = q.order("created_at", desc=True).execute()
+        result = self._execute(q.order("created_at", desc=True))
 
         return [self._normalize_row(row) for row in result.data]
 
-    def get_random_items(self, limit: int = 1, tag_filter: str = None) -> List[Dict]:
-        q = self.supabase.table(self.table_name).select("*").limit(limit)
+    def search_items_page(self, keyword: str = "", type_filter: str = None, tag_filter: str = None,
+                          page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[Union[str, float], int]] = None,
+                          columns: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[Tuple[Union[str, float], int]]]:
+        """
+        Keyset-paginated search ordered by (created_at, id) descending
+
+        Keyword searches are ordered by relevance when the search_entries RPC
+        exists, with (rank, id) cursors (see _ranked_page). Without it they
+        fall back to the (created_at, id) order.
+
+        cursor: the cursor returned with the previous page, None for the first page
+        Returns (items, next_cursor); next_cursor is None on the last page
+        """
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        if keyword:
+            page = self._ranked_page(keyword, type_filter, tag_filter, page_size, cursor, columns)
+            if page is not None:
+                return page
+        if columns is not None:
+            # The cursor needs id and created_at
+            columns = tuple(columns) + tuple(c for c in ("id", "created_at") if c not in columns)
+        q = self._select(columns)
+
+        if keyword:
+            q = self._keyword_filter(q, keyword)
+
+        if type_filter:
+            q = q.eq("type", type_filter)
 
         if tag_filter:
             q = q.contains("tags", [tag_filter])
 
-        # Supabase doesn't have true RANDOM() client-side, we rely on server sorting
-        result = q.order("id", desc=False).execute()
+        if cursor is not None:
+            created_at, last_id = cursor
+            q = q.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{int(last_id)})'
+            )
 
-        return [self._normalize_row(row) for row in result.data]
+        # Fetch one extra row to know whether another page exists
+        result = self._execute(
+            q.order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(page_size + 1)
+        )
+        rows = [self._normalize_row(row) for row in result.data]
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = (rows[-1]["created_at"], rows[-1]["id"])
+        return rows, next_cursor
 
-    def get_all_items(self) -> List[Dict]:
-        result = (
-            self.supabase.table(self.table_name)
-            .select("*")
-            .order("created_at", desc=True)
-            .execute()
+    def _ranked_page(self, keyword: str, type_filter: Optional[str], tag_filter: Optional[str],
+                     page_size: int, cursor: Optional[Tuple[float, int]],
+                     columns: Optional[Sequence[str]]) -> Optional[Tuple[List[Dict], Optional[Tuple[float, int]]]]:
+        """
+        One relevance-ordered keyword page, or None without the search_entries RPC
+
+        The RPC matches like _keyword_filter and ranks with ts_rank, then the
+        page's rows are fetched by id with the usual projection:
+
+            create or replace function search_entries(keyword text, type_filter text default null,
+                                                      tag_filter text default null,
+                                                      after_rank real default null,
+                                                      after_id bigint default null,
+                                                      page_size int default 20)
+            returns table (id bigint, rank real) language sql stable as $$
+              select id, rank from (
+                select e.id, ts_rank(to_tsvector('simple', coalesce(e.content, '') || ' ' ||
+                                                           coalesce(e.translation, '')),
+                                     plainto_tsquery('simple', keyword)) as rank
+                from entries e
+                where (strpos(lower(e.content), lower(keyword)) > 0
+                       or strpos(lower(e.translation), lower(keyword)) > 0)
+                  and (type_filter is null or e.type = type_filter)
+                  and (tag_filter is null or e.tags::jsonb ? tag_filter)
+              ) ranked
+              where after_rank is null or (rank, id) < (after_rank, after_id)
+              order by rank desc, id desc
+              limit page_size;
+            $$;
+        """
+        after_rank, after_id = cursor if cursor is not None else (None, None)
+        result = self._rpc("search_entries", {
+            "keyword": keyword, "type_filter": type_filter, "tag_filter": tag_filter,
+            "after_rank": after_rank, "after_id": after_id, "page_size": page_size + 1,
+        })
+        if result is None:
+            return None
+        ranked = result.data or []
+        next_cursor = None
+        if len(ranked) > page_size:
+            ranked = ranked[:page_size]
+            next_cursor = (ranked[-1]["rank"], ranked[-1]["id"])
+        if not ranked:
+            return [], None
+
+        if columns is not None and "id" not in columns:
+            columns = tuple(columns) + ("id",)
+        rows = {
+            row["id"]: self._normalize_row(row)
+            for row in self._execute(self._select(columns).in_("id", [row["id"] for row in ranked])).data
+        }
+        return [rows[row["id"]] for row in ranked if row["id"] in rows], next_cursor
+
+    def get_items_page(self, page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[str, int]] = None,
+                       columns: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """Keyset-paginated listing of all items, returns (items, next_cursor)"""
+        return self.search_items_page(page_size=page_size, cursor=cursor, columns=columns)
+
+    def get_random_items(self, limit: int = 1, tag_filter: str = None,
+                         columns: Optional[Sequence[str]] = None, weighted: bool = False) -> List[Dict]:
+        """
+        Random items for review, sampled on the server by the sample_items RPC.
+        Like the SQLite backend it probes random ids in [min(id), max(id)] and
+        rejects probes that land in a gap, miss the tag, or (weighted) fail the
+        1 / (1 + review_count) acceptance test, so a sample costs a few primary
+        key lookups instead of a scan:
+
+            create or replace function sample_items(n int, tag text default null,
+                                                    weighted boolean default false)
+            returns setof bigint language plpgsql volatile as $$
+            declare
+              lo bigint; hi bigint; probe bigint; reviews int;
+              picked bigint[] := '{}';
+            begin
+              select min(id), max(id) into lo, hi from entries;
+              if lo is null or n <= 0 then return; end if;
+              for attempt in 1 .. 16 + 8 * n loop
+                exit when cardinality(picked) >= n;
+                probe := lo + floor(random() * (hi - lo + 1))::bigint;
+                continue when probe = any(picked);
+                select review_count into reviews from entries
+                  where id = probe and (tag is null or tags::jsonb ? tag);
+                continue when not found;
+                continue when weighted and random() * (1 + coalesce(reviews, 0)) >= 1;
+                picked := picked || probe;
+              end loop;
+              if cardinality(picked) >= n then
+                return query select unnest(picked);
+                return;
+              end if;
+              -- Probes ran out (sparse ids, a rare tag, heavily reviewed items, or
+              -- n close to the table size): one exact pass over the candidates with
+              -- exponential keys, top-N heapsort keeps only n rows
+              return query
+                select id from entries
+                where tag is null or tags::jsonb ? tag
+                order by -ln(1 - random()) * (case when weighted then 1 + review_count else 1 end)
+                limit n;
+            end;
+            $$;
+
+        Known cost: the fallback reads every candidate row (a sequential scan, or
+        an index scan on a GIN index over tags). It only runs when the probes
+        fail, e.g. for a tag on a small share of a large table.
+
+        Without the RPC, streams (id, review_count) and samples client-side.
+        weighted=True favours items with fewer reviews.
+        """
+        result = self._rpc("sample_items", {"n": limit, "tag": tag_filter, "weighted": weighted})
+        if result is not None:
+            ids = result.data or []
+        else:
+            rows = self.iter_items(columns=("id", "review_count", "tags"))
+            ids = weighted_reservoir_sample(
+                ((row["id"], review_weight(row.get("review_count")) if weighted else 1.0)
+                 for row in rows if not tag_filter or tag_filter in row["tags"]),
+                limit
+            )
+        if not ids:
+            return []
+
+        if columns is not None and "id" not in columns:
+            columns = tuple(columns) + ("id",)
+        result = self._execute(self._select(columns).in_("id", ids))
+        # Keep the sampled order
+        rows = {row["id"]: self._normalize_row(row) for row in result.data}
+        return [rows[item_id] for item_id in ids if item_id in rows]
+
+    def iter_item_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE, columns: Optional[Sequence[str]] = None,
+                         prefetch: bool = True) -> Iterator[List[Dict]]:
+        """
+        Walk the whole table in id order, one page of at most chunk_size rows at a time
+
+        Keyset paging on id (`id > last_id order by id limit n`), so every page
+        is an index range scan and rows are parsed page by page. The scan ends
+        on an empty page rather than a short one, so a server-side max-rows
+        cap smaller than chunk_size can't end it early. With prefetch=True the
+        next page is requested in the background while the caller processes
+        the current one.
+        """
+        columns = LIST_COLUMNS if columns is None else tuple(columns)
+        if "id" not in columns:
+            columns = columns + ("id",)
+
+        def fetch(after_id: Optional[int]) -> List[Dict]:
+            q = self._select(columns)
+            if after_id is not None:
+                q = q.gt("id", after_id)
+            return self._execute(q.order("id").limit(chunk_size)).data
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            rows = fetch(None)
+            while rows:
+                last_id = rows[-1]["id"]
+                pending = executor.submit(fetch, last_id) if executor else None
+                yield [self._normalize_row(row) for row in rows]
+                rows = pending.result() if pending else fetch(last_id)
+        finally:
+            if executor:
+                executor.shutdown(wait=False)
+
+    def iter_items(self, chunk_size: int = DEFAULT_CHUNK_SIZE, columns: Optional[Sequence[str]] = None,
+                   prefetch: bool = True) -> Iterator[Dict]:
+        """Stream every item in id order, see iter_item_chunks"""
+        for chunk in self.iter_item_chunks(chunk_size, columns, prefetch):
+            yield from chunk
+
+    def get_all_items(self, columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        Every item, newest first
+
+        Fetched page by page through iter_items: a single select would be
+        silently truncated at PostgREST's max-rows limit.
+        """
+        columns = LIST_COLUMNS if columns is None else tuple(columns)
+        extra = tuple(column for column in ("created_at", "id") if column not in columns)
+        items = list(self.iter_items(columns=columns + extra))
+        items.sort(key=lambda item: (item.get("created_at") or "", item["id"]), reverse=True)
+        for item in items:
+            for column in extra:
+                item.pop(column, None)
+        return items
+
+    def get_embeddings(self, item_ids: Sequence[int], chunk_size: int = 500) -> Dict[int, Optional[str]]:
+        """
+        Embeddings (base64 text, as stored) for the given ids only: {id: embedding}
+
+        This is the only read that ships the embedding column unless a caller
+        asks for it with an explicit projection.
+        """
+        embeddings = {}
+        item_ids = list(item_ids)
+        for start in range(0, len(item_ids), chunk_size):
+            result = self._execute(
+                self.supabase.table(self.table_name)
+                .select("id,embedding")
+                .in_("id", item_ids[start:start + chunk_size])
+            )
+            for row in result.data:
+                embeddings[row["id"]] = row.get("embedding")
+        return embeddings
+
+    def list_tags(self) -> List[Tuple[str, int]]:
+        """Every tag with its item count: [(tag, count), ...] sorted by tag"""
+        counts: Dict[str, int] = {}
+        for row in self.iter_items(columns=("id", "tags")):
+            for tag in set(row.get("tags") or []):
+                counts[tag] = counts.get(tag, 0) + 1
+        return sorted(counts.items())
+
+    def _count(self, build=lambda q: q) -> int:
+        """Exact row count of a filtered query without transferring rows"""
+        q = self.supabase.table(self.table_name).select("id", count="exact", head=True)
+        return build(q).execute().count or 0
+
+    def get_stats(self) -> Dict:
+        """
+        Aggregate counts: {'total', 'by_type', 'by_tag', 'reviewed_today', 'never_reviewed'}
+
+        Uses the item_stats RPC when it exists so the database does the grouping:
+
+            create or replace function item_stats(today date) returns json
+            language sql stable as $$
+              select json_build_object(
+                'total', (select count(*) from entries),
+                'by_type', (select coalesce(json_object_agg(type, n), '{}')
+                            from (select type, count(*) n from entries group by type) t),
+                'by_tag', (select coalesce(json_object_agg(tag, n), '{}')
+                           from (select tag, count(*) n
+                                 from entries, jsonb_array_elements_text(tags::jsonb) tag
+                                 group by tag) t),
+                'reviewed_today', (select count(*) from entries where last_reviewed >= today),
+                'never_reviewed', (select count(*) from entries where last_reviewed is null)
+              );
+            $$;
+
+        Without it, falls back to head-only count queries plus one streamed
+        (type, tags) scan.
+        """
+        today = datetime.date.today().isoformat()
+        result = self._rpc("item_stats", {"today": today})
+        if result is not None and result.data:
+            return result.data
+
+        by_type: Dict[str, int] = {}
+        by_tag: Dict[str, int] = {}
+        for row in self.iter_items(columns=("id", "type", "tags")):
+            by_type[row["type"]] = by_type.get(row["type"], 0) + 1
+            for tag in set(row["tags"]):
+                by_tag[tag] = by_tag.get(tag, 0) + 1
+        return {
+            "total": self._count(),
+            "by_type": by_type,
+            "by_tag": dict(sorted(by_tag.items())),
+            "reviewed_today": self._count(lambda q: q.gte("last_reviewed", today)),
+            "never_reviewed": self._count(lambda q: q.is_("last_reviewed", "null")),
+        }
+
+    # ----------------------
+    # Materialized related lists
+    # ----------------------
+    def get_related(self, item_id: int,
+                    columns: Optional[Sequence[str]] = None) -> Optional[List[Tuple[Dict, float]]]:
+        """Read the stored neighbour list, returns [(item, score), ...], or None if it was never computed"""
+        result = self._execute(
+            self.supabase.table(self.related_table)
+            .select("related_id, score")
+            .eq("item_id", item_id)
+            .order("score", desc=True)
+        )
+        if not result.data:
+            return None
+        scores = {row["related_id"]: row["score"] for row in result.data if row["related_id"] != item_id}
+        if not scores:
+            return []
+        items = self._execute(
+            self._select(LIST_COLUMNS if columns is None else columns)
+            .in_("id", list(scores))
         )
+        related = [(self._normalize_row(row), scores[row["id"]]) for row in items.data]
+        related.sort(key=lambda pair: pair[1], reverse=True)
+        return related
 
-        return [self._normalize_row(row) for row in result.data]
+    def _iter_related_rows(self, columns: str, where: Optional[Callable] = None,
+                           chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict]:
+        """
+        Stream rows of the related table, keyset-paged on (item_id, related_id)
+
+        Like iter_item_chunks, the scan ends on an empty page, so PostgREST's
+        max-rows cap can't truncate it
+        """
+        after = None
+        while True:
+            q = self.supabase.table(self.related_table).select(columns)
+            if where is not None:
+                q = where(q)
+            if after is not None:
+                item_id, related_id = after
+                q = q.or_(f"item_id.gt.{int(item_id)},and(item_id.eq.{int(item_id)},related_id.gt.{int(related_id)})")
+            rows = self._execute(q.order("item_id").order("related_id").limit(chunk_size)).data
+            if not rows:
+                return
+            yield from rows
+            after = (rows[-1]["item_id"], rows[-1]["related_id"])
+
+    def get_related_lists(self, item_ids: Optional[Sequence[int]] = None,
+                          referencing: Optional[Sequence[int]] = None,
+                          chunk_size: int = 500) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        Read neighbour lists: {item_id: [(related_id, score), ...]}, best first;
+        lists computed as empty map to []
+
+        Without item_ids / referencing every list is read; otherwise only the
+        lists of item_ids and the lists that contain any of the referencing ids
+        """
+        columns = "item_id, related_id, score"
+        if item_ids is None and referencing is None:
+            rows = list(self._iter_related_rows(columns))
+        else:
+            wanted = set(item_ids or ())
+            referencing = list(referencing or ())
+            for start in range(0, len(referencing), chunk_size):
+                chunk = referencing[start:start + chunk_size]
+                wanted.update(row["item_id"] for row in self._iter_related_rows(
+                    "item_id, related_id", lambda q: q.in_("related_id", chunk))
+                    if row["item_id"] != row["related_id"])
+            wanted, rows = sorted(wanted), []
+            for start in range(0, len(wanted), chunk_size):
+                chunk = wanted[start:start + chunk_size]
+                rows.extend(self._iter_related_rows(columns, lambda q: q.in_("item_id", chunk)))
+        lists = {}
+        for row in rows:
+            pairs = lists.setdefault(row["item_id"], [])
+            if row["related_id"] != row["item_id"]:
+                pairs.append((row["related_id"], row["score"]))
+        for pairs in lists.values():
+            pairs.sort(key=lambda pair: pair[1], reverse=True)
+        return lists
+
+    def set_related_many(self, lists: Dict[int, List[Tuple[int, float]]], chunk_size: int = 500):
+        """Replace the neighbour lists of several items (and write their computed markers)"""
+        if not lists:
+            return
+        item_ids = list(lists)
+        for start in range(0, len(item_ids), chunk_size):
+            chunk = item_ids[start:start + chunk_size]
+            self.supabase.table(self.related_table).delete().in_("item_id", chunk).execute()
+        rows = [{"item_id": item_id, "related_id": item_id, "score": None} for item_id in item_ids] + [
+            {"item_id": item_id, "related_id": related_id, "score": score}
+            for item_id, pairs in lists.items()
+            for related_id, score in pairs
+        ]
+        for start in range(0, len(rows), chunk_size):
+            self.supabase.table(self.related_table).insert(rows[start:start + chunk_size]).execute()
+
+    def set_related(self, item_id: int, pairs: List[Tuple[int, float]]):
+        self.set_related_many({item_id: pairs})
+
+    def delete_related(self, item_id: int) -> List[int]:
+        """Drop the item's list and its appearances in others; returns affected item ids"""
+        result = self._execute(
+            self.supabase.table(self.related_table)
+            .select("item_id")
+            .eq("related_id", item_id)
+        )
+        referencing = [row["item_id"] for row in result.data if row["item_id"] != item_id]
+        self.supabase.table(self.related_table).delete().eq("item_id", item_id).execute()
+        self.supabase.table(self.related_table).delete().eq("related_id", item_id).execute()
+        return referencing
 
     # ----------------------
-    # CSV Export (optional)
+    # CSV Export
     # ----------------------
-    def export_to_csv(self) -> str:
-        raise NotImplementedError("Export not supported for cloud DB")
+    def iter_csv(self, embeddings: str = "skip", chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Stream every item as UTF-8 CSV, one piece per page
+
+        embeddings: "skip" leaves the column out (and doesn't download it),
+        "base64" exports the stored base64 text
+        """
+        columns = csv_columns(embeddings)
+        return encode_csv(self.iter_item_chunks(chunk_size, columns=columns), columns)
+
+    def export_to_csv(self, embeddings: str = "skip") -> str:
+        """The whole CSV as one string; use iter_csv for large tables"""
+        return b"".join(self.iter_csv(embeddings)).decode("utf-8")
 
     def close(self):
         pass  # Nothing required for Supabase
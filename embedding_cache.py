@@ -0,0 +1,162 @@
+"""
+Embedding 缓存模块 - 基于磁盘的 embedding 缓存，按 LRU 策略淘汰
+
+缓存键为 模型名 + 规范化文本 的 SHA-256 哈希，命中时完全跳过 transformer 计算。
+条目数保存在内存中，读取时的访问时间先记在内存里，攒够一批或超过一定时间后再一次写入。
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from embedding_utils import encode_embedding, decode_embedding, normalize_text
+
+DEFAULT_CACHE_PATH = "embedding_cache.db"
+DEFAULT_MAX_ENTRIES = 100_000
+# 待写入的访问时间达到该数量或等待超过该秒数时写入磁盘
+ACCESS_FLUSH_SIZE = 1000
+ACCESS_FLUSH_INTERVAL = 30.0
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """生成缓存键"""
+    payload = f"{model_name}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    磁盘缓存（SQLite 文件），容量达到 max_entries 后淘汰最久未使用的条目
+
+    hits / misses 记录命中与未命中次数。条目数只在打开时统计一次，
+    之后由本实例的写入和淘汰维护（多个进程共用一个缓存文件时只是近似值）
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_access: Dict[str, float] = {}   # 缓存键 -> 尚未写入的访问时间
+        self._last_flush = time.monotonic()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                embedding BLOB,
+                last_access REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_access ON embedding_cache (last_access)")
+        self.conn.commit()
+        self._count = self.conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+    def _flush_access(self):
+        """把内存中的访问时间写入磁盘（调用方持有锁）"""
+        if self._pending_access:
+            self.conn.executemany(
+                "UPDATE embedding_cache SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._pending_access.items()]
+            )
+            self.conn.commit()
+            self._pending_access.clear()
+        self._last_flush = time.monotonic()
+
+    def get_many(self, model_name: str, texts: List[str]) -> Dict[str, "object"]:
+        """
+        批量查询缓存
+
+        返回: {text: embedding}，只包含命中的文本
+        """
+        keys = {text: cache_key(model_name, text) for text in texts}
+        found = {}
+        with self._lock:
+            unique_keys = list(set(keys.values()))
+            rows = {}
+            # SQLite 的参数数量有限，分批查询
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                for key, blob in self.conn.execute(
+                    f"SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders})", chunk
+                ):
+                    rows[key] = blob
+            for text, key in keys.items():
+                if key in rows:
+                    found[text] = decode_embedding(rows[key])[0]
+            now = time.time()
+            self._pending_access.update((key, now) for key in rows)
+            if (len(self._pending_access) >= ACCESS_FLUSH_SIZE
+                    or time.monotonic() - self._last_flush >= ACCESS_FLUSH_INTERVAL):
+                self._flush_access()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, model_name: str, text: str):
+        """查询单个文本，未命中返回 None"""
+        return self.get_many(model_name, [text]).get(text)
+
+    def put_many(self, model_name: str, embeddings: Dict[str, "object"]):
+        """批量写入缓存，并按 LRU 淘汰超出容量的条目"""
+        if not embeddings:
+            return
+        now = time.time()
+        rows = [
+            (cache_key(model_name, text), encode_embedding(embedding, model_id=model_name), now)
+            for text, embedding in embeddings.items()
+        ]
+        with self._lock:
+            inserted = self.conn.executemany(
+                "INSERT OR IGNORE INTO embedding_cache (key, embedding, last_access) VALUES (?, ?, ?)",
+                rows
+            ).rowcount
+            if inserted < len(rows):
+                # 已存在的键：更新 embedding 和访问时间
+                self.conn.executemany(
+                    "UPDATE embedding_cache SET embedding = ?, last_access = ? WHERE key = ?",
+                    [(blob, accessed, key) for key, blob, accessed in rows]
+                )
+            self._count += inserted
+            if self._count > self.max_entries:
+                # 淘汰前写入访问时间，保证按真实的最近使用顺序淘汰
+                self._flush_access()
+                deleted = self.conn.execute("""
+                    DELETE FROM embedding_cache WHERE key IN (
+                        SELECT key FROM embedding_cache ORDER BY last_access ASC LIMIT ?
+                    )
+                """, (self._count - self.max_entries,)).rowcount
+                self._count -= deleted
+            self.conn.commit()
+
+    def put(self, model_name: str, text: str, embedding):
+        """写入单个文本的 embedding"""
+        self.put_many(model_name, {text: embedding})
+
+    def __len__(self):
+        return self._count
+
+    def stats(self) -> Dict:
+        """返回缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._pending_access.clear()
+            self.conn.execute("DELETE FROM embedding_cache")
+            self.conn.commit()
+            self._count = 0
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+        self.conn.close()
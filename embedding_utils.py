@@ -1,24 +1,159 @@
 """
 Embedding 工具模块 - 处理向量生成和相似度查询
 """
+import base64
+import hashlib
 import pickle
-from typing import List, Dict, Tuple, Optional
+import struct
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, List, Dict, Tuple, Optional, Union
 
 # 延迟导入 numpy，避免在模块级别导入失败
 # 在 Streamlit Cloud 上，numpy 可能在某些情况下还没有完全安装好
 # 所以在需要使用时才导入
 
+# ==================== Embedding 存储格式 ====================
+# 版本 1 的二进制格式（全部为小端序）：
+#   magic      3 字节  b"DNE"
+#   version    1 字节  1
+#   dtype      1 字节  1=float32, 2=float16, 3=int8
+#   dim        2 字节  向量维度 (uint16)
+#   id_len     1 字节  模型 id 的字节数
+#   model_id   id_len 字节（UTF-8），之后补零使数据按 4 字节对齐
+#   scale      4 字节  仅 int8：每个向量的 float32 缩放系数
+#   data       dim 个小端序数值
+EMBEDDING_MAGIC = b"DNE"
+EMBEDDING_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<3sBBHB")
+_DTYPE_CODES = {"float32": 1, "float16": 2, "int8": 3}
+_DTYPE_NAMES = {code: name for name, code in _DTYPE_CODES.items()}
+_NUMPY_DTYPES = {"float32": "<f4", "float16": "<f2", "int8": "i1"}
+_SCALE = struct.Struct("<f")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：Unicode NFC、去除首尾空白、合并连续空白（embedding 缓存键与去重都使用它）"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def quantize_int8(matrix):
+    """
+    按行对称量化为 int8
+
+    返回: (int8 矩阵, 每行的 float32 缩放系数)，还原方式为 q * scale
+    """
+    import numpy as np
+
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=-1, keepdims=True) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(matrix / scales), -127, 127).astype(np.int8)
+    return quantized, scales.squeeze(-1).astype(np.float32)
+
+
+def is_encoded_embedding(blob) -> bool:
+    """判断 BLOB 是否为当前的二进制格式"""
+    return bytes(blob[:3]) == EMBEDDING_MAGIC
+
+
+def encode_embedding(embedding, dtype: str = "float32", model_id: str = "") -> bytes:
+    """将向量编码为带版本头的原始字节"""
+    import numpy as np
+
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"不支持的 embedding 存储类型: {dtype}")
+    vector = np.asarray(embedding).reshape(-1)
+    model_bytes = model_id.encode("utf-8")[:255]
+    header = _HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_FORMAT_VERSION,
+                          _DTYPE_CODES[dtype], vector.shape[0], len(model_bytes))
+    padding = b"\0" * (-(len(header) + len(model_bytes)) % 4)
+    if dtype == "int8":
+        quantized, scale = quantize_int8(vector)
+        return header + model_bytes + padding + _SCALE.pack(float(scale)) + quantized.tobytes()
+    return header + model_bytes + padding + vector.astype(_NUMPY_DTYPES[dtype]).tobytes()
+
+
+def decode_embedding(blob) -> Tuple["object", str]:
+    """
+    解码二进制格式的 embedding
+
+    返回: (向量, 模型 id)，浮点格式通过 np.frombuffer 零拷贝得到（只读），
+    int8 格式会按缩放系数还原为 float32
+    """
+    import numpy as np
+
+    magic, version, dtype_code, dim, id_len = _HEADER.unpack_from(blob, 0)
+    if magic != EMBEDDING_MAGIC or version != EMBEDDING_FORMAT_VERSION:
+        raise ValueError("未知的 embedding 格式")
+    dtype = _DTYPE_NAMES[dtype_code]
+    model_id = bytes(blob[_HEADER.size:_HEADER.size + id_len]).decode("utf-8")
+    offset = _HEADER.size + id_len
+    offset += -offset % 4
+    if dtype == "int8":
+        scale = _SCALE.unpack_from(blob, offset)[0]
+        quantized = np.frombuffer(blob, dtype=np.int8, count=dim, offset=offset + _SCALE.size)
+        return quantized.astype(np.float32) * np.float32(scale), model_id
+    vector = np.frombuffer(blob, dtype=_NUMPY_DTYPES[dtype], count=dim, offset=offset)
+    return vector, model_id
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """只允许还原 numpy 数组的反序列化器，用于读取旧版 pickle 格式的 embedding"""
+    _ALLOWED = {
+        ("numpy", "ndarray"),
+        ("numpy", "dtype"),
+        ("numpy.core.multiarray", "_reconstruct"),
+        ("numpy.core.multiarray", "scalar"),
+        ("numpy._core.multiarray", "_reconstruct"),
+        ("numpy._core.multiarray", "scalar"),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) in self._ALLOWED:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"不允许的类型: {module}.{name}")
+
+
 class EmbeddingManager:
-    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+    # 内存中保留的查询向量数量
+    QUERY_CACHE_SIZE = 256
+    
+    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 storage_dtype: str = "float32", index_precision: str = "float32",
+                 cache=None, embedding_source: Optional[Callable[[List[int]], Dict]] = None):
         """
         初始化 Embedding 管理器
+        
+        storage_dtype: 存储格式中的数值类型（float32、float16 或 int8）
+        index_precision: 内存中相似度矩阵的精度（float32、float16 或 int8），
+                         量化后先在量化矩阵上粗排，再用全精度向量对候选重排
+        cache: 可选的 embedding_cache.EmbeddingCache，命中时跳过模型计算
+        embedding_source: 按 id 读取 embedding BLOB 的函数（如 db.get_embeddings），
+                          量化索引重排时用它读取候选，不必在内存中保留全部 BLOB
         """
+        if storage_dtype not in _DTYPE_CODES:
+            raise ValueError(f"不支持的 embedding 存储类型: {storage_dtype}")
+        if index_precision not in _DTYPE_CODES:
+            raise ValueError(f"不支持的索引精度: {index_precision}")
         self.model_name = model_name
+        self.storage_dtype = storage_dtype
+        self.index_precision = index_precision
+        self.cache = cache
+        self.embedding_source = embedding_source
+        self._query_cache = OrderedDict()    # 查询文本 -> 归一化向量（LRU）
         self.model = None
+        self._model_lock = threading.Lock()
+        self._index = None
     
     def get_model(self):
-        """延迟加载模型（仅在需要时加载）"""
-        if self.model is None:
+        """延迟加载模型（仅在需要时加载，多线程共享时只加载一次）"""
+        if self.model is not None:
+            return self.model
+        with self._model_lock:
+            if self.model is not None:
+                return self.model
             try:
                 # 确保 numpy 在导入 sentence_transformers 之前可用
                 import numpy as np
@@ -36,6 +171,40 @@ class EmbeddingManager:
         """
         生成文本的 embedding 向量
         """
+        return self.generate_embeddings([text])[0]
+    
+    def generate_embeddings(self, texts: List[str], batch_size: int = 64):
+        """
+        批量生成 embedding 向量
+        
+        每 batch_size 条文本只调用一次 model.encode，返回形状为 (len(texts), dim) 的二维数组
+        文本先规范化（与缓存键相同），规范化后相同的文本只计算一次；
+        配置了缓存时，命中的文本不再经过模型
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("numpy 未安装，请运行: pip install numpy")
+        
+        texts = [normalize_text(text) for text in texts]
+        unique_texts = list(dict.fromkeys(texts))
+        cached = self.cache.get_many(self.model_name, unique_texts) if self.cache is not None else {}
+        missing = [text for text in unique_texts if text not in cached]
+        
+        computed = {}
+        if missing or not texts:
+            encoded = self._encode_texts(missing, batch_size)
+            computed = dict(zip(missing, encoded))
+            if self.cache is not None:
+                self.cache.put_many(self.model_name, computed)
+            if not texts:
+                return encoded
+        
+        vectors = {**cached, **computed}
+        return np.stack([np.asarray(vectors[text], dtype=np.float32) for text in texts])
+    
+    def _encode_texts(self, texts: List[str], batch_size: int):
+        """调用 model.encode 批量计算 embedding，返回二维 numpy 数组"""
         # 确保 numpy 可用
         try:
             import numpy as np
@@ -53,73 +222,434 @@ class EmbeddingManager:
         if not hasattr(model, 'encode'):
             raise AttributeError("模型不支持 encode 方法")
         
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        def to_numpy(embeddings):
+            # 如果是 torch tensor，使用 tolist() 方式转换，避免直接调用 .numpy()
+            # 这样可以绕过 numpy 版本兼容性问题
+            if isinstance(embeddings, torch.Tensor):
+                return np.array(embeddings.detach().cpu().tolist())
+            if isinstance(embeddings, np.ndarray):
+                return embeddings
+            # 如果是 tensor 列表或其他类型，逐个转换后堆叠
+            return np.array([
+                e.detach().cpu().tolist() if isinstance(e, torch.Tensor) else e
+                for e in embeddings
+            ])
+        
         try:
             # 先尝试使用 convert_to_numpy=False，然后手动转换
             # 这样可以避免 numpy 版本兼容性问题
-            embedding = model.encode(text, convert_to_numpy=False, show_progress_bar=False)
-            
-            # 如果是 torch tensor，使用 tolist() 方式转换，避免直接调用 .numpy()
-            if isinstance(embedding, torch.Tensor):
-                # 使用 tolist() 然后转换为 numpy，这样可以绕过 numpy 版本兼容性问题
-                embedding_np = np.array(embedding.detach().cpu().tolist())
-            elif isinstance(embedding, np.ndarray):
-                embedding_np = embedding
-            else:
-                # 如果是列表或其他类型，直接转换为 numpy array
-                embedding_np = np.array(embedding)
-            
-            # 确保是 1D 或 2D numpy array
-            if len(embedding_np.shape) == 1:
-                embedding_np = embedding_np.reshape(1, -1)
-            
-            return embedding_np.squeeze()  # 如果只有一个样本，去掉 batch 维度
+            embeddings = model.encode(texts, batch_size=batch_size,
+                                      convert_to_numpy=False, show_progress_bar=False)
+            embeddings_np = to_numpy(embeddings)
         except RuntimeError as e:
             if "Numpy is not available" in str(e) or "numpy" in str(e).lower():
                 # 如果遇到 numpy 不可用错误，尝试使用 tolist() 方式
                 try:
-                    embedding = model.encode(text, convert_to_tensor=True, show_progress_bar=False)
-                    if isinstance(embedding, torch.Tensor):
-                        # 使用 tolist() 方式转换，避免 .numpy() 调用
-                        embedding_np = np.array(embedding.detach().cpu().tolist())
-                        return embedding_np.squeeze()
-                    else:
-                        embedding_np = np.array(embedding)
-                        return embedding_np.squeeze()
+                    embeddings = model.encode(texts, batch_size=batch_size,
+                                              convert_to_tensor=True, show_progress_bar=False)
+                    embeddings_np = to_numpy(embeddings)
                 except Exception as e2:
                     raise RuntimeError(f"生成 embedding 时出错（尝试了多种方式）: {e2}")
-            raise RuntimeError(f"生成 embedding 时出错: {e}")
+            else:
+                raise RuntimeError(f"生成 embedding 时出错: {e}")
         except Exception as e:
             raise RuntimeError(f"生成 embedding 时出错: {e}")
+        
+        # 确保是 2D numpy array（每行一个样本）
+        return embeddings_np.reshape(len(texts), -1)
     
     def save_embedding(self, embedding) -> bytes:
-        """将 embedding 转换为 BLOB 格式存储"""
-        # 确保 numpy 可用
+        """将 embedding 转换为 BLOB 格式存储（带版本头的原始字节）"""
+        return encode_embedding(embedding, dtype=self.storage_dtype, model_id=self.model_name)
+    
+    def embed_query(self, text: str):
+        """
+        生成归一化的查询向量，重复的查询直接复用内存中的结果
+        """
         import numpy as np
-        if not isinstance(embedding, np.ndarray):
-            embedding = np.array(embedding)
-        return pickle.dumps(embedding)
+        
+        key = " ".join(text.split())
+        vector = self._query_cache.get(key)
+        if vector is not None:
+            self._query_cache.move_to_end(key)
+            return vector
+        vector = np.asarray(self.generate_embedding(key), dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        self._query_cache[key] = vector
+        if len(self._query_cache) > self.QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        return vector
+    
+    def set_index_precision(self, precision: str):
+        """切换相似度矩阵的精度，下次查询时按新精度重建"""
+        if precision not in _DTYPE_CODES:
+            raise ValueError(f"不支持的索引精度: {precision}")
+        if precision != self.index_precision:
+            self.index_precision = precision
+            self._index = None
+    
+    def get_index(self, items: List[Dict]) -> "EmbeddingIndex":
+        """
+        获取集合的相似度索引，集合未变化时复用已构建的矩阵
+
+        items 为带版本号的 ItemSnapshot 时按版本号判断，不再遍历条目计算签名；
+        否则按签名判断。条目可以不含 embedding 字段，构建时通过 embedding_source 按 id 读取
+        """
+        version = getattr(items, 'version', None)
+        index = self._index
+        if version is not None:
+            if index is None or index.version != version:
+                index = EmbeddingIndex(self, precision=self.index_precision).build(items)
+                index.version = version
+                self._index = index
+            return index
+        signature = EmbeddingIndex.make_signature(items)
+        if index is None or index.signature != signature:
+            index = EmbeddingIndex(self, precision=self.index_precision).build(items, signature)
+            self._index = index
+        return index
     
-    def load_embedding(self, embedding_blob: bytes):
+    def load_embedding(self, embedding_blob: Union[bytes, str, None]):
         """
         从 BLOB 格式加载 embedding
+        
+        支持当前的二进制格式、Supabase 返回的 base64 字符串，以及旧版 pickle 格式
+        （旧版格式只允许还原 numpy 数组，可用 migrate_embeddings.py 迁移）
         """
         if embedding_blob is None:
             return None
         try:
+            if isinstance(embedding_blob, str):
+                embedding_blob = base64.b64decode(embedding_blob)
+            if is_encoded_embedding(embedding_blob):
+                return decode_embedding(embedding_blob)[0]
+            import io
             import numpy as np
-            return pickle.loads(embedding_blob)
+            embedding = _LegacyUnpickler(io.BytesIO(embedding_blob)).load()
+            return np.asarray(embedding)
         except Exception:
             return None
 
 
+class ItemSnapshot(list):
+    """
+    带数据版本号的条目列表
+
+    调用方保证版本号不变时内容不变（例如每次写入后加一的写入代数），
+    EmbeddingManager.get_index 据此直接复用索引。快照可能在多个会话间共享，不要原地修改
+    """
+    def __init__(self, items: List[Dict], version):
+        super().__init__(items)
+        self.version = version
+
+
+class EmbeddingIndex:
+    """
+    相似度索引 - 将整个集合的 embedding 保存在一个连续、预先归一化的矩阵中
+
+    查询时只需一次矩阵-向量乘法加 argpartition 即可得到 top-k，
+    标签预筛选以布尔掩码的形式作用在得分上。
+
+    precision 为 float16 或 int8（每行一个缩放系数）时，矩阵内存分别缩小为 1/2 和 1/4，
+    先在量化矩阵上粗排出 k * rerank_factor 个候选，再解码这些候选的全精度向量重排。
+
+    索引不保留 embedding BLOB：items 中的条目是去掉 embedding 的副本。量化模式下
+    候选的全精度向量通过 embedding_manager.embedding_source 按 id 读取；
+    没有配置时才保留一份 BLOB 用于重排。
+    """
+    # 量化矩阵按块转换为 float32 计算，限制查询时的临时内存
+    BLOCK_ROWS = 8192
+    # 量化矩阵上得分的最大误差（保守估计），用于剪枝时放宽阈值
+    SCORE_TOLERANCE = {"float32": 0.0, "float16": 2e-3, "int8": 4e-2}
+
+    def __init__(self, embedding_manager: "EmbeddingManager", precision: str = "float32",
+                 rerank_factor: int = 4):
+        if precision not in ("float32", "float16", "int8"):
+            raise ValueError(f"不支持的索引精度: {precision}")
+        self.embedding_manager = embedding_manager
+        self.precision = precision
+        self.rerank_factor = rerank_factor
+        self.items: List[Dict] = []
+        self.matrix = None          # (n, dim)，每行已归一化（按 precision 存储）
+        self.scales = None          # (n,) float32，仅 int8 使用
+        self.has_embedding = None   # (n,) bool，该行是否有有效 embedding
+        self.tagged = None          # (n,) bool，该行是否有标签
+        self.row_of: Dict = {}      # 条目 id -> 行号
+        self.tag_rows: Dict = {}    # 标签 -> 行号列表
+        self.type_rows: Dict = {}   # 类型 -> 行号列表
+        self.signature = None
+        self.version = None         # 构建自 ItemSnapshot 时的版本号
+        self._blobs: Dict = {}      # 条目 id -> BLOB，仅在量化且没有 embedding_source 时使用
+
+    @property
+    def quantized(self) -> bool:
+        return self.precision != "float32"
+
+    @staticmethod
+    def make_signature(items: List[Dict]) -> bytes:
+        """根据 id、类型、标签和 embedding 生成集合签名（摘要，不引用 BLOB），用于判断索引是否需要重建"""
+        digest = hashlib.blake2b(digest_size=16)
+        for item in items:
+            embedding = item.get('embedding') or b''
+            if isinstance(embedding, str):
+                embedding = embedding.encode('ascii')
+            tags = "\x1f".join(item.get('tags') or [])
+            digest.update(f"{item['id']}\x1e{item.get('type')}\x1e{tags}\x1e{len(embedding)}\x1e".encode('utf-8'))
+            digest.update(embedding)
+        return digest.digest()
+
+    def build(self, items: List[Dict], signature: Optional[bytes] = None):
+        """解码所有 embedding 并构建归一化矩阵（缺少 embedding 字段的条目通过 embedding_source 读取）"""
+        import numpy as np
+
+        missing = [item['id'] for item in items if 'embedding' not in item]
+        source = self.embedding_manager.embedding_source
+        fetched = source(missing) if missing and source is not None else {}
+        vectors = []
+        blobs = []
+        dim = 0
+        for item in items:
+            blob = item['embedding'] if 'embedding' in item else fetched.get(item['id'])
+            blobs.append(blob)
+            vector = None
+            if blob:
+                vector = self.embedding_manager.load_embedding(blob)
+            if vector is not None:
+                vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+                dim = dim or vector.shape[0]
+                if vector.shape[0] != dim:
+                    vector = None
+            vectors.append(vector)
+
+        matrix = np.zeros((len(items), dim), dtype=np.float32)
+        has_embedding = np.zeros(len(items), dtype=bool)
+        for row, vector in enumerate(vectors):
+            if vector is not None:
+                matrix[row] = vector
+                has_embedding[row] = True
+
+        # 预先归一化，之后点积即为余弦相似度
+        norms = np.linalg.norm(matrix, axis=1)
+        has_embedding &= norms > 0
+        matrix[has_embedding] /= norms[has_embedding, None]
+
+        self.scales = None
+        if self.precision == "int8":
+            matrix, self.scales = quantize_int8(matrix)
+        elif self.precision == "float16":
+            matrix = matrix.astype(np.float16)
+
+        self.items = [{k: v for k, v in item.items() if k != 'embedding'} for item in items]
+        self._blobs = {}
+        if self.quantized and self.embedding_manager.embedding_source is None:
+            self._blobs = {item['id']: blob for item, blob, ok in zip(items, blobs, has_embedding) if ok}
+        self.matrix = np.ascontiguousarray(matrix)
+        self.has_embedding = has_embedding
+        self.tagged = np.array([bool(item.get('tags')) for item in self.items], dtype=bool)
+        self.row_of = {item['id']: row for row, item in enumerate(self.items)}
+        self.tag_rows = {}
+        self.type_rows = {}
+        for row, item in enumerate(self.items):
+            for tag in item.get('tags') or []:
+                self.tag_rows.setdefault(tag, []).append(row)
+            self.type_rows.setdefault(item.get('type'), []).append(row)
+        if signature is None and getattr(items, 'version', None) is None:
+            signature = self.make_signature(items)
+        self.signature = signature      # 按版本号复用的快照不计算签名
+        return self
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1] if self.matrix is not None else 0
+
+    def tag_mask(self, tags):
+        """返回带有任一给定标签的行的布尔掩码"""
+        import numpy as np
+
+        mask = np.zeros(len(self.items), dtype=bool)
+        for tag in tags:
+            rows = self.tag_rows.get(tag)
+            if rows:
+                mask[rows] = True
+        return mask
+
+    def type_mask(self, type_):
+        """返回指定类型的行的布尔掩码"""
+        import numpy as np
+
+        mask = np.zeros(len(self.items), dtype=bool)
+        rows = self.type_rows.get(type_)
+        if rows:
+            mask[rows] = True
+        return mask
+
+    def _normalized(self, embedding):
+        """将 BLOB 解码为归一化的 float32 向量，无效时返回 None"""
+        import numpy as np
+
+        if not embedding:
+            return None
+        vector = self.embedding_manager.load_embedding(embedding)
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm == 0 or vector.shape[0] != self.dim:
+            return None
+        return vector / norm
+
+    def _full_precision(self, rows) -> Dict[int, object]:
+        """读取指定行的全精度归一化向量 {行号: 向量}（量化模式重排用）"""
+        ids = [self.items[row]['id'] for row in rows]
+        source = self.embedding_manager.embedding_source
+        blobs = source(ids) if source is not None else self._blobs
+        vectors = {}
+        for row, item_id in zip(rows, ids):
+            vector = self._normalized(blobs.get(item_id))
+            if vector is not None:
+                vectors[row] = vector
+        return vectors
+
+    def query_vector(self, item: Dict):
+        """获取条目的归一化查询向量（未量化时直接复用索引中的行）"""
+        row = self.row_of.get(item.get('id'))
+        if row is not None and self.has_embedding[row]:
+            if not self.quantized:
+                return self.matrix[row]
+            # 传入的条目可能是不含 embedding 的列表投影，按 id 读取全精度向量
+            vector = self._normalized(item.get('embedding'))
+            if vector is None:
+                vector = self._full_precision([row]).get(row)
+            return vector
+        return self._normalized(item.get('embedding'))
+
+    def scores(self, query):
+        """对整个矩阵做矩阵-向量乘法（量化矩阵分块计算，结果为近似值）"""
+        import numpy as np
+
+        if not self.quantized:
+            return self.matrix @ query
+        scores = np.empty(len(self.items), dtype=np.float32)
+        for start in range(0, len(self.items), self.BLOCK_ROWS):
+            block = self.matrix[start:start + self.BLOCK_ROWS].astype(np.float32)
+            scores[start:start + self.BLOCK_ROWS] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def block_scores(self, rows):
+        """
+        rows 中各行与所有行的得分矩阵 (len(rows), n)
+
+        量化矩阵按列分块转换为 float32 计算，结果为近似值
+        """
+        import numpy as np
+
+        rows = np.asarray(rows, dtype=np.int64)
+        if not self.quantized:
+            return self.matrix[rows] @ self.matrix.T
+        queries = self.matrix[rows].astype(np.float32)
+        if self.scales is not None:
+            queries *= self.scales[rows, None]
+        scores = np.empty((len(rows), len(self.items)), dtype=np.float32)
+        for start in range(0, len(self.items), self.BLOCK_ROWS):
+            block = self.matrix[start:start + self.BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + self.BLOCK_ROWS] = queries @ block.T
+        if self.scales is not None:
+            scores *= self.scales[None, :]
+        return scores
+
+    def top_k(self, query, k: int, mask=None) -> List[Tuple[int, float]]:
+        """
+        返回 [(行号, 相似度), ...]，按相似度降序排列
+
+        mask 为可选的布尔掩码，只在掩码为 True 且有 embedding 的行中选择
+        """
+        import numpy as np
+
+        if k <= 0 or len(self.items) == 0:
+            return []
+        valid = self.has_embedding if mask is None else (mask & self.has_embedding)
+        n_valid = int(np.count_nonzero(valid))
+        if n_valid == 0:
+            return []
+
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.where(valid, self.scores(query), -np.inf)
+        k = min(k, n_valid)
+        n_candidates = min(n_valid, k * self.rerank_factor) if self.quantized else k
+        if n_candidates < len(scores):
+            top = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        else:
+            top = np.flatnonzero(valid)
+
+        if self.quantized:
+            # 第二轮：只对候选读取全精度向量重新打分
+            for row, vector in self._full_precision([int(row) for row in top]).items():
+                scores[row] = float(vector @ query)
+
+        top = top[np.argsort(-scores[top], kind='stable')][:k]
+        return [(int(row), float(scores[row])) for row in top]
+
+
+def _get_related_items_ann(current_item: Dict, other_items: List[Dict], current_tags: set,
+                           top_k: int, embedding_manager: EmbeddingManager,
+                           ann_index) -> List[Tuple[Dict, float]]:
+    """使用 ANN 索引获取相关条目，返回格式与 get_related_items 相同"""
+    query = ann_index.vector_of(current_item['id'])
+    if query is None and current_item.get('embedding'):
+        query = embedding_manager.load_embedding(current_item['embedding'])
+    
+    if current_tags:
+        candidates = [item for item in other_items if set(item.get('tags', [])) & current_tags]
+    else:
+        candidates = other_items
+    
+    if query is None:
+        # 如果当前条目没有 embedding，只按标签匹配
+        if not current_tags:
+            return []
+        return [(item, 1.0) for item in candidates[:top_k]]
+    
+    if not candidates:
+        return []
+    
+    by_id = {item['id']: item for item in candidates}
+    allowed_ids = list(by_id) if current_tags else None
+    # 多取一个，以便排除当前条目
+    hits = ann_index.search(query, top_k + 1, allowed_ids=allowed_ids)
+    related = [(by_id[item_id], score) for item_id, score in hits if item_id in by_id]
+    
+    # 不在索引中（没有 embedding）但标签匹配的条目，相似度设为 0.5
+    if current_tags:
+        for item in candidates:
+            if ann_index.vector_of(item['id']) is None:
+                related.append((item, 0.5))
+    
+    related.sort(key=lambda x: x[1], reverse=True)
+    return related[:top_k]
+
+
 def get_related_items(current_item: Dict, all_items: List[Dict], 
-                     top_k: int = 5, embedding_manager: Optional[EmbeddingManager] = None) -> List[Tuple[Dict, float]]:
+                     top_k: int = 5, embedding_manager: Optional[EmbeddingManager] = None,
+                     ann_index=None) -> List[Tuple[Dict, float]]:
     """
     获取相关条目
     
     策略：
-    1. 首先通过 tags 字段匹配同一主题的条目
-    2. 然后计算语义相似度，找出语义相近的条目
+    1. 首先通过 tags 字段匹配同一主题的条目（作为布尔掩码）
+    2. 然后在预先归一化的 embedding 矩阵上计算语义相似度，取 top-k
+    
+    传入 ann_index（ann_index.IVFIndex）时改用近似最近邻索引查询，适用于大规模卡组
     
     返回: [(item, similarity_score), ...] 按相似度降序排序
     """
@@ -128,15 +658,24 @@ def get_related_items(current_item: Dict, all_items: List[Dict],
     
     # 排除当前条目
     other_items = [item for item in all_items if item['id'] != current_item['id']]
+    current_tags = set(current_item.get('tags', []))
+    
+    if ann_index is not None and len(ann_index) > 0:
+        return _get_related_items_ann(current_item, other_items, current_tags,
+                                      top_k, embedding_manager, ann_index)
+    
+    try:
+        index = embedding_manager.get_index(all_items)
+    except ImportError:
+        # 如果无法导入 numpy，只返回标签匹配的条目
+        if current_tags:
+            other_items = [item for item in other_items if set(item.get('tags', [])) & current_tags]
+        return [(item, 1.0) for item in other_items[:top_k]]
     
-    # 如果当前条目没有 embedding，返回空列表
-    current_embedding = None
-    if current_item.get('embedding'):
-        current_embedding = embedding_manager.load_embedding(current_item['embedding'])
+    query = index.query_vector(current_item)
     
-    if current_embedding is None:
+    if query is None:
         # 如果当前条目没有 embedding，只按标签匹配
-        current_tags = set(current_item.get('tags', []))
         if not current_tags:
             return []
         
@@ -148,44 +687,319 @@ def get_related_items(current_item: Dict, all_items: List[Dict],
         
         return related[:top_k]
     
-    # 1. 按标签筛选同主题条目
-    current_tags = set(current_item.get('tags', []))
+    # 1. 按标签筛选同主题条目（没有标签则使用所有条目）
+    import numpy as np
     if current_tags:
-        same_tag_items = [
-            item for item in other_items 
-            if set(item.get('tags', [])) & current_tags
-        ]
+        mask = index.tag_mask(current_tags)
     else:
-        # 如果没有标签，使用所有条目
-        same_tag_items = other_items
+        mask = np.ones(len(index), dtype=bool)
+    current_row = index.row_of.get(current_item['id'])
+    if current_row is not None:
+        mask[current_row] = False
     
-    if not same_tag_items:
+    if not mask.any():
         return []
     
-    # 2. 计算语义相似度
-    try:
-        from sentence_transformers import util
-        
-        related = []
-        for item in same_tag_items:
-            item_embedding = None
-            if item.get('embedding'):
-                item_embedding = embedding_manager.load_embedding(item['embedding'])
-            
-            if item_embedding is not None:
-                # 计算余弦相似度
-                score = util.cos_sim(current_embedding, item_embedding).item()
-                related.append((item, score))
-            else:
-                # 如果条目没有 embedding，按标签匹配（相似度设为 0.5）
-                if current_tags & set(item.get('tags', [])):
-                    related.append((item, 0.5))
-        
-        # 3. 按相似度排序
-        related.sort(key=lambda x: x[1], reverse=True)
-        return related[:top_k]
+    # 2. 一次矩阵-向量乘法计算语义相似度
+    related = [(index.items[row], score) for row, score in index.top_k(query, top_k, mask)]
     
-    except ImportError:
-        # 如果无法导入 util，只返回标签匹配的条目
-        return [(item, 1.0) for item in same_tag_items[:top_k]]
+    # 没有 embedding 但标签匹配的条目，相似度设为 0.5
+    if current_tags:
+        for row in np.flatnonzero(mask & ~index.has_embedding):
+            related.append((index.items[row], 0.5))
+    
+    # 3. 按相似度排序
+    related.sort(key=lambda x: x[1], reverse=True)
+    return related[:top_k]
+
+
+def semantic_search(query: str, all_items: List[Dict], embedding_manager: EmbeddingManager,
+                    top_k: int = 50, type_filter: Optional[str] = None,
+                    tag_filter: Optional[str] = None) -> List[Tuple[Dict, float]]:
+    """
+    语义搜索：查询只编码一次，复用内存中的 embedding 矩阵对所有条目排序
+    
+    type_filter / tag_filter 以布尔掩码的形式与得分结合
+    
+    返回: [(item, similarity_score), ...] 按相似度降序排序
+    """
+    if not query.strip():
+        return []
+    
+    index = embedding_manager.get_index(all_items)
+    if len(index) == 0 or index.dim == 0:
+        return []
+    
+    mask = None
+    if type_filter:
+        mask = index.type_mask(type_filter)
+    if tag_filter:
+        tag_mask = index.tag_mask([tag_filter])
+        mask = tag_mask if mask is None else (mask & tag_mask)
+    
+    query_vector = embedding_manager.embed_query(query)
+    if query_vector.shape[0] != index.dim:
+        return []
+    return [(index.items[row], score) for row, score in index.top_k(query_vector, top_k, mask)]
+
+
+def attach_embeddings(db, items: List[Dict]) -> List[Dict]:
+    """
+    为按列表投影读取的条目补充 embedding 字段（原地修改并返回 items）
 
+    只通过 db.get_embeddings 查询缺少 embedding 字段的条目
+    """
+    missing = [item['id'] for item in items if 'embedding' not in item]
+    if missing:
+        embeddings = db.get_embeddings(missing)
+        for item in items:
+            if 'embedding' not in item:
+                item['embedding'] = embeddings.get(item['id'])
+    return items
+
+
+# ==================== 物化的相关条目列表 ====================
+
+# 分块计算邻居列表时每块得分矩阵的元素数上限（float32 约 16 MB）
+NEIGHBOR_BLOCK_ELEMENTS = 1 << 22
+# update_neighbor_lists 估计各条目第 k 名得分下界时使用的采样行数
+NEIGHBOR_SAMPLE_ROWS = 256
+
+
+def _block_size(n: int) -> int:
+    return max(1, NEIGHBOR_BLOCK_ELEMENTS // max(n, 1))
+
+
+def compute_neighbor_lists(index: EmbeddingIndex, rows: List[int],
+                           top_k: int = 5) -> Dict[int, List[Tuple[int, float]]]:
+    """
+    计算 rows 中各条目的相关条目列表：{item_id: [(related_id, score), ...]}
+
+    规则与 get_related_items 相同，但按块计算：每块一次矩阵乘法 M[rows] @ M.T，
+    再按行 argpartition 取 top-k（量化索引取 k * rerank_factor 个候选后用全精度向量重排）
+    """
+    import numpy as np
+
+    n = len(index)
+    lists = {}
+    if n == 0 or top_k <= 0:
+        return lists
+    n_candidates = min(n, top_k * index.rerank_factor if index.quantized else top_k)
+    block = _block_size(n)
+    for start in range(0, len(rows), block):
+        chunk = list(rows[start:start + block])
+        masks = [index.tag_mask(index.items[row].get('tags')) if index.tagged[row] else None
+                 for row in chunk]
+        scores = index.block_scores(chunk) if index.dim else np.zeros((len(chunk), n), dtype=np.float32)
+        scores[:, ~index.has_embedding] = -np.inf
+        for i, (row, mask) in enumerate(zip(chunk, masks)):
+            if mask is not None:
+                scores[i, ~mask] = -np.inf
+            scores[i, row] = -np.inf
+        top = np.argpartition(-scores, n_candidates - 1, axis=1)[:, :n_candidates]
+
+        exact = {}
+        if index.quantized:
+            # 第二轮：一次读取本块查询行与候选行的全精度向量
+            finite = np.isfinite(np.take_along_axis(scores, top, axis=1))
+            wanted = {row for row in chunk if index.has_embedding[row]}
+            wanted.update(int(other) for other in top[finite])
+            exact = index._full_precision(sorted(wanted))
+
+        for i, (row, mask) in enumerate(zip(chunk, masks)):
+            item_id = index.items[row]['id']
+            if not index.has_embedding[row]:
+                # 没有 embedding 时只按标签匹配
+                if mask is None:
+                    lists[item_id] = []
+                else:
+                    lists[item_id] = [(index.items[other]['id'], 1.0)
+                                      for other in np.flatnonzero(mask) if other != row][:top_k]
+                continue
+            candidates = [int(other) for other in top[i] if np.isfinite(scores[i, other])]
+            if index.quantized and row in exact:
+                related = [(other, float(exact[other] @ exact[row]) if other in exact else float(scores[i, other]))
+                           for other in candidates]
+            else:
+                related = [(other, float(scores[i, other])) for other in candidates]
+            # 得分相同时按行号排序，与增量合并的顺序一致
+            related.sort(key=lambda pair: (-pair[1], pair[0]))
+            related = related[:top_k]
+            if mask is not None:
+                # 没有 embedding 但标签匹配的条目，相似度设为 0.5
+                related.extend((int(other), 0.5) for other in np.flatnonzero(mask & ~index.has_embedding)
+                               if other != row)
+                related.sort(key=lambda pair: (-pair[1], pair[0]))
+            lists[item_id] = [(index.items[other]['id'], score) for other, score in related[:top_k]]
+    return lists
+
+
+def rebuild_neighbor_lists(db, all_items: List[Dict], embedding_manager: Optional[EmbeddingManager] = None,
+                           top_k: int = 5, item_ids: Optional[List[int]] = None):
+    """
+    重新计算并保存相关条目列表（按块计算并逐块写入）
+
+    item_ids 为空时重建所有条目的列表
+    """
+    if embedding_manager is None:
+        embedding_manager = EmbeddingManager()
+    index = embedding_manager.get_index(all_items)
+    if item_ids is None:
+        rows = list(range(len(index)))
+    else:
+        rows = [index.row_of[item_id] for item_id in item_ids if item_id in index.row_of]
+    block = _block_size(len(index))
+    for start in range(0, len(rows), block):
+        db.set_related_many(compute_neighbor_lists(index, rows[start:start + block], top_k))
+
+
+def _score_floors(index: EmbeddingIndex, exclude, top_k: int):
+    """
+    每个条目第 k 名相关得分的下界 (n,)
+
+    在至多 NEIGHBOR_SAMPLE_ROWS 个采样行（不含 exclude 中的行）上按相同的筛选规则取第 k 名：
+    完整列表的第 k 名不会低于任何子集上的第 k 名。采样不足 k 行时为 -inf
+    """
+    import numpy as np
+
+    n = len(index)
+    pool = np.flatnonzero(index.has_embedding & ~exclude)
+    if len(pool) < top_k or index.dim == 0:
+        return np.full(n, -np.inf, dtype=np.float32)
+    sample = pool[np.linspace(0, len(pool) - 1, min(len(pool), NEIGHBOR_SAMPLE_ROWS)).astype(np.int64)]
+    sample = np.unique(sample)
+    scores = index.block_scores(sample)
+    for i, row in enumerate(sample):
+        if index.tagged[row]:
+            # 有标签的条目只与同标签条目相关；没有标签的条目与所有条目相关
+            scores[i, ~(index.tag_mask(index.items[row]['tags']) | ~index.tagged)] = -np.inf
+        else:
+            scores[i, index.tagged] = -np.inf
+        scores[i, row] = -np.inf
+    if len(sample) < top_k:
+        return np.full(n, -np.inf, dtype=np.float32)
+    return np.partition(scores, len(sample) - top_k, axis=0)[len(sample) - top_k]
+
+
+def update_neighbor_lists(db, changed_items: List[Dict], all_items: List[Dict],
+                          embedding_manager: Optional[EmbeddingManager] = None, top_k: int = 5):
+    """
+    条目新增或修改后，增量更新物化的相关条目列表
+
+    1. 重新计算被修改条目自己的列表
+    2. 一次矩阵乘法 M[changed] @ M.T 得到被修改条目在其他条目列表中的候选得分，
+       与采样估计的第 k 名得分下界比较，只读取被修改条目可能挤进的列表和原本包含它们的列表
+    3. 这些列表就地合并；被修改条目原在列表中且得分下降（列表外的条目可能超过它）时完整重算
+
+    all_items 必须已包含修改后的条目
+    """
+    import numpy as np
+
+    if embedding_manager is None:
+        embedding_manager = EmbeddingManager()
+    index = embedding_manager.get_index(all_items)
+    changed_rows = sorted({index.row_of[item['id']] for item in changed_items if item['id'] in index.row_of})
+    if not changed_rows:
+        return
+    changed_ids = {index.items[row]['id'] for row in changed_rows}
+    n = len(index)
+    is_changed = np.zeros(n, dtype=bool)
+    is_changed[changed_rows] = True
+
+    # 量化得分有误差，放宽阈值，保证不漏掉需要更新的列表
+    floors = _score_floors(index, is_changed, top_k) - 2 * index.SCORE_TOLERANCE[index.precision]
+    entering: Dict[int, Dict[int, float]] = {}   # 行号 -> {被修改条目 id: 得分}
+    block = _block_size(n)
+    for start in range(0, len(changed_rows), block):
+        chunk = changed_rows[start:start + block]
+        if index.dim:
+            scores = index.block_scores(chunk)
+        else:
+            scores = np.zeros((len(chunk), n), dtype=np.float32)
+        for i, row in enumerate(chunk):
+            # 条目 j 有标签时只接受同标签的条目；j 没有标签时接受所有有 embedding 的条目
+            shares = index.tag_mask(index.items[row].get('tags') or [])
+            if index.has_embedding[row]:
+                scores[i, ~(shares | ~index.tagged) | ~index.has_embedding] = -np.inf
+            else:
+                # 没有 embedding 的条目在同标签列表中的相似度为 0.5
+                scores[i] = np.where(shares & index.has_embedding, 0.5, -np.inf)
+            # 没有 embedding 的条目按标签匹配：同标签的新条目可能补进未满的列表
+            scores[i, shares & ~index.has_embedding] = np.inf
+            scores[i, is_changed] = -np.inf
+        hits = np.nonzero(scores > floors[None, :])
+        for i, other in zip(*hits):
+            entering.setdefault(int(other), {})[index.items[chunk[i]]['id']] = float(scores[i, other])
+
+    candidate_ids = [index.items[row]['id'] for row in entering]
+    lists = db.get_related_lists(item_ids=candidate_ids, referencing=sorted(changed_ids))
+
+    if index.quantized:
+        # 进入列表的得分改用全精度向量计算
+        wanted = set(entering) | {index.row_of[item_id] for item_id in changed_ids}
+        exact = index._full_precision(sorted(wanted))
+        for other, pairs in entering.items():
+            for item_id, score in pairs.items():
+                row = index.row_of[item_id]
+                if np.isfinite(score) and score != 0.5 and other in exact and row in exact:
+                    pairs[item_id] = float(exact[other] @ exact[row])
+
+    dirty = []
+    updated = {}
+    for item_id, old in lists.items():
+        row = index.row_of.get(item_id)
+        if row is None or item_id in changed_ids:
+            continue
+        pairs = entering.get(row, {})
+        if not index.has_embedding[row]:
+            # 按标签匹配的列表（按行号取前 k 个）：包含被修改条目或有同标签的被修改条目时重算
+            if pairs or any(rid in changed_ids for rid, _ in old):
+                dirty.append(item_id)
+            continue
+        dropped = [(rid, score) for rid, score in old if rid in changed_ids]
+        if len(old) >= top_k and any(pairs.get(rid, -np.inf) < score for rid, score in dropped):
+            # 得分下降或不再符合条件后，列表外的条目可能超过它，需要完整重算
+            dirty.append(item_id)
+            continue
+        merged = [(rid, score) for rid, score in old if rid not in changed_ids] + list(pairs.items())
+        merged.sort(key=lambda pair: (-pair[1], index.row_of.get(pair[0], n)))
+        merged = merged[:top_k]
+        if merged != old:
+            updated[item_id] = merged
+
+    recompute = [index.row_of[item_id] for item_id in changed_ids] + [index.row_of[item_id] for item_id in dirty]
+    updated.update(compute_neighbor_lists(index, recompute, top_k))
+    db.set_related_many(updated)
+
+
+def remove_from_neighbor_lists(db, item_id: int, all_items: List[Dict],
+                               embedding_manager: Optional[EmbeddingManager] = None, top_k: int = 5):
+    """
+    条目删除后，删除它自己的列表，并重算引用了它的列表
+
+    all_items 应为删除后的条目列表
+    """
+    referencing = db.delete_related(item_id)
+    if referencing:
+        rebuild_neighbor_lists(db, all_items, embedding_manager, top_k, item_ids=referencing)
+
+
+def apply_neighbor_updates(db, embedding_manager: Optional[EmbeddingManager], all_items: List[Dict],
+                           changed_ids: Optional[List[int]] = None, stale_ids: Optional[List[int]] = None):
+    """
+    写入后更新物化的相关条目列表
+
+    changed_ids: 新增或修改的条目，增量更新（超过一半时全部重算）
+    stale_ids: 引用了已删除条目的列表（delete_item 的返回值），重算这些列表
+    """
+    changed = set(changed_ids or ())
+    if changed and len(changed) > len(all_items) // 2:
+        # 大批量导入时直接全部重算
+        rebuild_neighbor_lists(db, all_items, embedding_manager)
+        return
+    stale = sorted(set(stale_ids or ()) - changed)
+    if stale:
+        rebuild_neighbor_lists(db, all_items, embedding_manager, item_ids=stale)
+    if changed:
+        changed_items = [item for item in all_items if item['id'] in changed]
+        update_neighbor_lists(db, changed_items, all_items, embedding_manager)
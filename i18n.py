@@ -71,6 +71,16 @@ TEXTS = {
         "English": "Sentences",
         "Deutsch": "Sätze"
     },
+    "metric_reviewed_today": {
+        "中文": "今日已复习",
+        "English": "Reviewed Today",
+        "Deutsch": "Heute wiederholt"
+    },
+    "metric_never_reviewed": {
+        "中文": "从未复习",
+        "English": "Never Reviewed",
+        "Deutsch": "Nie wiederholt"
+    },
     "recent_added": {
         "中文": "📝 最近添加",
         "English": "📝 Recently Added",
@@ -253,6 +263,11 @@ TEXTS = {
         "English": "✅ Successfully imported {count} records!",
         "Deutsch": "✅ {count} Datensätze erfolgreich importiert!"
     },
+    "warning_import_failures": {
+        "中文": "⚠️ {count} 条记录导入失败：",
+        "English": "⚠️ {count} records failed to import:",
+        "Deutsch": "⚠️ {count} Datensätze konnten nicht importiert werden:"
+    },
     "warning_empty_text": {
         "中文": "请输入文本内容",
         "English": "Please enter text content",
@@ -280,6 +295,26 @@ TEXTS = {
         "English": "🔍 Search & Manage",
         "Deutsch": "🔍 Suchen & Verwalten"
     },
+    "label_search_mode": {
+        "中文": "搜索模式",
+        "English": "Search Mode",
+        "Deutsch": "Suchmodus"
+    },
+    "search_mode_keyword": {
+        "中文": "关键词",
+        "English": "Keyword",
+        "Deutsch": "Stichwort"
+    },
+    "search_mode_semantic": {
+        "中文": "语义",
+        "English": "Semantic",
+        "Deutsch": "Semantisch"
+    },
+    "semantic_search_failed": {
+        "中文": "语义搜索失败，已改用关键词搜索:",
+        "English": "Semantic search failed, falling back to keyword search:",
+        "Deutsch": "Semantische Suche fehlgeschlagen, Stichwortsuche wird verwendet:"
+    },
     "label_search_keyword": {
         "中文": "🔍 搜索关键词",
         "English": "🔍 Search Keyword",
@@ -310,6 +345,21 @@ TEXTS = {
         "English": "Found {count} results",
         "Deutsch": "{count} Ergebnisse gefunden"
     },
+    "label_page": {
+        "中文": "第 {page} 页",
+        "English": "Page {page}",
+        "Deutsch": "Seite {page}"
+    },
+    "button_prev_page": {
+        "中文": "⬅️ 上一页",
+        "English": "⬅️ Previous",
+        "Deutsch": "⬅️ Zurück"
+    },
+    "button_next_page": {
+        "中文": "下一页 ➡️",
+        "English": "Next ➡️",
+        "Deutsch": "Weiter ➡️"
+    },
     "label_created_at": {
         "中文": "创建时间:",
         "English": "Created At:",
@@ -365,6 +415,11 @@ TEXTS = {
         "English": "No related items",
         "Deutsch": "Keine verwandten Einträge"
     },
+    "warning_neighbor_refresh_failed": {
+        "中文": "更新相关条目列表失败：",
+        "English": "Failed to update related item lists:",
+        "Deutsch": "Aktualisierung der verwandten Einträge fehlgeschlagen:"
+    },
     "get_related_failed": {
         "中文": "获取相关条目失败:",
         "English": "Failed to get related items:",
@@ -407,6 +462,11 @@ TEXTS = {
         "English": "Tag Filter (Optional)",
         "Deutsch": "Tag-Filter (Optional)"
     },
+    "label_prefer_less_reviewed": {
+        "中文": "优先复习复习次数少的条目",
+        "English": "Prefer less-reviewed items",
+        "Deutsch": "Seltener wiederholte Einträge bevorzugen"
+    },
     "button_random": {
         "中文": "🎲 随机抽题",
         "English": "🎲 Random Question",
@@ -614,6 +674,61 @@ TEXTS = {
         "English": "Not Initialized",
         "Deutsch": "Nicht initialisiert"
     },
+    "label_model_memory": {
+        "中文": "共享模型内存:",
+        "English": "Shared Model Memory:",
+        "Deutsch": "Speicher der gemeinsamen Modelle:"
+    },
+    "label_index_precision": {
+        "中文": "相似度索引精度",
+        "English": "Similarity Index Precision",
+        "Deutsch": "Genauigkeit des Ähnlichkeitsindex"
+    },
+    "help_index_precision": {
+        "中文": "float16 / int8 将内存中的相似度矩阵缩小为 1/2 / 1/4，候选会用全精度向量重新排序",
+        "English": "float16 / int8 shrink the in-memory similarity matrix to 1/2 / 1/4; candidates are re-ranked with full-precision vectors",
+        "Deutsch": "float16 / int8 verkleinern die Ähnlichkeitsmatrix im Speicher auf 1/2 / 1/4; Kandidaten werden mit voller Genauigkeit neu sortiert"
+    },
+    "label_db_cache": {
+        "中文": "数据库缓存：{entries} 条，命中率 {hit_rate:.1f}%",
+        "English": "Database cache: {entries} entries, hit rate {hit_rate:.1f}%",
+        "Deutsch": "Datenbank-Cache: {entries} Einträge, Trefferquote {hit_rate:.1f}%"
+    },
+    "label_db_payload": {
+        "中文": "数据库读取：{requests} 次请求，共 {mb:.2f} MB",
+        "English": "Database reads: {requests} requests, {mb:.2f} MB total",
+        "Deutsch": "Datenbank-Lesezugriffe: {requests} Anfragen, insgesamt {mb:.2f} MB"
+    },
+    "label_export_embeddings": {
+        "中文": "CSV 中包含 embedding（base64）",
+        "English": "Include embeddings in the CSV (base64)",
+        "Deutsch": "Embeddings in die CSV aufnehmen (Base64)"
+    },
+    "label_sync_status": {
+        "中文": "离线模式：上次与 Supabase 同步于 {time}",
+        "English": "Offline mode: last synced with Supabase at {time}",
+        "Deutsch": "Offline-Modus: zuletzt mit Supabase synchronisiert um {time}"
+    },
+    "warning_sync_failed": {
+        "中文": "同步失败，将稍后重试：",
+        "English": "Sync failed, will retry later:",
+        "Deutsch": "Synchronisierung fehlgeschlagen, neuer Versuch folgt:"
+    },
+    "button_sync_now": {
+        "中文": "立即同步",
+        "English": "Sync now",
+        "Deutsch": "Jetzt synchronisieren"
+    },
+    "label_startup_timings": {
+        "中文": "启动阶段耗时:",
+        "English": "Startup Phase Timings:",
+        "Deutsch": "Dauer der Startphasen:"
+    },
+    "models_loading": {
+        "中文": "⏳ 模型加载中…",
+        "English": "⏳ Model loading…",
+        "Deutsch": "⏳ Modell wird geladen…"
+    },
     
     # 错误和信息消息
     "nlp_init_failed": {
@@ -0,0 +1,61 @@
+"""
+Embedding 迁移脚本 - 将旧版 pickle 格式的 embedding 重写为带版本头的二进制格式
+
+用法：
+    python migrate_embeddings.py --backend sqlite --db german_learning.db
+    python migrate_embeddings.py --backend supabase --dtype float16
+"""
+import base64
+from typing import Tuple
+
+from embedding_utils import EmbeddingManager, is_encoded_embedding
+
+
+def migrate_embeddings(db, embedding_manager: EmbeddingManager) -> Tuple[int, int, int]:
+    """
+    重写数据库中所有非当前格式的 embedding
+
+    返回: (迁移数量, 跳过数量, 失败数量)
+    """
+    migrated, skipped, failed = 0, 0, 0
+    for item in db.iter_items(columns=('id', 'embedding')):
+        blob = item.get('embedding')
+        if not blob:
+            continue
+        raw = base64.b64decode(blob) if isinstance(blob, str) else blob
+        if is_encoded_embedding(raw):
+            skipped += 1
+            continue
+
+        embedding = embedding_manager.load_embedding(raw)
+        if embedding is None:
+            failed += 1
+            continue
+        db.update_item(item['id'], embedding=embedding_manager.save_embedding(embedding))
+        migrated += 1
+    return migrated, skipped, failed
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="迁移 embedding 存储格式")
+    parser.add_argument("--backend", choices=["sqlite", "supabase"], default="sqlite")
+    parser.add_argument("--db", default="german_learning.db", help="SQLite 数据库路径")
+    parser.add_argument("--dtype", choices=["float32", "float16", "int8"], default="float32")
+    args = parser.parse_args()
+
+    if args.backend == "sqlite":
+        from database import Database
+        db = Database(args.db)
+    else:
+        from database_supabase import SupabaseDB
+        db = SupabaseDB()
+
+    migrated, skipped, failed = migrate_embeddings(db, EmbeddingManager(storage_dtype=args.dtype))
+    db.close()
+    print(f"✅ 迁移完成: {migrated} 条已重写, {skipped} 条已是新格式, {failed} 条无法解码")
+
+
+if __name__ == "__main__":
+    main()
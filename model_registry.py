@@ -0,0 +1,220 @@
+"""
+模型注册表 - 在进程级别共享 NLP 解析器和 Embedding 管理器
+
+Streamlit 的每个浏览器会话都有独立的 session_state，如果在其中各自创建模型，
+十个用户就会有十份 spaCy 和 MiniLM。注册表保证每个模型在进程内只加载一次，
+并在所有会话之间线程安全地共享。
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+NLP_PARSER = "nlp_parser"
+EMBEDDING_MANAGER = "embedding_manager"
+EMBEDDING_MODEL = "embedding_model"
+
+# 模型状态
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+_models: Dict[str, object] = {}
+_errors: Dict[str, Exception] = {}
+_memory: Dict[str, int] = {}
+_status: Dict[str, str] = {NLP_PARSER: PENDING, EMBEDDING_MANAGER: PENDING, EMBEDDING_MODEL: PENDING}
+_timings: Dict[str, float] = {}
+_warmup_thread: Optional[threading.Thread] = None
+_warmup_lock = threading.Lock()
+_warmup_done = threading.Event()
+_locks = {
+    NLP_PARSER: threading.Lock(),
+    EMBEDDING_MANAGER: threading.Lock(),
+}
+
+
+def _rss_bytes() -> Optional[int]:
+    """返回当前进程的常驻内存（字节），无法获取时返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _get_or_load(name: str, loader):
+    """加载一次并缓存；加载失败时缓存异常，后续调用直接抛出"""
+    if name in _models:
+        return _models[name]
+    with _locks[name]:
+        if name in _models:
+            return _models[name]
+        if name in _errors:
+            raise _errors[name]
+        if name in _status:
+            _status[name] = LOADING
+        before = _rss_bytes()
+        try:
+            model = loader()
+        except Exception as e:
+            _errors[name] = e
+            if name in _status:
+                _status[name] = FAILED
+            raise
+        after = _rss_bytes()
+        if before is not None and after is not None:
+            _memory[name] = max(after - before, 0)
+        _models[name] = model
+        if name in _status:
+            _status[name] = READY
+        return model
+
+
+def get_nlp_parser():
+    """获取共享的 NLPParser（spaCy de_core_news_sm）"""
+    from nlp_parser import NLPParser
+    return _get_or_load(NLP_PARSER, NLPParser)
+
+
+def get_embedding_manager():
+    """
+    获取共享的 EmbeddingManager（模型本身仍在首次使用时加载）
+
+    相似度索引精度取自环境变量 DEUTSCHNEST_INDEX_PRECISION（float32/float16/int8），也可在设置页修改
+    """
+    from embedding_utils import EmbeddingManager
+    from embedding_cache import EmbeddingCache
+    precision = os.getenv("DEUTSCHNEST_INDEX_PRECISION", "float32")
+    return _get_or_load(EMBEDDING_MANAGER,
+                        lambda: EmbeddingManager(index_precision=precision, cache=EmbeddingCache()))
+
+
+def _embedding_model_bytes(manager) -> int:
+    """统计已加载的 SentenceTransformer 参数与缓冲区占用的字节数"""
+    model = getattr(manager, "model", None)
+    if model is None:
+        return 0
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def memory_report() -> Dict[str, int]:
+    """
+    返回注册表持有的内存估算（字节）
+
+    spaCy 按加载前后的常驻内存差值估算；MiniLM 按张量大小统计；
+    另外包含 EmbeddingManager 中相似度矩阵的大小
+    """
+    report = {}
+    if NLP_PARSER in _models:
+        report[NLP_PARSER] = _memory.get(NLP_PARSER, 0)
+    manager = _models.get(EMBEDDING_MANAGER)
+    if manager is not None:
+        report[EMBEDDING_MANAGER] = _embedding_model_bytes(manager)
+        index = getattr(manager, "_index", None)
+        if index is not None and index.matrix is not None:
+            report["similarity_index"] = int(index.matrix.nbytes)
+    report["total"] = sum(report.values())
+    return report
+
+
+def loaded_models():
+    """返回已加载的模型名称列表"""
+    return list(_models)
+
+
+# ==================== 后台预热 ====================
+
+def _timed(phase: str, func):
+    """执行 func 并记录该启动阶段的耗时（秒）"""
+    start = time.perf_counter()
+    try:
+        return func()
+    finally:
+        _timings[phase] = time.perf_counter() - start
+
+
+def _load_embedding_model():
+    """在当前线程中加载 SentenceTransformer 并更新状态"""
+    _status[EMBEDDING_MODEL] = LOADING
+    try:
+        manager = _timed("create_embedding_manager", get_embedding_manager)
+        _timed("import_torch", lambda: __import__("torch"))
+        _timed("load_embedding_model", manager.get_model)
+    except Exception as e:
+        _errors[EMBEDDING_MODEL] = e
+        _status[EMBEDDING_MODEL] = FAILED
+        return
+    _status[EMBEDDING_MODEL] = READY
+
+
+def _load_nlp_parser():
+    """在当前线程中加载 spaCy 模型并更新状态"""
+    _status[NLP_PARSER] = LOADING
+    try:
+        _timed("import_spacy", lambda: __import__("spacy"))
+        _timed("load_spacy_model", get_nlp_parser)
+    except Exception as e:
+        # 错误记录在注册表中，由页面显示
+        _errors.setdefault(NLP_PARSER, e)
+        _status[NLP_PARSER] = FAILED
+
+
+def _warmup():
+    try:
+        _load_nlp_parser()
+        _load_embedding_model()
+    finally:
+        _warmup_done.set()
+
+
+def start_warmup():
+    """
+    在后台线程中开始加载 spaCy 和 MiniLM（重复调用无副作用）
+
+    页面可以立即渲染，通过 status() 判断模型是否就绪
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(target=_warmup, name="model-warmup", daemon=True)
+        _warmup_thread.start()
+
+
+def status(name: str) -> str:
+    """返回模型状态：pending / loading / ready / failed"""
+    if name == EMBEDDING_MODEL and _status[name] != READY:
+        manager = _models.get(EMBEDDING_MANAGER)
+        if manager is not None and getattr(manager, "model", None) is not None:
+            _status[name] = READY
+    return _status.get(name, PENDING)
+
+
+def is_ready(name: str) -> bool:
+    return status(name) == READY
+
+
+def is_loading() -> bool:
+    """是否还有模型在等待或加载中"""
+    return any(status(name) in (PENDING, LOADING) for name in _status)
+
+
+def error(name: str) -> Optional[Exception]:
+    """返回模型加载失败的异常（如果有）"""
+    return _errors.get(name)
+
+
+def wait_ready(timeout: Optional[float] = None) -> bool:
+    """阻塞等待预热结束，返回是否在超时前完成"""
+    start_warmup()
+    return _warmup_done.wait(timeout)
+
+
+def startup_timings() -> Dict[str, float]:
+    """返回各启动阶段的耗时（秒）"""
+    return dict(_timings)
@@ -0,0 +1,115 @@
+"""
+复习记录写回队列 - 复习标记先写入内存队列，由后台线程批量写入数据库
+
+Streamlit 每次交互都会重新运行脚本，队列保存在模块级注册表中（每个数据库对象一个），
+因此在重新运行之间保留；进程退出时通过 atexit 写回剩余的记录。
+数据库需要提供 update_reviews({item_id: (次数增量, 最后复习时间)})。
+"""
+import atexit
+import datetime
+import threading
+from typing import Dict, Optional, Tuple
+
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_MAX_BATCH = 100
+
+
+class ReviewQueue:
+    """
+    mark() 只在内存中累加，不访问数据库；后台线程每 flush_interval 秒，
+    或待写入的条目达到 max_batch 时，调用一次 update_reviews 批量写入。
+    写入失败时记录保留在队列中，下次重试。
+    """
+    def __init__(self, db, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_batch: int = DEFAULT_MAX_BATCH):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.flushed = 0
+        self.last_error: Optional[Exception] = None
+        self._pending: Dict[int, Tuple[int, str]] = {}
+        self._lock = threading.Lock()
+        # 同一时间只有一个线程在写入，避免同一批记录被写两次
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="review-queue", daemon=True)
+        self._thread.start()
+
+    def mark(self, item_id: int, reviewed_at: Optional[str] = None):
+        """记录一次复习（立即返回）"""
+        reviewed_at = reviewed_at or datetime.datetime.now().isoformat()
+        with self._lock:
+            count, _ = self._pending.get(item_id, (0, None))
+            self._pending[item_id] = (count + 1, reviewed_at)
+            if len(self._pending) >= self.max_batch:
+                self._wakeup.set()
+
+    def pending(self) -> int:
+        """等待写入的条目数"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """把队列中的记录写入数据库，返回写入的条目数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self.db.update_reviews(batch)
+            except Exception as e:
+                self.last_error = e
+                # 放回队列，与期间新增的记录合并
+                with self._lock:
+                    for item_id, (count, reviewed_at) in batch.items():
+                        newer_count, newer_at = self._pending.get(item_id, (0, None))
+                        self._pending[item_id] = (count + newer_count, newer_at or reviewed_at)
+                return 0
+            self.flushed += len(batch)
+            return len(batch)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """停止后台线程并写入剩余的记录"""
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+_queues: Dict[int, ReviewQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_review_queue(db) -> ReviewQueue:
+    """获取数据库对象对应的队列（进程内共享，首次调用时创建）"""
+    with _queues_lock:
+        queue = _queues.get(id(db))
+        if queue is None:
+            queue = ReviewQueue(db)
+            _queues[id(db)] = queue
+        return queue
+
+
+def flush_all():
+    """写入所有队列中的记录"""
+    with _queues_lock:
+        queues = list(_queues.values())
+    for queue in queues:
+        queue.flush()
+
+
+@atexit.register
+def _close_all():
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for queue in queues:
+        queue.close()
@@ -0,0 +1,159 @@
+"""
+随机抽样模块 - 复习选卡使用的抽样算法，与存储后端无关
+
+- uniform_id_sample: 均匀抽取不重复的 id，id 较密时随机探测（落在间隙上的探测被拒绝），
+  否则按排名（OFFSET）读取，代价与 limit 成正比，不受 id 聚集的影响
+- rejection_weighted_sample: 加权抽样，均匀抽候选并按 权重/权重上界 接受，
+  探测次数与集合大小无关
+- bucket_weighted_sample: 元素按权重分桶（例如按复习次数）时的精确加权抽样，只需要每个桶的
+  元素数，每个样本一次按排名读取
+- weighted_reservoir_sample: 加权水塘抽样（Efraimidis-Spirakis A-Res），
+  单次遍历 (key, 权重) 流，只保留 k 个候选，不需要排序整个集合
+"""
+import heapq
+import random
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# id 的密度（元素数 / id 范围）不低于该值时先随机探测，否则直接按排名读取
+PROBE_MIN_DENSITY = 0.25
+
+
+def review_weight(review_count: Optional[int]) -> float:
+    """复习权重：复习次数越少越容易被抽到"""
+    return 1.0 / (1 + (review_count or 0))
+
+
+def weighted_reservoir_sample(stream: Iterable[Tuple[Hashable, float]], k: int,
+                              rng: Optional[random.Random] = None) -> List[Hashable]:
+    """
+    从 (key, weight) 流中不放回地抽取 k 个 key，被抽中的概率与权重成正比
+
+    每个元素的排序键为 u^(1/w)（u 为 (0,1) 均匀随机数），保留排序键最大的 k 个；
+    权重不大于 0 的元素不会被抽中。返回顺序随机。
+    """
+    if k <= 0:
+        return []
+    rng = rng or random
+    heap: List[Tuple[float, int, Hashable]] = []
+    for position, (key, weight) in enumerate(stream):
+        if weight <= 0:
+            continue
+        # 1 - random() 落在 (0, 1]，避免 0 ** x
+        score = (1.0 - rng.random()) ** (1.0 / weight)
+        entry = (score, position, key)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+    sample = [key for _, _, key in heap]
+    rng.shuffle(sample)
+    return sample
+
+
+def _unused_rank(n: int, used: Set[int], rng) -> int:
+    """在 [0, n) 中均匀选一个不在 used 中的排名（调用方保证还有剩余）"""
+    if 2 * len(used) >= n:
+        return rng.choice([rank for rank in range(n) if rank not in used])
+    rank = rng.randrange(n)
+    while rank in used:
+        rank = rng.randrange(n)
+    return rank
+
+
+def uniform_id_sample(k: int, count: int, low: Optional[int], high: Optional[int],
+                      contains: Callable[[int], bool], at_rank: Callable[[int], Optional[int]],
+                      rng: Optional[random.Random] = None) -> List[int]:
+    """
+    从 count 个 id（范围 [low, high]）中均匀地不放回抽取 min(k, count) 个
+
+    contains(x) 判断 x 是否在集合中，at_rank(r) 返回按 id 排序的第 r 个 id（并发删除时可能为 None）。
+    id 较密时在范围内随机探测，只接受正好命中的探测（拒绝落在间隙上的），所以 id 聚集成几段时
+    每个 id 的概率仍然相同；探测次数用完或 id 稀疏时按随机排名补足
+    """
+    if k <= 0 or not count or low is None or high is None:
+        return []
+    rng = rng or random
+    k = min(k, count)
+    found: List[int] = []
+    seen: Set[int] = set()
+    span = high - low + 1
+    if count / span >= PROBE_MIN_DENSITY:
+        # 每次探测命中的概率为 count / span
+        for _ in range(int(4 * k * span / count) + 16):
+            item_id = rng.randint(low, high)
+            if item_id in seen or not contains(item_id):
+                continue
+            seen.add(item_id)
+            found.append(item_id)
+            if len(found) >= k:
+                return found
+    # 已找到的 id 各占一个排名，多取这么多个排名就一定够用
+    for rank in rng.sample(range(count), min(count, k + len(found))):
+        item_id = at_rank(rank)
+        if item_id is None or item_id in seen:
+            continue
+        seen.add(item_id)
+        found.append(item_id)
+        if len(found) >= k:
+            break
+    return found
+
+
+def rejection_weighted_sample(k: int, draw: Callable[[], Optional[Hashable]],
+                              weight_of: Callable[[Hashable], float], max_weight: float,
+                              rng: Optional[random.Random] = None,
+                              max_attempts: Optional[int] = None) -> List[Hashable]:
+    """
+    不放回地抽取最多 k 个元素，被抽中的概率与权重成正比（拒绝抽样）
+
+    draw() 均匀地返回集合中的一个元素（可以重复，可以为 None），weight_of(key) 返回权重，
+    max_weight 为权重上界。候选以 weight / max_weight 的概率被接受，已接受的候选再次抽到时跳过，
+    与逐个按权重不放回抽样的分布相同。期望探测次数约为 k × max_weight / 平均权重，
+    与集合大小无关；max_attempts 次后返回已抽到的元素
+    """
+    if k <= 0 or max_weight <= 0:
+        return []
+    rng = rng or random
+    if max_attempts is None:
+        max_attempts = 64 * k + 64
+    sample = []
+    taken = set()
+    for _ in range(max_attempts):
+        key = draw()
+        if key is None or key in taken:
+            continue
+        if rng.random() * max_weight < weight_of(key):
+            taken.add(key)
+            sample.append(key)
+            if len(sample) >= k:
+                break
+    return sample
+
+
+def bucket_weighted_sample(k: int, buckets: Dict[Hashable, Tuple[int, float]],
+                           pick: Callable[[Hashable, int], Optional[Hashable]],
+                           rng: Optional[random.Random] = None) -> List[Hashable]:
+    """
+    不放回地抽取 k 个元素，被抽中的概率与权重成正比；同一个桶内的元素权重相同
+
+    buckets: {桶: (元素数, 每个元素的权重)}；pick(桶, 排名) 返回桶内第 r 个元素（可能为 None）。
+    每次按 剩余元素数 × 权重 选桶，再在桶内均匀选一个未抽过的排名，与逐个按权重不放回抽样
+    （weighted_reservoir_sample）的分布相同，但只需要 k 次 pick，不需要遍历所有元素
+    """
+    rng = rng or random
+    remaining = {bucket: n for bucket, (n, weight) in buckets.items() if n > 0 and weight > 0}
+    used: Dict[Hashable, Set[int]] = {}
+    sample = []
+    while len(sample) < k and remaining:
+        keys = list(remaining)
+        bucket = rng.choices(keys, weights=[remaining[key] * buckets[key][1] for key in keys])[0]
+        ranks = used.setdefault(bucket, set())
+        rank = _unused_rank(buckets[bucket][0], ranks, rng)
+        ranks.add(rank)
+        remaining[bucket] -= 1
+        if not remaining[bucket]:
+            del remaining[bucket]
+        key = pick(bucket, rank)
+        if key is not None:
+            sample.append(key)
+    return sample
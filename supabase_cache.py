@@ -0,0 +1,353 @@
+"""
+Read-through cache over SupabaseDB
+
+CachedSupabaseDB has the same interface as SupabaseDB. Read results are
+kept in an in-process LRU cache bounded by entry count and TTL (embeddings
+by total size), so page
+navigation and Streamlit reruns are served from memory instead of the
+network. Writes made through the wrapper invalidate exactly the cached
+results they can affect:
+
+- results that contain a written item id (get_item, lists that include it)
+- result groups whose membership or aggregates change (e.g. adding an item
+  invalidates searches, listings, tag counts and stats, but not get_item)
+
+Writes made by other processes become visible after at most `ttl` seconds.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from database import DEFAULT_PAGE_SIZE
+
+DEFAULT_TTL = 60.0
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_EMBEDDING_BYTES = 64 * 1024 * 1024
+
+# Invalidation groups
+MEMBERSHIP = "membership"   # which items a listing/search returns and their order
+TAGS = "tags"               # list_tags counts
+STATS = "stats"             # get_stats aggregates
+RELATED = "related"         # materialized neighbour lists
+
+# Fields whose change can move an item in or out of a search result
+_FILTERED_FIELDS = {"type", "content", "translation", "tags"}
+
+
+def _freeze(value):
+    """Turn call arguments into a hashable cache key"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _copy(value):
+    """
+    Copy the result's structure so callers can reorder lists and set keys on
+    items without touching the cache. Dicts are copied one level: values
+    inside an item (tags, lemma, examples, embedding) and nested aggregates
+    are shared with the cache and must not be modified in place
+    """
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def _embedding_size(embedding) -> int:
+    """Memory held by a cached embedding (base64 text or bytes)"""
+    return sys.getsizeof(embedding)
+
+
+def _item_ids(items: Iterable) -> FrozenSet[int]:
+    """Ids of the items in a result: a list of items or of (item, score) pairs"""
+    ids = set()
+    for entry in items:
+        item = entry[0] if isinstance(entry, tuple) else entry
+        if isinstance(item, dict) and item.get("id") is not None:
+            ids.add(item["id"])
+    return frozenset(ids)
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "ids", "groups")
+
+    def __init__(self, value, expires_at: float, ids: FrozenSet[int], groups: FrozenSet[str]):
+        self.value = value
+        self.expires_at = expires_at
+        self.ids = ids
+        self.groups = groups
+
+
+class CachedSupabaseDB:
+    def __init__(self, db, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_embedding_bytes: int = DEFAULT_MAX_EMBEDDING_BYTES):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_embedding_bytes = max_embedding_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        # Embeddings are cached per id: {item_id: (expires_at, embedding)}, at
+        # most max_embedding_bytes in total
+        self._embeddings: "OrderedDict[int, tuple]" = OrderedDict()
+        self._embedding_bytes = 0
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so in-flight loads don't store stale results
+        self._generation = 0
+
+    def __getattr__(self, name):
+        # Anything not wrapped here (get_random_items, export_to_csv, ...) goes straight through
+        return getattr(self.db, name)
+
+    # ----------------------
+    # Cache mechanics
+    # ----------------------
+    def _cached(self, key: tuple, loader: Callable, ids_of: Callable = _item_ids,
+                groups: Sequence[str] = ()):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy(entry.value)
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        entry = _Entry(value, now + self.ttl, frozenset(ids_of(value)), frozenset(groups))
+        with self._lock:
+            if generation != self._generation:
+                # A write landed while loading; the value may already be stale
+                return _copy(value)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return _copy(value)
+
+    def invalidate(self, ids: Iterable[int] = (), groups: Iterable[str] = ()):
+        """Drop cached results that contain any of `ids` or belong to any of `groups`"""
+        ids, groups = set(ids), set(groups)
+        with self._lock:
+            self._generation += 1
+            stale = [
+                key for key, entry in self._entries.items()
+                if (ids and not ids.isdisjoint(entry.ids)) or (groups and not groups.isdisjoint(entry.groups))
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def _drop_embedding(self, item_id: int):
+        """Remove one cached embedding (caller holds the lock)"""
+        cached = self._embeddings.pop(item_id, None)
+        if cached is not None:
+            self._embedding_bytes -= _embedding_size(cached[1])
+
+    def _invalidate_embeddings(self, ids: Iterable[int]):
+        with self._lock:
+            self._generation += 1
+            for item_id in ids:
+                self._drop_embedding(item_id)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._embeddings.clear()
+            self._embedding_bytes = 0
+
+    def cache_stats(self) -> Dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = len(self._entries)
+            embeddings = len(self._embeddings)
+            embedding_bytes = self._embedding_bytes
+        return {
+            "entries": entries,
+            "embeddings": embeddings,
+            "embedding_bytes": embedding_bytes,
+            "max_embedding_bytes": self.max_embedding_bytes,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    # ----------------------
+    # Cached reads
+    # ----------------------
+    def get_item(self, item_id: int, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        return self._cached(
+            ("get_item", item_id, _freeze(columns)),
+            lambda: self.db.get_item(item_id, columns=columns),
+            ids_of=lambda _: {item_id},
+        )
+
+    def get_all_items(self, columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        return self._cached(
+            ("get_all_items", _freeze(columns)),
+            lambda: self.db.get_all_items(columns=columns),
+            groups=(MEMBERSHIP,),
+        )
+
+    def search_items(self, keyword: str = "", type_filter: str = None, tag_filter: str = None,
+                     columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        return self._cached(
+            ("search_items", keyword, type_filter, tag_filter, _freeze(columns)),
+            lambda: self.db.search_items(keyword, type_filter, tag_filter, columns=columns),
+            groups=(MEMBERSHIP,),
+        )
+
+    def search_items_page(self, keyword: str = "", type_filter: str = None, tag_filter: str = None,
+                          page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[str, int]] = None,
+                          columns: Optional[Sequence[str]] = None):
+        return self._cached(
+            ("search_items_page", keyword, type_filter, tag_filter, page_size, _freeze(cursor), _freeze(columns)),
+            lambda: self.db.search_items_page(keyword, type_filter, tag_filter, page_size=page_size,
+                                              cursor=cursor, columns=columns),
+            ids_of=lambda page: _item_ids(page[0]),
+            groups=(MEMBERSHIP,),
+        )
+
+    def get_items_page(self, page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[Tuple[str, int]] = None,
+                       columns: Optional[Sequence[str]] = None):
+        return self.search_items_page(page_size=page_size, cursor=cursor, columns=columns)
+
+    def list_tags(self) -> List[Tuple[str, int]]:
+        return self._cached(("list_tags",), self.db.list_tags, ids_of=lambda _: (), groups=(TAGS,))
+
+    def get_stats(self) -> Dict:
+        return self._cached(("get_stats",), self.db.get_stats, ids_of=lambda _: (), groups=(STATS,))
+
+    def get_related(self, item_id: int,
+                    columns: Optional[Sequence[str]] = None) -> Optional[List[Tuple[Dict, float]]]:
+        return self._cached(
+            ("get_related", item_id, _freeze(columns)),
+            lambda: self.db.get_related(item_id, columns=columns),
+            ids_of=lambda related: _item_ids(related or ()) | {item_id},
+        )
+
+    def get_related_lists(self, item_ids: Optional[Sequence[int]] = None,
+                          referencing: Optional[Sequence[int]] = None) -> Dict[int, List[Tuple[int, float]]]:
+        return self._cached(("get_related_lists", _freeze(item_ids), _freeze(referencing)),
+                            lambda: self.db.get_related_lists(item_ids, referencing),
+                            ids_of=lambda _: (), groups=(RELATED,))
+
+    def get_embeddings(self, item_ids: Sequence[int], *args, **kwargs) -> Dict[int, Optional[str]]:
+        """Only ids that are not cached (or have expired) are fetched"""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for item_id in item_ids:
+                cached = self._embeddings.get(item_id)
+                if cached is not None and cached[0] > now:
+                    self._embeddings.move_to_end(item_id)
+                    found[item_id] = cached[1]
+                else:
+                    missing.append(item_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+            generation = self._generation
+        if missing:
+            fetched = self.db.get_embeddings(missing, *args, **kwargs)
+            found.update(fetched)
+            with self._lock:
+                if generation == self._generation:
+                    for item_id, embedding in fetched.items():
+                        self._drop_embedding(item_id)
+                        self._embeddings[item_id] = (now + self.ttl, embedding)
+                        self._embedding_bytes += _embedding_size(embedding)
+                    while self._embedding_bytes > self.max_embedding_bytes:
+                        _, (_, evicted) = self._embeddings.popitem(last=False)
+                        self._embedding_bytes -= _embedding_size(evicted)
+                        self.evictions += 1
+        return found
+
+    # ----------------------
+    # Writes (invalidate after the write succeeds)
+    # ----------------------
+    def add_item(self, *args, **kwargs) -> int:
+        item_id = self.db.add_item(*args, **kwargs)
+        self.invalidate(groups=(MEMBERSHIP, TAGS, STATS))
+        return item_id
+
+    def add_items(self, items: List[Dict], *args, **kwargs):
+        result = self.db.add_items(items, *args, **kwargs)
+        self.invalidate(groups=(MEMBERSHIP, TAGS, STATS))
+        return result
+
+    def update_item(self, item_id: int, **kwargs):
+        self.db.update_item(item_id, **kwargs)
+        if "embedding" in kwargs:
+            self._invalidate_embeddings((item_id,))
+        groups = []
+        if _FILTERED_FIELDS & set(kwargs):
+            groups.append(MEMBERSHIP)
+        if "tags" in kwargs:
+            groups.append(TAGS)
+        if {"type", "tags"} & set(kwargs):
+            groups.append(STATS)
+        self.invalidate(ids=(item_id,), groups=groups)
+
+    def delete_item(self, item_id: int) -> List[int]:
+        referencing = self.db.delete_item(item_id)
+        self._invalidate_embeddings((item_id,))
+        self.invalidate(ids=(item_id,), groups=(MEMBERSHIP, TAGS, STATS, RELATED))
+        return referencing
+
+    def update_review(self, item_id: int):
+        self.db.update_review(item_id)
+        self.invalidate(ids=(item_id,), groups=(STATS,))
+
+    def update_reviews(self, reviews: Dict[int, Tuple[int, str]]):
+        self.db.update_reviews(reviews)
+        self.invalidate(ids=reviews, groups=(STATS,))
+
+    def set_related_many(self, lists: Dict[int, List[Tuple[int, float]]], *args, **kwargs):
+        self.db.set_related_many(lists, *args, **kwargs)
+        self.invalidate(ids=lists, groups=(RELATED,))
+
+    def set_related(self, item_id: int, pairs: List[Tuple[int, float]]):
+        self.set_related_many({item_id: pairs})
+
+    def delete_related(self, item_id: int) -> List[int]:
+        referencing = self.db.delete_related(item_id)
+        self.invalidate(ids=[item_id, *referencing], groups=(RELATED,))
+        return referencing
+
+
+_shared: Optional[CachedSupabaseDB] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_db(ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES) -> CachedSupabaseDB:
+    """
+    Process-wide cached SupabaseDB shared by every Streamlit session, with the
+    ANN index from `python ann_index.py rebuild --backend supabase` attached
+    when it has been built
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            from ann_index import DEFAULT_INDEX_PATH, open_index
+            from database_supabase import SupabaseDB
+            _shared = CachedSupabaseDB(SupabaseDB(ann_index=open_index(DEFAULT_INDEX_PATH)),
+                                       ttl=ttl, max_entries=max_entries)
+        return _shared
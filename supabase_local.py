@@ -0,0 +1,488 @@
+"""
+In-memory stand-in for the Supabase client
+
+Implements the subset of the supabase-py / PostgREST query builder that
+SupabaseDB uses, plus Python versions of the server-side functions (RPCs)
+whose SQL is documented in database_supabase.py and of the change-tracking
+triggers documented in sync_engine.py. Lets SupabaseDB and SyncEngine run
+offline and in tests:
+
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalSupabaseClient
+
+    db = SupabaseDB(client=LocalSupabaseClient())
+"""
+import copy
+import datetime
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sampling import review_weight, weighted_reservoir_sample
+
+
+class LocalAPIError(Exception):
+    """Raised where PostgREST would return an error response"""
+
+
+class LocalResponse:
+    def __init__(self, data: List[Dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+# ----------------------
+# Filters
+# ----------------------
+def _coerce(row_value, value):
+    """PostgREST filter values arrive as text; compare them as the column's type"""
+    if isinstance(value, str) and row_value is not None and not isinstance(row_value, str):
+        if isinstance(row_value, bool):
+            return value.lower() == "true"
+        if isinstance(row_value, int):
+            return int(value)
+        if isinstance(row_value, float):
+            return float(value)
+    return value
+
+
+def _like(pattern: str, value, flags=0) -> bool:
+    """LIKE with PostgreSQL's default escape character: a backslash makes the next character literal"""
+    if value is None:
+        return False
+    regex, chars = [], iter(pattern)
+    for ch in chars:
+        if ch == "\\":
+            ch = next(chars, None)
+            if ch is None:
+                raise LocalAPIError("LIKE pattern must not end with escape character")
+            regex.append(re.escape(ch))
+        else:
+            regex.append(".*" if ch == "%" else "." if ch == "_" else re.escape(ch))
+    return re.fullmatch("".join(regex), str(value), flags | re.DOTALL) is not None
+
+
+def _is(value, literal) -> bool:
+    literal = literal if not isinstance(literal, str) else literal.lower()
+    if literal in (None, "null"):
+        return value is None
+    if literal in (True, "true"):
+        return value is True
+    if literal in (False, "false"):
+        return value is False
+    raise LocalAPIError(f"invalid is. value: {literal}")
+
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda a, b: a is not None and a == _coerce(a, b),
+    "neq": lambda a, b: a is not None and a != _coerce(a, b),
+    "gt": lambda a, b: a is not None and a > _coerce(a, b),
+    "gte": lambda a, b: a is not None and a >= _coerce(a, b),
+    "lt": lambda a, b: a is not None and a < _coerce(a, b),
+    "lte": lambda a, b: a is not None and a <= _coerce(a, b),
+    "like": lambda a, b: _like(b, a),
+    "ilike": lambda a, b: _like(b, a, re.IGNORECASE),
+    "is": _is,
+    "in": lambda a, b: a is not None and a in [_coerce(a, v) for v in b],
+    "cs": lambda a, b: a is not None and set(b) <= set(a),
+}
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split a PostgREST logic string on commas outside parentheses and quotes"""
+    parts, depth, quoted, current = [], 0, False, []
+    chars = iter(text)
+    for ch in chars:
+        if quoted and ch == "\\":
+            # Escaped quote or backslash inside a quoted value, kept for _unquote
+            current.extend((ch, next(chars, "")))
+            continue
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+    return parts
+
+
+def _unquote(value: str) -> str:
+    """A double-quoted PostgREST value without its quotes and backslash escapes"""
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1], flags=re.DOTALL)
+    return value
+
+
+def _parse_logic(text: str) -> Callable[[Dict], bool]:
+    """Parse an or_() expression such as 'a.lt.1,and(a.eq.1,id.lt.5)'"""
+    def term(expr: str) -> Callable[[Dict], bool]:
+        expr = expr.strip()
+        for name, combine in (("and", all), ("or", any)):
+            if expr.startswith(name + "(") and expr.endswith(")"):
+                terms = [term(part) for part in _split_top_level(expr[len(name) + 1:-1])]
+                return lambda row: combine(t(row) for t in terms)
+        column, op, value = expr.split(".", 2)
+        negate = op == "not"
+        if negate:
+            op, value = value.split(".", 1)
+        if op == "in":
+            value = [_unquote(v) for v in _split_top_level(value[1:-1])]
+        else:
+            value = _unquote(value)
+        check = _OPERATORS[op]
+        return lambda row: check(row.get(column), value) != negate
+
+    terms = [term(part) for part in _split_top_level(text)]
+    return lambda row: any(t(row) for t in terms)
+
+
+# ----------------------
+# Query builder
+# ----------------------
+class LocalQuery:
+    def __init__(self, client: "LocalSupabaseClient", table: str):
+        self.client = client
+        self.table = table
+        self._action = "select"
+        self._columns: Optional[List[str]] = None
+        self._count = None
+        self._head = False
+        self._payload = None
+        self._on_conflict = "id"
+        self._filters: List[Callable[[Dict], bool]] = []
+        self._orders: List = []
+        self._offset = 0
+        self._limit: Optional[int] = None
+
+    # Actions (each returns a new builder, like postgrest's request builder)
+    def _with_action(self, action: str, payload=None) -> "LocalQuery":
+        query = LocalQuery(self.client, self.table)
+        query._action, query._payload = action, payload
+        return query
+
+    def select(self, columns: str = "*", count: Optional[str] = None, head: bool = False):
+        query = self._with_action("select")
+        if columns.strip() != "*":
+            query._columns = [c.strip() for c in columns.split(",") if c.strip()]
+        query._count = count
+        query._head = head
+        return query
+
+    def insert(self, data):
+        return self._with_action("insert", data)
+
+    def upsert(self, data, on_conflict: str = "id"):
+        query = self._with_action("upsert", data)
+        query._on_conflict = on_conflict
+        return query
+
+    def update(self, data: Dict):
+        return self._with_action("update", data)
+
+    def delete(self):
+        return self._with_action("delete")
+
+    # Filters
+    def _filter(self, column: str, op: str, value):
+        check = _OPERATORS[op]
+        self._filters.append(lambda row: check(row.get(column), value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "eq", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "neq", value)
+
+    def gt(self, column, value):
+        return self._filter(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._filter(column, "gte", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "lte", value)
+
+    def like(self, column, pattern):
+        return self._filter(column, "like", pattern)
+
+    def ilike(self, column, pattern):
+        return self._filter(column, "ilike", pattern)
+
+    def is_(self, column, value):
+        return self._filter(column, "is", value)
+
+    def in_(self, column, values):
+        return self._filter(column, "in", list(values))
+
+    def contains(self, column, values):
+        return self._filter(column, "cs", list(values))
+
+    def or_(self, filters: str):
+        self._filters.append(_parse_logic(filters))
+        return self
+
+    # Modifiers
+    def order(self, column: str, desc: bool = False):
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    # Execution
+    def _matches(self, row: Dict) -> bool:
+        return all(check(row) for check in self._filters)
+
+    def _project(self, row: Dict) -> Dict:
+        if self._columns is None:
+            return copy.deepcopy(row)
+        return {column: copy.deepcopy(row.get(column)) for column in self._columns}
+
+    def execute(self) -> LocalResponse:
+        self.client._round_trip()
+        with self.client.lock:
+            rows = self.client.tables.setdefault(self.table, [])
+            if self._action == "insert":
+                return LocalResponse(self.client._insert(self.table, self._payload))
+            if self._action == "upsert":
+                return LocalResponse(self.client._upsert(self.table, self._payload, self._on_conflict))
+            if self._action == "update":
+                matched = [row for row in rows if self._matches(row)]
+                for row in matched:
+                    row.update(copy.deepcopy(self._payload))
+                    self.client._fire(self.table, "update", row)
+                return LocalResponse([copy.deepcopy(row) for row in matched])
+            if self._action == "delete":
+                matched = [row for row in rows if self._matches(row)]
+                self.client.tables[self.table] = [row for row in rows if not self._matches(row)]
+                for row in matched:
+                    self.client._fire(self.table, "delete", row)
+                return LocalResponse(matched)
+
+            matched = [row for row in rows if self._matches(row)]
+            count = len(matched) if self._count else None
+            # Stable multi-key sort, NULLs last ascending and first descending like Postgres
+            for column, desc in reversed(self._orders):
+                matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            end = None if self._limit is None else self._offset + self._limit
+            matched = matched[self._offset:end]
+            if self.client.max_rows is not None:
+                matched = matched[:self.client.max_rows]
+            data = [] if self._head else [self._project(row) for row in matched]
+            return LocalResponse(data, count)
+
+
+class LocalRPC:
+    def __init__(self, client: "LocalSupabaseClient", name: str, params: Dict):
+        self.client = client
+        self.name = name
+        self.params = params or {}
+
+    def execute(self) -> LocalResponse:
+        self.client._round_trip()
+        function = self.client.functions.get(self.name)
+        if function is None:
+            raise LocalAPIError(f"function {self.name} does not exist")
+        with self.client.lock:
+            return LocalResponse(function(self.client, **self.params))
+
+
+# ----------------------
+# Server-side functions (mirrors of the SQL in database_supabase.py)
+# ----------------------
+def _entries(client) -> List[Dict]:
+    return client.tables.setdefault("entries", [])
+
+
+def _item_stats(client, today: str) -> Dict:
+    rows = _entries(client)
+    by_type: Dict[str, int] = {}
+    by_tag: Dict[str, int] = {}
+    for row in rows:
+        by_type[row.get("type")] = by_type.get(row.get("type"), 0) + 1
+        for tag in set(row.get("tags") or []):
+            by_tag[tag] = by_tag.get(tag, 0) + 1
+    return {
+        "total": len(rows),
+        "by_type": by_type,
+        "by_tag": by_tag,
+        "reviewed_today": sum(1 for row in rows if (row.get("last_reviewed") or "") >= today),
+        "never_reviewed": sum(1 for row in rows if row.get("last_reviewed") is None),
+    }
+
+
+def _sample_items(client, n: int, tag: Optional[str] = None, weighted: bool = False) -> List[int]:
+    stream = (
+        (row["id"], review_weight(row.get("review_count")) if weighted else 1.0)
+        for row in _entries(client)
+        if tag is None or tag in (row.get("tags") or [])
+    )
+    return weighted_reservoir_sample(stream, n, client.rng)
+
+
+def _search_entries(client, keyword: str, type_filter: Optional[str] = None, tag_filter: Optional[str] = None,
+                    after_rank: Optional[float] = None, after_id: Optional[int] = None,
+                    page_size: int = 20) -> List[Dict]:
+    """
+    Matches like ilike on content or translation. The rank approximates
+    ts_rank: the share of words that equal the keyword, and 0 for
+    substring-only matches
+    """
+    needle = keyword.lower()
+    ranked = []
+    for row in _entries(client):
+        content, translation = (row.get("content") or "").lower(), (row.get("translation") or "").lower()
+        if needle not in content and needle not in translation:
+            continue
+        if type_filter is not None and row.get("type") != type_filter:
+            continue
+        if tag_filter is not None and tag_filter not in (row.get("tags") or []):
+            continue
+        words = re.findall(r"\w+", f"{content} {translation}")
+        rank = sum(word == needle for word in words) / (1 + len(words))
+        ranked.append((rank, row["id"]))
+    ranked.sort(reverse=True)
+    if after_rank is not None:
+        ranked = [key for key in ranked if key < (after_rank, after_id)]
+    return [{"id": item_id, "rank": rank} for rank, item_id in ranked[:page_size]]
+
+
+def _increment_reviews(client, reviews: List[Dict]) -> None:
+    by_id = {row["id"]: row for row in _entries(client)}
+    for review in reviews:
+        row = by_id.get(review["id"])
+        if row is not None:
+            row["review_count"] = (row.get("review_count") or 0) + review["count"]
+            row["last_reviewed"] = review["last_reviewed"]
+            client._fire("entries", "update", row)
+    return None
+
+
+# ----------------------
+# Triggers (mirrors of the SQL in sync_engine.py)
+# ----------------------
+def _track_entry_changes(client, action: str, row: Dict):
+    """entries.updated_at on every write; a tombstone for every delete"""
+    if action in ("insert", "update"):
+        row["updated_at"] = client.now()
+    elif action == "delete":
+        client._upsert("entries_tombstones", {"id": row["id"], "deleted_at": client.now()}, "id")
+
+
+DEFAULT_TRIGGERS = {
+    "entries": [_track_entry_changes],
+}
+
+
+DEFAULT_FUNCTIONS = {
+    "increment_reviews": _increment_reviews,
+    "item_stats": _item_stats,
+    "sample_items": _sample_items,
+    "search_entries": _search_entries,
+}
+
+
+class LocalSupabaseClient:
+    """
+    Tables are lists of dicts; ids are assigned per table like a bigserial.
+    Register extra server-side functions with register_function(name, fn),
+    where fn(client, **params) returns the response data, and row triggers
+    with register_trigger(table, fn), where fn(client, action, row) runs
+    before each insert/update is stored (and may modify the row) and after
+    each delete.
+
+    This is not a PostgREST server: requests never touch HTTP, JSON or a
+    query planner. `latency` (seconds) adds a fixed round trip to every
+    request so request counts show up in timings.
+    """
+    def __init__(self, seed: Optional[int] = None, max_rows: Optional[int] = None, latency: float = 0.0):
+        self.tables: Dict[str, List[Dict]] = {}
+        # Like PostgREST's db-max-rows: selects return at most this many rows
+        self.max_rows = max_rows
+        self.latency = latency
+        self.functions: Dict[str, Callable] = dict(DEFAULT_FUNCTIONS)
+        self.triggers: Dict[str, List[Callable]] = {
+            table: list(triggers) for table, triggers in DEFAULT_TRIGGERS.items()
+        }
+        self.rng = random.Random(seed)
+        self.lock = threading.RLock()
+        self._next_id: Dict[str, int] = {}
+        self._last_now = ""
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict] = None) -> LocalRPC:
+        return LocalRPC(self, name, params)
+
+    def register_function(self, name: str, function: Callable):
+        self.functions[name] = function
+
+    def register_trigger(self, table: str, trigger: Callable):
+        self.triggers.setdefault(table, []).append(trigger)
+
+    def now(self) -> str:
+        """Server timestamp (UTC ISO text), strictly increasing like clock_timestamp() on one server"""
+        with self.lock:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            text = now.isoformat(timespec="microseconds")
+            while text <= self._last_now:
+                now += datetime.timedelta(microseconds=1)
+                text = now.isoformat(timespec="microseconds")
+            self._last_now = text
+            return text
+
+    def _round_trip(self):
+        # Outside the lock, so concurrent requests overlap like they would over the network
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _fire(self, table: str, action: str, row: Dict):
+        for trigger in self.triggers.get(table, ()):
+            trigger(self, action, row)
+
+    def _insert(self, table: str, payload) -> List[Dict]:
+        rows = payload if isinstance(payload, list) else [payload]
+        inserted = []
+        for data in rows:
+            row = copy.deepcopy(data)
+            if row.get("id") is None:
+                row["id"] = self._next_id.get(table, 1)
+            self._next_id[table] = max(self._next_id.get(table, 1), row["id"] + 1)
+            self._fire(table, "insert", row)
+            inserted.append(row)
+        self.tables.setdefault(table, []).extend(inserted)
+        return [copy.deepcopy(row) for row in inserted]
+
+    def _upsert(self, table: str, payload, on_conflict: str) -> List[Dict]:
+        keys = [key.strip() for key in on_conflict.split(",")]
+        rows = self.tables.setdefault(table, [])
+        result = []
+        for data in payload if isinstance(payload, list) else [payload]:
+            existing = next(
+                (row for row in rows if all(row.get(key) == data.get(key) for key in keys)), None
+            )
+            if existing is None:
+                result.extend(self._insert(table, data))
+            else:
+                existing.update(copy.deepcopy(data))
+                self._fire(table, "update", existing)
+                result.append(copy.deepcopy(existing))
+        return result
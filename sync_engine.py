@@ -0,0 +1,357 @@
+"""
+Offline-first mirror: the local SQLite Database serves every read and write,
+and SyncEngine exchanges deltas with Supabase in the background.
+
+Push (local -> remote), driven by bookkeeping columns in the local items table:
+- rows without a remote_id are inserted and get the remote id recorded
+- rows with dirty > 0 (edited locally) have their content fields updated
+- review_delta (reviews not yet pushed) is added on the server with the
+  increment_reviews RPC, so reviews from several devices add up
+- local deletes of uploaded rows leave a tombstone that is deleted remotely
+
+Pull (remote -> local) only moves rows changed since the last sync:
+- entries after the stored (updated_at, id) cursor, keyset-paged on (updated_at, id)
+- entries_tombstones after the stored (deleted_at, id) cursor
+
+Cursors are server timestamps plus the id of the last applied row, so device
+clocks don't matter and no row is downloaded twice.
+
+Conflicts: a row with unpushed local edits keeps its local content (it is
+pushed on the next round, last push wins); review counts always merge;
+a remote delete wins over local edits.
+
+Server-side setup (run once in the Supabase SQL editor):
+
+    alter table entries add column if not exists updated_at timestamptz not null default now();
+    create index if not exists entries_updated_at_id on entries (updated_at, id);
+
+    create or replace function touch_entries() returns trigger language plpgsql as $$
+    begin
+      new.updated_at = clock_timestamp();
+      return new;
+    end $$;
+    create trigger entries_touch before insert or update on entries
+      for each row execute function touch_entries();
+
+    create table if not exists entries_tombstones (
+      id bigint primary key,
+      deleted_at timestamptz not null default clock_timestamp()
+    );
+    create index if not exists entries_tombstones_deleted_at_id on entries_tombstones (deleted_at, id);
+
+    create or replace function record_entry_tombstone() returns trigger language plpgsql as $$
+    begin
+      insert into entries_tombstones (id) values (old.id)
+      on conflict (id) do update set deleted_at = clock_timestamp();
+      return old;
+    end $$;
+    create trigger entries_tombstone after delete on entries
+      for each row execute function record_entry_tombstone();
+
+The local bookkeeping (see Database.enable_sync) is only added to databases
+opened for offline mode. supabase_local.LocalSupabaseClient implements the
+same triggers, so sync can be exercised without a server:
+
+    local = Database(":memory:", sync=True)
+    engine = SyncEngine(local, SupabaseDB(client=LocalSupabaseClient()))
+    engine.sync()
+
+A local database that already holds data uploads all of it on the first
+sync; to mirror an existing Supabase project, start from an empty file.
+"""
+import atexit
+import base64
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from database import Database, ITEM_COLUMNS, LIST_COLUMNS
+
+DEFAULT_INTERVAL = 30.0
+DEFAULT_BATCH_SIZE = 500
+
+TOMBSTONE_TABLE = "entries_tombstones"
+# Keys in the local sync_state table, each holding a JSON [timestamp, id] cursor
+ENTRIES_WATERMARK = "entries_watermark"
+TOMBSTONES_WATERMARK = "tombstones_watermark"
+
+# Fields an edit can change (everything except review bookkeeping)
+_CONTENT_FIELDS = ("type", "content", "translation", "lemma", "tags", "examples", "embedding")
+
+
+def _encode_embedding(embedding) -> Optional[str]:
+    if embedding is None:
+        return None
+    return base64.b64encode(embedding).decode("utf-8")
+
+
+def _content(item: Dict) -> Dict:
+    data = {field: item.get(field) for field in _CONTENT_FIELDS}
+    for field in ("lemma", "tags", "examples"):
+        data[field] = data[field] or []
+    data["embedding"] = _encode_embedding(data["embedding"])
+    return data
+
+
+class SyncEngine:
+    """
+    sync() runs one push-then-pull round and returns what it moved. start()
+    runs rounds in a background thread every `interval` seconds (and on
+    request_sync()); failures, e.g. while offline, are kept in last_error and
+    the round is retried later. Nothing is lost in between: pending changes
+    live in the local database.
+
+    on_change(changed_ids, stale_ids) is called with local ids after a pull
+    changed anything: the rows pulled, and the rows whose neighbour lists
+    referenced a row deleted by the pull. The deletes themselves already
+    removed those references (like Database.delete_item), so the callback
+    only recomputes lists, see neighbor_list_refresher(). It runs on the sync
+    thread; an exception it raises ends up in last_error.
+    """
+    def __init__(self, local: Database, remote, interval: float = DEFAULT_INTERVAL,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 on_change: Optional[Callable[[List[int], List[int]], None]] = None):
+        if not local.sync_enabled:
+            raise ValueError("SyncEngine needs a Database opened with sync=True")
+        self.local = local
+        # A plain SupabaseDB: writes must not go through a read cache
+        self.remote = remote
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_change = on_change
+        self.last_result: Optional[Dict] = None
+        self.last_error: Optional[Exception] = None
+        self.last_sync: Optional[float] = None
+        self._sync_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _table(self, name: Optional[str] = None):
+        return self.remote.supabase.table(name or self.remote.table_name)
+
+    # ----------------------
+    # Push
+    # ----------------------
+    def _push_deletes(self) -> int:
+        remote_ids = self.local.get_tombstones()
+        for start in range(0, len(remote_ids), self.batch_size):
+            chunk = remote_ids[start:start + self.batch_size]
+            self._table().delete().in_("id", chunk).execute()
+            self.local.clear_tombstones(chunk)
+        return len(remote_ids)
+
+    def _push_items(self) -> int:
+        pushed = 0
+        while True:
+            batch = self.local.get_unsynced_items(self.batch_size)
+            if not batch:
+                break
+            # {local id: [remote_id, dirty pushed, review_delta pushed]}
+            synced: Dict[int, list] = {}
+
+            new = [(item, dirty, review_delta) for item, remote_id, dirty, review_delta in batch
+                   if remote_id is None]
+            if new:
+                rows = []
+                for item, _, _ in new:
+                    row = _content(item)
+                    row.update({
+                        "created_at": item["created_at"],
+                        "last_reviewed": item["last_reviewed"],
+                        "review_count": item["review_count"] or 0,
+                    })
+                    rows.append(row)
+                # PostgREST returns the inserted rows in request order
+                result = self._table().insert(rows).execute()
+                for (item, dirty, review_delta), row in zip(new, result.data):
+                    synced[item["id"]] = [row["id"], dirty, review_delta]
+
+            reviews = {}
+            for item, remote_id, dirty, review_delta in batch:
+                if remote_id is None:
+                    continue
+                synced[item["id"]] = [remote_id, 0, 0]
+                if dirty:
+                    self._table().update(_content(item)).eq("id", remote_id).execute()
+                    synced[item["id"]][1] = dirty
+                if review_delta:
+                    reviews[remote_id] = (review_delta, item["last_reviewed"])
+                    synced[item["id"]][2] = review_delta
+            if reviews:
+                self.remote.update_reviews(reviews)
+
+            self.local.mark_synced([(item_id, *values) for item_id, values in synced.items()])
+            pushed += len(synced)
+            # Rows edited during this batch come back in the next one
+            if len(batch) < self.batch_size:
+                break
+        return pushed
+
+    # ----------------------
+    # Pull
+    # ----------------------
+    def _pull(self, table: str, columns: Sequence[str], column: str, state_key: str,
+              apply: Callable[[List[Dict]], List[int]]) -> List[int]:
+        """Page through rows after the stored (`column`, id) cursor, storing it after each page"""
+        cursor = self.local.get_sync_state(state_key)
+        after = tuple(json.loads(cursor)) if cursor is not None else None
+        applied: List[int] = []
+        while True:
+            q = self._table(table).select(",".join(columns))
+            if after is not None:
+                stamp, last_id = after
+                q = q.or_(f'{column}.gt."{stamp}",and({column}.eq."{stamp}",id.gt.{int(last_id)})')
+            rows = q.order(column).order("id").limit(self.batch_size).execute().data
+            if not rows:
+                break
+            applied.extend(apply(rows))
+            after = (rows[-1][column], rows[-1]["id"])
+            self.local.set_sync_state(state_key, json.dumps(after))
+        return applied
+
+    def _pull_items(self) -> List[int]:
+        return self._pull(self.remote.table_name, ITEM_COLUMNS + ("updated_at",), "updated_at",
+                          ENTRIES_WATERMARK, self.local.apply_remote_items)
+
+    def _pull_deletes(self) -> Tuple[List[int], List[int]]:
+        """(deleted local ids, ids of the lists that referenced them)"""
+        stale: List[int] = []
+
+        def apply(rows):
+            deleted, referencing = self.local.delete_by_remote_ids([row["id"] for row in rows])
+            stale.extend(referencing)
+            return deleted
+
+        deleted = self._pull(TOMBSTONE_TABLE, ("id", "deleted_at"), "deleted_at", TOMBSTONES_WATERMARK, apply)
+        gone = set(deleted)
+        return deleted, [item_id for item_id in dict.fromkeys(stale) if item_id not in gone]
+
+    # ----------------------
+    # Rounds
+    # ----------------------
+    def sync(self) -> Dict:
+        """Push local changes, then pull remote ones. Raises if the server can't be reached"""
+        with self._sync_lock:
+            result = {
+                "deleted_remote": self._push_deletes(),
+                "pushed": self._push_items(),
+            }
+            changed_ids = self._pull_items()
+            deleted_ids, stale_ids = self._pull_deletes()
+            result.update({"pulled": len(changed_ids), "deleted_local": len(deleted_ids)})
+            self.last_result = result
+            self.last_sync = time.time()
+            self.last_error = None
+        if self.on_change is not None and (changed_ids or deleted_ids):
+            self.on_change(changed_ids, stale_ids)
+        return result
+
+    def try_sync(self) -> Optional[Dict]:
+        """sync(), keeping the error in last_error instead of raising"""
+        try:
+            return self.sync()
+        except Exception as e:
+            self.last_error = e
+            return None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sync-engine", daemon=True)
+            self._thread.start()
+
+    def request_sync(self):
+        """Run a round now instead of waiting for the interval"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.try_sync()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def close(self):
+        """Stop the background thread and try to push what is left"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+        self.try_sync()
+
+    def status(self) -> Dict:
+        return {
+            "last_sync": self.last_sync,
+            "last_result": self.last_result,
+            "last_error": None if self.last_error is None else f"{type(self.last_error).__name__}: {self.last_error}",
+        }
+
+
+def neighbor_list_refresher(local: Database, on_pull: Optional[Callable[[], None]] = None,
+                            version: Optional[Callable[[], object]] = None) -> Callable[[List[int], List[int]], None]:
+    """
+    SyncEngine on_change that recomputes the neighbour lists a pull affected,
+    once model_registry's shared EmbeddingManager has loaded (before that the
+    lists stay as they are, and the app recomputes them on its own writes)
+
+    on_pull() runs first after every pull that changed anything, e.g. to
+    invalidate caches; version() is the snapshot version the lists are
+    computed against (see embedding_utils.ItemSnapshot). Both run on the sync
+    thread, so neither may use Streamlit.
+    """
+    def on_change(changed_ids: List[int], stale_ids: List[int]):
+        if on_pull is not None:
+            on_pull()
+        import model_registry
+        if not model_registry.is_ready(model_registry.EMBEDDING_MANAGER):
+            return
+        from embedding_utils import ItemSnapshot, apply_neighbor_updates
+        items = ItemSnapshot(local.get_all_items(columns=LIST_COLUMNS), version() if version else None)
+        apply_neighbor_updates(local, model_registry.get_embedding_manager(), items, changed_ids, stale_ids)
+
+    return on_change
+
+
+_shared_db: Optional[Database] = None
+_shared_engine: Optional[SyncEngine] = None
+_shared_lock = threading.Lock()
+
+
+def get_offline_db(db_path: str = "german_learning.db", interval: float = DEFAULT_INTERVAL,
+                   on_pull: Optional[Callable[[], None]] = None,
+                   version: Optional[Callable[[], object]] = None) -> Database:
+    """
+    Process-wide local Database for offline-first mode. When SUPABASE_URL and
+    SUPABASE_KEY are configured it is mirrored by a background SyncEngine
+    (see get_sync_engine()) that refreshes neighbour lists after pulling
+    changes (see neighbor_list_refresher for on_pull and version);
+    otherwise it is purely local. An ANN index built next to the file with
+    `python ann_index.py rebuild` is attached and kept up to date.
+    """
+    global _shared_db, _shared_engine
+    with _shared_lock:
+        if _shared_db is None:
+            from ann_index import index_path_for, open_index
+            _shared_db = Database(db_path, ann_index=open_index(index_path_for(db_path)), sync=True)
+            try:
+                from database_supabase import SupabaseDB
+                remote = SupabaseDB()
+            except (ImportError, AssertionError):
+                remote = None
+            if remote is not None:
+                _shared_engine = SyncEngine(_shared_db, remote, interval=interval,
+                                            on_change=neighbor_list_refresher(_shared_db, on_pull, version))
+                _shared_engine.start()
+        return _shared_db
+
+
+def get_sync_engine() -> Optional[SyncEngine]:
+    """The engine started by get_offline_db(), if any"""
+    return _shared_engine
+
+
+@atexit.register
+def _close_shared():
+    if _shared_engine is not None:
+        _shared_engine.close()
@@ -0,0 +1,60 @@
+import pytest
+
+from database import Database
+from database_memory import MemoryDB
+
+
+def _batch():
+    return [
+        {"type": "Word", "content": "eins", "tags": ["A1"]},
+        {"type": "Word", "content": "bad", "tags": ["A1"]},       # rejected by the database
+        {"type": "Word", "tags": ["A1"]},                          # no content
+        {"type": "Word", "content": "vier", "tags": ["B1"]},
+    ]
+
+
+def _assert_partial(db, ids, failures):
+    assert ids[1] is None and ids[2] is None
+    assert ids[0] is not None and ids[3] is not None and ids[0] != ids[3]
+    assert [index for index, _ in failures] == [1, 2]
+    assert "KeyError" in failures[1][1]
+    assert db.get_item(ids[0], columns=("content", "tags")) == {"content": "eins", "tags": ["A1"]}
+    assert db.get_item(ids[3], columns=("content", "tags")) == {"content": "vier", "tags": ["B1"]}
+    assert sorted(item["content"] for item in db.get_all_items(columns=("content",))) == ["eins", "vier"]
+    assert db.list_tags() == [("A1", 1), ("B1", 1)]
+
+
+def test_sqlite_add_items_partial_failure(tmp_path):
+    db = Database(str(tmp_path / "add.db"))
+    db.conn.execute("""
+        CREATE TRIGGER reject_bad BEFORE INSERT ON items WHEN new.content = 'bad'
+        BEGIN SELECT RAISE(ABORT, 'rejected'); END
+    """)
+    ids, failures = db.add_items(_batch())
+    _assert_partial(db, ids, failures)
+    assert "rejected" in failures[0][1]
+    db.close()
+
+
+def test_supabase_add_items_partial_failure():
+    pytest.importorskip("supabase")
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalAPIError, LocalSupabaseClient
+
+    def reject_bad(client, action, row):
+        if action == "insert" and row.get("content") == "bad":
+            raise LocalAPIError("rejected")
+
+    client = LocalSupabaseClient()
+    client.register_trigger("entries", reject_bad)
+    db = SupabaseDB(client=client)
+    ids, failures = db.add_items(_batch())
+    _assert_partial(db, ids, failures)
+    assert "rejected" in failures[0][1]
+
+
+def test_memory_add_items_input_failure():
+    db = MemoryDB()
+    ids, failures = db.add_items([{"type": "Word", "content": "eins"}, {"content": "zwei"}])
+    assert ids[0] == 1 and ids[1] is None
+    assert [index for index, _ in failures] == [1]
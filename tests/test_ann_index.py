@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ann_index import IVFIndex, open_index  # noqa: E402
+
+
+def _vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def _build(path, n=400, n_lists=16, nprobe=None):
+    vectors = _vectors(n)
+    index = IVFIndex(str(path), nprobe=nprobe)
+    index.rebuild([{"id": i + 1, "embedding": v} for i, v in enumerate(vectors)], n_lists=n_lists)
+    return index, vectors
+
+
+def test_nprobe_is_persisted(tmp_path):
+    _build(tmp_path / "idx", nprobe=3)
+    assert IVFIndex(str(tmp_path / "idx")).nprobe == 3
+    assert IVFIndex(str(tmp_path / "idx"), nprobe=5).nprobe == 5
+
+
+def test_updates_append_to_delta_log_and_survive_reload(tmp_path):
+    path = tmp_path / "idx"
+    index, vectors = _build(path)
+    meta_mtime = os.stat(path / "meta.npz").st_mtime_ns
+
+    new_vector = _vectors(1, seed=1)[0]
+    index.upsert(1000, new_vector)
+    index.remove(5)
+    index.upsert(6, vectors[7])
+    assert os.stat(path / "meta.npz").st_mtime_ns == meta_mtime
+    assert os.path.getsize(path / "delta.log") > 0
+
+    reloaded = IVFIndex(str(path))
+    assert len(reloaded) == len(index)
+    assert reloaded.vector_of(5) is None
+    assert reloaded.search(new_vector, 1, nprobe=reloaded.n_lists)[0][0] == 1000
+    np.testing.assert_allclose(reloaded.vector_of(6), reloaded.vector_of(8), rtol=1e-6)
+
+
+def test_delta_log_is_compacted(tmp_path, monkeypatch):
+    import ann_index
+
+    monkeypatch.setattr(ann_index, "COMPACT_MIN_RECORDS", 10)
+    path = tmp_path / "idx"
+    index, _ = _build(path)
+    # Compacted once the log holds more than a quarter of the entries
+    index.upsert_many([(2000 + i, v) for i, v in enumerate(_vectors(90, seed=2))])
+    assert os.path.exists(path / "delta.log")
+    index.upsert_many([(3000 + i, v) for i, v in enumerate(_vectors(50, seed=3))])
+    assert not os.path.exists(path / "delta.log")
+    assert len(IVFIndex(str(path))) == 540
+
+
+def test_filtered_search_returns_k_results(tmp_path):
+    index, vectors = _build(tmp_path / "idx", n_lists=32, nprobe=1)
+    allowed = list(range(1, 401, 40))
+    hits = index.search(vectors[0], 5, allowed_ids=allowed)
+    assert len(hits) == 5
+    assert {item_id for item_id, _ in hits} <= set(allowed)
+    scores = [score for _, score in hits]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_open_index_requires_a_built_index(tmp_path):
+    assert open_index(str(tmp_path / "missing")) is None
+    _build(tmp_path / "idx")
+    assert len(open_index(str(tmp_path / "idx"), embedding_manager=object())) == 400
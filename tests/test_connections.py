@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from database import Database
+
+
+def _run(target, *args):
+    errors = []
+
+    def wrapper():
+        try:
+            target(*args)
+        except BaseException as e:   # surfaced in the main thread
+            errors.append(e)
+
+    thread = threading.Thread(target=wrapper)
+    thread.start()
+    return thread, errors
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    db = Database(str(tmp_path / "threads.db"))
+    yield db
+    db.close()
+
+
+def test_each_thread_gets_its_own_connection(file_db):
+    assert file_db.c.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert file_db.c.execute("PRAGMA synchronous").fetchone()[0] == 1   # NORMAL
+    seen = {}
+
+    def record(name):
+        seen[name] = (file_db.conn, file_db.c)
+        file_db.add_item("Word", name, "", [], [])
+
+    threads = [_run(record, f"w{i}") for i in range(4)]
+    for thread, errors in threads:
+        thread.join(5)
+        assert errors == []
+    connections = {id(conn) for conn, _ in seen.values()}
+    assert len(connections) == 4 and id(file_db.conn) not in connections
+    assert file_db.get_stats()["total"] == 4
+    # Connections of finished threads are closed when the next thread connects
+    _run(lambda: file_db.conn)[0].join(5)
+    assert len(file_db.connections) == 2
+
+
+def test_readers_do_not_wait_for_an_open_import(file_db):
+    file_db.add_items([{"type": "Word", "content": f"alt{i}"} for i in range(10)])
+    writing, done = threading.Event(), threading.Event()
+
+    def importer():
+        # A long import: the write transaction stays open until the readers are done
+        file_db.c.execute("BEGIN IMMEDIATE")
+        file_db.c.executemany("INSERT INTO items (type, content) VALUES ('Word', ?)",
+                              [(f"neu{i}",) for i in range(100)])
+        writing.set()
+        done.wait(5)
+        file_db.conn.commit()
+
+    writer, writer_errors = _run(importer)
+    assert writing.wait(5)
+    counts = []
+
+    def reader():
+        counts.append(len(file_db.search_items("alt")))
+        counts.append(file_db.get_stats()["total"])
+
+    readers = [_run(reader) for _ in range(3)]
+    for thread, errors in readers:
+        thread.join(5)
+        assert not thread.is_alive() and errors == []
+    # The readers saw the last committed state while the import was still running
+    assert counts == [10, 10] * 3
+    done.set()
+    writer.join(5)
+    assert writer_errors == []
+    assert file_db.get_stats()["total"] == 110
+
+
+def test_concurrent_writers_are_serialized(file_db):
+    def writer(prefix):
+        for i in range(20):
+            item_id = file_db.add_item("Word", f"{prefix}{i}", "", [], ["A1"])
+            file_db.update_review(item_id)
+
+    threads = [_run(writer, prefix) for prefix in "abcd"]
+    for thread, errors in threads:
+        thread.join(30)
+        assert errors == []
+    stats = file_db.get_stats()
+    assert stats["total"] == 80 and stats["by_tag"] == {"A1": 80}
+    assert file_db.c.execute("SELECT SUM(review_count) FROM items").fetchone()[0] == 80
+
+
+def test_memory_databases_are_shared_across_threads_but_not_instances():
+    first = Database(":memory:")
+    first.add_item("Word", "Hund", "", [], [])
+    seen = []
+    thread, errors = _run(lambda: seen.append(first.get_stats()["total"]))
+    thread.join(5)
+    assert errors == [] and seen == [1]
+    # Left open on purpose: a new instance must still start empty
+    second = Database(":memory:")
+    assert second.get_stats()["total"] == 0
+    second.close()
+    first.close()
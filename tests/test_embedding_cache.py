@@ -0,0 +1,77 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import embedding_cache  # noqa: E402
+from embedding_cache import EmbeddingCache  # noqa: E402
+from embedding_utils import EmbeddingManager  # noqa: E402
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).normal(size=8).astype(np.float32)
+
+
+def _statements(cache):
+    statements = []
+    cache.conn.set_trace_callback(statements.append)
+    return statements
+
+
+def test_count_is_tracked_in_memory(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=5)
+    statements = _statements(cache)
+    cache.put_many("m", {f"text {i}": _vector(i) for i in range(4)})
+    cache.put_many("m", {"text 0": _vector(10), "text 9": _vector(9)})
+    assert len(cache) == 5
+    assert not any("COUNT(*)" in sql for sql in statements)
+    np.testing.assert_allclose(cache.get("m", "text 0"), _vector(10))
+    cache.close()
+    assert len(EmbeddingCache(str(tmp_path / "cache.db"))) == 5
+
+
+def test_reads_batch_access_times_and_eviction_keeps_recent(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=3)
+    for i in range(3):
+        cache.put("m", f"text {i}", _vector(i))
+    statements = _statements(cache)
+    assert cache.get("m", "text 0") is not None
+    assert not any(sql.startswith("UPDATE") for sql in statements)
+
+    # text 0 was read after text 1 was written, so text 1 is evicted first
+    cache.put("m", "text 3", _vector(3))
+    assert len(cache) == 3
+    assert cache.get("m", "text 1") is None
+    assert cache.get("m", "text 0") is not None
+
+
+def test_access_times_are_flushed_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "ACCESS_FLUSH_SIZE", 2)
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    cache.put_many("m", {"a": _vector(0), "b": _vector(1)})
+    statements = _statements(cache)
+    cache.get("m", "a")
+    assert not any(sql.startswith("UPDATE") for sql in statements)
+    cache.get("m", "b")
+    assert any(sql.startswith("UPDATE") for sql in statements)
+
+
+class _CountingManager(EmbeddingManager):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.encoded = []
+
+    def _encode_texts(self, texts, batch_size):
+        self.encoded.extend(texts)
+        return np.stack([_vector(len(text)) for text in texts]) if texts else np.zeros((0, 8))
+
+
+def test_generate_embeddings_dedups_on_the_cache_key(tmp_path):
+    manager = _CountingManager(cache=EmbeddingCache(str(tmp_path / "cache.db")))
+    vectors = manager.generate_embeddings(["der  Hund", " der Hund ", "die Katze", "der Hund"])
+    assert manager.encoded == ["der Hund", "die Katze"]
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+    np.testing.assert_array_equal(vectors[0], vectors[3])
+
+    manager.generate_embeddings(["der Hund\n"])
+    assert manager.encoded == ["der Hund", "die Katze"]
+    assert manager.cache.hits == 1
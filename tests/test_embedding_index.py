@@ -0,0 +1,91 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from embedding_utils import EmbeddingIndex, EmbeddingManager, ItemSnapshot, encode_embedding  # noqa: E402
+
+
+def _items(n=500, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return [
+        {"id": i + 1, "type": "Word", "tags": ["A1"] if i % 3 == 0 else [], "embedding": encode_embedding(v)}
+        for i, v in enumerate(vectors)
+    ]
+
+
+def _index(items, precision, source=None):
+    manager = EmbeddingManager(embedding_source=source)
+    return EmbeddingIndex(manager, precision=precision).build(items)
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_quantized_top_k_matches_exact(precision):
+    items = _items()
+    blobs = {item["id"]: item["embedding"] for item in items}
+    exact = _index(items, "float32")
+    quantized = _index(items, precision, source=lambda ids: {i: blobs[i] for i in ids})
+    mask = exact.tag_mask(["A1"])
+    for item in items[:20]:
+        query = exact.query_vector(item)
+        for m in (None, mask):
+            expected = exact.top_k(query, 10, m)
+            got = quantized.top_k(quantized.query_vector({"id": item["id"]}), 10, m)
+            assert [row for row, _ in got] == [row for row, _ in expected]
+            np.testing.assert_allclose([s for _, s in got], [s for _, s in expected], rtol=1e-5)
+
+
+def test_quantized_index_keeps_no_blobs():
+    items = _items(50)
+    index = _index(items, "int8", source=lambda ids: {})
+    assert all("embedding" not in item for item in index.items)
+    assert index._blobs == {}
+    assert isinstance(index.signature, bytes)
+    # Without a source the blobs are kept for re-ranking only
+    assert len(_index(items, "int8")._blobs) == 50
+
+
+def test_signature_tracks_embedding_and_tag_changes():
+    items = _items(20)
+    signature = EmbeddingIndex.make_signature(items)
+    assert EmbeddingIndex.make_signature([dict(item) for item in items]) == signature
+    changed = [dict(item) for item in items]
+    changed[3]["tags"] = ["B1"]
+    assert EmbeddingIndex.make_signature(changed) != signature
+    changed = [dict(item) for item in items]
+    changed[5]["embedding"] = items[6]["embedding"]
+    assert EmbeddingIndex.make_signature(changed) != signature
+
+
+def test_set_index_precision_rebuilds():
+    items = _items(30)
+    manager = EmbeddingManager()
+    assert manager.get_index(items).precision == "float32"
+    manager.set_index_precision("int8")
+    assert manager.get_index(items).precision == "int8"
+    with pytest.raises(ValueError):
+        manager.set_index_precision("int4")
+
+
+def test_snapshot_version_reuses_index_without_signature(monkeypatch):
+    items = _items(40)
+    blobs = {item["id"]: item["embedding"] for item in items}
+    fetched = []
+
+    def source(ids):
+        fetched.append(list(ids))
+        return {i: blobs[i] for i in ids}
+
+    manager = EmbeddingManager(embedding_source=source)
+    light = [{k: v for k, v in item.items() if k != "embedding"} for item in items]
+    index = manager.get_index(ItemSnapshot(light, 1))
+    assert fetched == [[item["id"] for item in items]]
+    np.testing.assert_allclose(index.matrix, _index(items, "float32").matrix)
+
+    def no_signature(items):
+        raise AssertionError("signature computed for a versioned snapshot")
+
+    monkeypatch.setattr(EmbeddingIndex, "make_signature", staticmethod(no_signature))
+    assert manager.get_index(ItemSnapshot(light, 1)) is index
+    assert len(fetched) == 1
+    rebuilt = manager.get_index(ItemSnapshot(light[:10], 2))
+    assert rebuilt is not index and len(rebuilt.items) == 10 and len(fetched) == 2
@@ -0,0 +1,131 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from embedding_utils import EmbeddingManager  # noqa: E402
+
+
+class _FakeModel:
+    """Stands in for SentenceTransformer: one row per text, records every encode call"""
+
+    def __init__(self, dim=4, numpy_error=False):
+        self.dim = dim
+        self.numpy_error = numpy_error
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, convert_to_tensor=False, show_progress_bar=None):
+        self.calls.append((list(texts), batch_size, convert_to_tensor))
+        if self.numpy_error and not convert_to_tensor:
+            raise RuntimeError("Numpy is not available")
+        vectors = np.array([[len(text), i, 0, 1] for i, text in enumerate(texts)], dtype=np.float32)
+        if convert_to_tensor:
+            import torch
+            return torch.tensor(vectors)
+        return list(vectors)
+
+
+def _manager(model):
+    manager = EmbeddingManager()
+    manager.model = model
+    return manager
+
+
+def test_generate_embeddings_encodes_in_one_call():
+    pytest.importorskip("torch")
+    model = _FakeModel()
+    texts = [f"Wort {i}" for i in range(10)]
+    vectors = _manager(model).generate_embeddings(texts, batch_size=4)
+    assert vectors.shape == (10, 4)
+    assert model.calls == [(texts, 4, False)]
+    assert vectors[:, 1].tolist() == list(range(10))
+
+
+def test_generate_embeddings_falls_back_to_tensors():
+    pytest.importorskip("torch")
+    model = _FakeModel(numpy_error=True)
+    vectors = _manager(model).generate_embeddings(["eins", "zwei", "drei"])
+    assert [convert_to_tensor for _, _, convert_to_tensor in model.calls] == [False, True]
+    assert isinstance(vectors, np.ndarray) and vectors.shape == (3, 4)
+
+
+def test_generate_embeddings_of_nothing():
+    pytest.importorskip("torch")
+    vectors = _manager(_FakeModel(dim=6)).generate_embeddings([])
+    assert vectors.shape == (0, 6)
+
+
+class _BatchManager(EmbeddingManager):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def _encode_texts(self, texts, batch_size):
+        self.batches.append(list(texts))
+        return np.array([[float(len(text))] * 3 for text in texts])
+
+
+def test_generate_embedding_is_a_batch_of_one():
+    manager = _BatchManager()
+    single = manager.generate_embedding("Hund")
+    batch = manager.generate_embeddings(["Hund", "Katze"])
+    assert single.shape == (3,) and batch.shape == (2, 3)
+    np.testing.assert_array_equal(single, batch[0])
+    assert manager.batches == [["Hund"], ["Hund", "Katze"]]
+
+
+def _legacy_blob(vector):
+    """The old storage format: a pickled float64 array"""
+    import pickle
+    return pickle.dumps(np.asarray(vector, dtype=np.float64))
+
+
+def test_load_embedding_reads_every_stored_form():
+    import base64
+    from embedding_utils import decode_embedding
+
+    manager = EmbeddingManager(storage_dtype="float16")
+    vector = np.random.default_rng(3).normal(size=384)
+    blob = manager.save_embedding(vector)
+    assert len(blob) < len(_legacy_blob(vector)) / 3
+    decoded, model_id = decode_embedding(blob)
+    assert decoded.dtype == np.float16 and model_id == manager.model_name
+    for stored in (blob, base64.b64encode(blob).decode("ascii"), _legacy_blob(vector),
+                   base64.b64encode(_legacy_blob(vector)).decode("ascii")):
+        np.testing.assert_allclose(manager.load_embedding(stored), vector, rtol=1e-3, atol=1e-3)
+    assert manager.load_embedding(None) is None
+
+
+def test_load_embedding_refuses_arbitrary_pickles():
+    import pickle
+
+    class Payload:
+        def __reduce__(self):
+            return (print, ("unpickled",))
+
+    assert EmbeddingManager().load_embedding(pickle.dumps(Payload())) is None
+
+
+def test_migration_rewrites_legacy_blobs():
+    from database import Database
+    from embedding_utils import is_encoded_embedding
+    from migrate_embeddings import migrate_embeddings
+
+    db = Database(":memory:")
+    vectors = np.random.default_rng(4).normal(size=(3, 8))
+    manager = EmbeddingManager()
+    db.add_items([
+        {"type": "Word", "content": "alt", "embedding": _legacy_blob(vectors[0])},
+        {"type": "Word", "content": "neu", "embedding": manager.save_embedding(vectors[1])},
+        {"type": "Word", "content": "kaputt", "embedding": b"not a pickle"},
+        {"type": "Word", "content": "ohne"},
+    ])
+    assert migrate_embeddings(db, manager) == (1, 1, 1)
+    blob = db.get_item(1, columns=("embedding",))["embedding"]
+    assert is_encoded_embedding(blob)
+    np.testing.assert_allclose(manager.load_embedding(blob), vectors[0], rtol=1e-6)
+    # Already migrated rows are left alone on a second run
+    assert migrate_embeddings(db, manager) == (0, 2, 1)
+    db.close()
@@ -0,0 +1,81 @@
+import base64
+import csv
+import io
+
+import pytest
+
+from database import Database, ITEM_COLUMNS, LIST_COLUMNS
+from database_memory import MemoryDB
+
+
+ITEMS = [
+    {"type": "Word", "content": "Straße", "translation": "street", "tags": ["A1"], "embedding": b"\x00\xffab"},
+    {"type": "Phrase", "content": 'sagen "hallo", bitte', "translation": "say hi,\nplease", "tags": []},
+    {"type": "Sentence", "content": "Die Mäuse schlafen.", "translation": "The mice sleep.", "tags": ["B1", "home"],
+     "embedding": bytes(range(16))},
+]
+
+
+def _sqlite(tmp_path):
+    return Database(str(tmp_path / "export.db"))
+
+
+def _supabase(tmp_path):
+    pytest.importorskip("supabase")
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalSupabaseClient
+    # A max-rows cap below the chunk size must not cut the export short
+    return SupabaseDB(client=LocalSupabaseClient(max_rows=1))
+
+
+@pytest.fixture(params=["memory", "sqlite", "supabase"])
+def db(request, tmp_path):
+    db = {"memory": lambda _: MemoryDB(), "sqlite": _sqlite, "supabase": _supabase}[request.param](tmp_path)
+    yield db
+    db.close()
+
+
+def _rows(data: bytes):
+    return list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+
+
+def test_streamed_csv_contents(db):
+    db.add_items(ITEMS)
+    chunks = list(db.iter_csv(chunk_size=2))
+    # One piece per chunk read (the header comes with the first), each complete UTF-8 lines
+    assert len(chunks) > 1
+    assert all(chunk.decode("utf-8").endswith("\n") for chunk in chunks)
+    rows = _rows(b"".join(chunks))
+    assert list(rows[0]) == list(LIST_COLUMNS)
+    assert [row["id"] for row in rows] == ["1", "2", "3"]
+    assert [(row["type"], row["content"], row["translation"]) for row in rows] == [
+        (item["type"], item["content"], item["translation"]) for item in ITEMS
+    ]
+    assert b"".join(chunks).decode("utf-8") == db.export_to_csv()
+
+
+def test_streamed_csv_with_embeddings(db):
+    db.add_items(ITEMS)
+    rows = _rows(b"".join(db.iter_csv(embeddings="base64", chunk_size=1)))
+    assert list(rows[0]) == list(ITEM_COLUMNS)
+    assert [base64.b64decode(row["embedding"]) if row["embedding"] else None for row in rows] == [
+        item.get("embedding") for item in ITEMS
+    ]
+
+
+def _without_timestamps(backend):
+    return [{k: v for k, v in row.items() if k not in ("created_at", "last_reviewed")}
+            for row in _rows(b"".join(backend.iter_csv(embeddings="base64")))]
+
+
+def test_streamed_csv_is_the_same_on_every_backend(db):
+    reference = MemoryDB()
+    for backend in (db, reference):
+        backend.add_items(ITEMS)
+    assert _without_timestamps(db) == _without_timestamps(reference)
+
+
+def test_streamed_csv_of_empty_table(db):
+    assert b"".join(db.iter_csv()).decode("utf-8") == ",".join(LIST_COLUMNS) + "\n"
+    with pytest.raises(ValueError):
+        db.iter_csv(embeddings="raw")
@@ -0,0 +1,71 @@
+import copy
+import json
+import pickle
+
+import pytest
+
+from database import Database, ITEM_COLUMNS, LIST_COLUMNS, LazyItem
+
+
+DECODED = {"lemma": ["Hund"], "tags": ["A1", "Tiere"], "examples": ["Der Hund bellt."]}
+
+
+@pytest.fixture
+def db():
+    db = Database(":memory:")
+    db.add_item("Word", "Hund", "dog", DECODED["lemma"], DECODED["tags"], DECODED["examples"], embedding=b"\x01\x02")
+    db.add_item("Word", "Katze", "cat", [], [])
+    yield db
+    db.close()
+
+
+def _fresh(db, item_id=1, columns=None):
+    item = db.get_item(item_id, columns=columns)
+    assert isinstance(item, LazyItem) and set(item._pending) & set(DECODED)
+    return item
+
+
+def test_json_fields_decode_on_first_access(db):
+    item = _fresh(db)
+    assert item["tags"] == DECODED["tags"]
+    assert "tags" not in item._pending and "lemma" in item._pending
+    assert item.get("lemma") == DECODED["lemma"]
+    assert item.pop("examples") == DECODED["examples"]
+    assert item._pending == {}
+    # Empty JSON columns decode to lists
+    assert db.get_item(2)["examples"] == []
+
+
+@pytest.mark.parametrize("convert", [
+    dict,
+    lambda item: {**item},
+    lambda item: item.copy(),
+    copy.copy,
+    lambda item: dict(item.items()),
+    lambda item: dict(zip(item.keys(), item.values())),
+    lambda item: pickle.loads(pickle.dumps(item)),
+    lambda item: json.loads(json.dumps(item, default=lambda value: value.hex())),
+])
+def test_copies_decode_pending_fields(db, convert):
+    item = _fresh(db)
+    plain = convert(item)
+    assert {key: plain[key] for key in DECODED} == DECODED
+    assert set(plain) == set(ITEM_COLUMNS)
+
+
+def test_equality_and_assignment(db):
+    item = _fresh(db, columns=LIST_COLUMNS)
+    assert item == {**db.get_item(1, columns=LIST_COLUMNS)}
+    item = _fresh(db, columns=LIST_COLUMNS)
+    item["tags"] = ["B1"]
+    assert item["tags"] == ["B1"] and "tags" not in item._pending
+
+
+def test_projection_reads_only_requested_columns(db):
+    assert "embedding" not in db.get_item(1, columns=LIST_COLUMNS)
+    assert db.get_item(1, columns=("content", "tags")) == {"content": "Hund", "tags": DECODED["tags"]}
+    for item in db.get_all_items(columns=LIST_COLUMNS) + db.search_items("Hund", columns=LIST_COLUMNS):
+        assert "embedding" not in item
+    assert db.get_item(1)["embedding"] == b"\x01\x02"
+    with pytest.raises(ValueError):
+        db.get_item(1, columns=("content", "password"))
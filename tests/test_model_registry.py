@@ -0,0 +1,149 @@
+import threading
+
+import pytest
+
+import model_registry
+from model_registry import EMBEDDING_MANAGER, EMBEDDING_MODEL, NLP_PARSER
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """A fresh registry state for each test; the module globals are restored afterwards"""
+    monkeypatch.setattr(model_registry, "_models", {})
+    monkeypatch.setattr(model_registry, "_errors", {})
+    monkeypatch.setattr(model_registry, "_memory", {})
+    monkeypatch.setattr(model_registry, "_timings", {})
+    monkeypatch.setattr(model_registry, "_status", {name: model_registry.PENDING
+                                                    for name in (NLP_PARSER, EMBEDDING_MANAGER, EMBEDDING_MODEL)})
+    monkeypatch.setattr(model_registry, "_warmup_thread", None)
+    monkeypatch.setattr(model_registry, "_warmup_done", threading.Event())
+    return model_registry
+
+
+def test_concurrent_sessions_share_one_load():
+    calls, started, release = [], threading.Event(), threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(model_registry._get_or_load(NLP_PARSER, loader)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    assert model_registry.status(NLP_PARSER) == model_registry.LOADING
+    assert not model_registry.is_ready(NLP_PARSER)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
+    assert model_registry.is_ready(NLP_PARSER)
+    assert model_registry.loaded_models() == [NLP_PARSER]
+
+
+def test_failed_load_is_cached():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        raise OSError("model missing")
+
+    for _ in range(2):
+        with pytest.raises(OSError):
+            model_registry._get_or_load(NLP_PARSER, loader)
+    assert calls == [1]
+    assert model_registry.status(NLP_PARSER) == model_registry.FAILED
+    assert isinstance(model_registry.error(NLP_PARSER), OSError)
+    assert model_registry.loaded_models() == []
+
+
+def test_memory_report_counts_the_similarity_matrix():
+    np = pytest.importorskip("numpy")
+    from embedding_utils import EmbeddingManager, encode_embedding
+
+    assert model_registry.memory_report() == {"total": 0}
+    manager = model_registry._get_or_load(EMBEDDING_MANAGER, EmbeddingManager)
+    vectors = np.ones((10, 16), dtype=np.float32)
+    manager.get_index([{"id": i, "tags": [], "embedding": encode_embedding(v)} for i, v in enumerate(vectors)])
+    report = model_registry.memory_report()
+    assert report["similarity_index"] == 10 * 16 * 4
+    assert report[EMBEDDING_MANAGER] == 0   # the SentenceTransformer is not loaded yet
+    assert report["total"] == sum(value for key, value in report.items() if key != "total")
+
+
+class _SlowManager:
+    """Loads its model only once released, like EmbeddingManager.get_model"""
+
+    def __init__(self, release):
+        self.release = release
+        self.model = None
+
+    def get_model(self):
+        self.release.wait(5)
+        self.model = object()
+        return self.model
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """Warm-up with fake loaders gated on an event; placeholder modules keep spaCy and torch from being imported"""
+    import sys
+    import types
+
+    for name in ("spacy", "torch"):
+        monkeypatch.setitem(sys.modules, name, types.ModuleType(name))
+    release, started = threading.Event(), threading.Event()
+    manager = _SlowManager(release)
+
+    def load_parser():
+        started.set()
+        release.wait(5)
+        return "parser"
+
+    monkeypatch.setattr(model_registry, "get_nlp_parser", lambda: model_registry._get_or_load(NLP_PARSER, load_parser))
+    monkeypatch.setattr(model_registry, "get_embedding_manager",
+                        lambda: model_registry._get_or_load(EMBEDDING_MANAGER, lambda: manager))
+    return types.SimpleNamespace(release=release, started=started)
+
+
+def test_warmup_runs_in_the_background(fake_models):
+    model_registry.start_warmup()
+    thread = model_registry._warmup_thread
+    # Returns while the models are still loading
+    assert thread.is_alive()
+    assert model_registry.is_loading()
+    assert fake_models.started.wait(5)
+    assert not model_registry.wait_ready(timeout=0.05)
+    assert model_registry.status(NLP_PARSER) == model_registry.LOADING
+    assert model_registry.status(EMBEDDING_MODEL) == model_registry.PENDING
+
+    fake_models.release.set()
+    assert model_registry.wait_ready(timeout=5)
+    assert model_registry._warmup_thread is thread
+    assert not model_registry.is_loading()
+    assert all(model_registry.is_ready(name) for name in (NLP_PARSER, EMBEDDING_MANAGER, EMBEDDING_MODEL))
+    assert set(model_registry.startup_timings()) == {
+        "import_spacy", "load_spacy_model", "create_embedding_manager", "import_torch", "load_embedding_model"
+    }
+    # A second start is a no-op
+    model_registry.start_warmup()
+    assert model_registry._warmup_thread is thread
+
+
+def test_warmup_reports_a_failed_model(fake_models, monkeypatch):
+    def broken():
+        raise OSError("de_core_news_sm not installed")
+
+    monkeypatch.setattr(model_registry, "get_nlp_parser", lambda: model_registry._get_or_load(NLP_PARSER, broken))
+    fake_models.release.set()
+    assert model_registry.wait_ready(timeout=5)
+    assert model_registry.status(NLP_PARSER) == model_registry.FAILED
+    assert isinstance(model_registry.error(NLP_PARSER), OSError)
+    # The embedding model still loads
+    assert model_registry.is_ready(EMBEDDING_MODEL)
+    assert not model_registry.is_loading()
@@ -0,0 +1,139 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import embedding_utils  # noqa: E402
+from database import Database  # noqa: E402
+from database_memory import MemoryDB  # noqa: E402
+from embedding_utils import (  # noqa: E402
+    EmbeddingManager, encode_embedding, get_related_items, rebuild_neighbor_lists, update_neighbor_lists,
+)
+
+TAGS = ["A1", "A2", "B1"]
+
+
+def _items(n, seed=0, start=1, dim=16):
+    rng = np.random.default_rng(seed)
+    items = []
+    for i in range(n):
+        item_id = start + i
+        items.append({
+            "id": item_id,
+            "type": "Word",
+            "content": f"wort {item_id}",
+            "translation": f"word {item_id}",
+            "tags": [TAGS[item_id % 3]] if item_id % 4 else [],
+            "embedding": None if item_id % 17 == 0 else encode_embedding(rng.normal(size=dim).astype(np.float32)),
+        })
+    return items
+
+
+def _expected(items, manager, top_k=5):
+    return {
+        item["id"]: [(related["id"], score) for related, score in get_related_items(item, items, top_k, manager)]
+        for item in items
+    }
+
+
+def _assert_lists_match(got, expected):
+    assert set(got) == set(expected)
+    for item_id, pairs in expected.items():
+        assert [rid for rid, _ in got[item_id]] == [rid for rid, _ in pairs], item_id
+        np.testing.assert_allclose([s for _, s in got[item_id]], [s for _, s in pairs], rtol=1e-5)
+
+
+class _RecordingDB(MemoryDB):
+    def __init__(self):
+        super().__init__()
+        self.list_reads = []
+
+    def get_related_lists(self, item_ids=None, referencing=None):
+        lists = super().get_related_lists(item_ids, referencing)
+        self.list_reads.append(len(lists))
+        return lists
+
+
+@pytest.mark.parametrize("block_elements", [1 << 22, 100])
+def test_rebuild_matches_get_related_items(monkeypatch, block_elements):
+    monkeypatch.setattr(embedding_utils, "NEIGHBOR_BLOCK_ELEMENTS", block_elements)
+    items = _items(300)
+    manager = EmbeddingManager()
+    db = MemoryDB()
+    rebuild_neighbor_lists(db, items, manager)
+    _assert_lists_match(db.get_related_lists(), _expected(items, manager))
+
+
+def test_rebuild_matches_in_int8_mode():
+    items = _items(300)
+    blobs = {item["id"]: item["embedding"] for item in items}
+    exact = EmbeddingManager()
+    quantized = EmbeddingManager(index_precision="int8", embedding_source=lambda ids: {i: blobs[i] for i in ids})
+    db = MemoryDB()
+    rebuild_neighbor_lists(db, items, quantized)
+    _assert_lists_match(db.get_related_lists(), _expected(items, exact))
+
+
+def test_update_matches_full_rebuild_and_reads_only_affected_lists():
+    items = _items(600)
+    manager = EmbeddingManager()
+    db = _RecordingDB()
+    rebuild_neighbor_lists(db, items, manager)
+
+    added = _items(5, seed=1, start=601)
+    edited = dict(items[10], tags=["B1"], embedding=_items(1, seed=3)[0]["embedding"])
+    all_items = [edited if item["id"] == edited["id"] else item for item in items] + added
+    update_neighbor_lists(db, added + [edited], all_items, manager)
+
+    _assert_lists_match(db.get_related_lists(), _expected(all_items, manager))
+    assert db.list_reads[0] < len(items) // 2
+
+
+def test_update_handles_items_without_embeddings():
+    items = _items(120)
+    manager = EmbeddingManager()
+    db = MemoryDB()
+    rebuild_neighbor_lists(db, items, manager)
+    added = [dict(item, embedding=None, tags=["A2"]) for item in _items(3, seed=2, start=121)]
+    all_items = items + added
+    update_neighbor_lists(db, added, all_items, manager)
+    _assert_lists_match(db.get_related_lists(), _expected(all_items, manager))
+
+
+def test_sqlite_marks_computed_empty_lists():
+    db = Database(":memory:")
+    first = db.add_item("Word", "Hund", "dog", [], [])
+    second = db.add_item("Word", "Katze", "cat", [], [])
+    assert db.get_related(first) is None
+    db.set_related_many({first: [], second: [(first, 0.5)]})
+    assert db.get_related(first) == []
+    assert [(item["id"], score) for item, score in db.get_related(second)] == [(first, 0.5)]
+    assert db.get_related_lists() == {first: [], second: [(first, 0.5)]}
+    assert db.get_related_lists(referencing=[first]) == {second: [(first, 0.5)]}
+    assert db.get_related_lists(item_ids=[first]) == {first: []}
+    assert db.delete_related(first) == [second]
+    assert db.get_related(second) == []
+
+
+@pytest.mark.parametrize("make_db", [lambda: Database(":memory:"), MemoryDB])
+def test_delete_item_drops_related_rows(make_db):
+    db = make_db()
+    first, second, third = (db.add_item("Word", word, "", [], []) for word in ("Hund", "Katze", "Maus"))
+    db.set_related_many({first: [(second, 0.9)], second: [(first, 0.9), (third, 0.4)], third: [(first, 0.2)]})
+    assert sorted(db.delete_item(first)) == [second, third]
+    assert db.get_related_lists() == {second: [(third, 0.4)], third: []}
+    assert db.get_related(second) is not None and db.get_related(first) is None
+
+
+def test_supabase_related_lists_are_paged_past_max_rows():
+    pytest.importorskip("supabase")
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalSupabaseClient
+
+    db = SupabaseDB(client=LocalSupabaseClient(max_rows=7))
+    lists = {item_id: [(item_id + 1, 0.9), (item_id + 2, 0.8)] for item_id in range(1, 40)}
+    lists[40] = []
+    db.set_related_many(lists)
+    assert db.get_related_lists() == lists
+    assert db.get_related_lists(item_ids=[40], referencing=[3]) == {1: lists[1], 2: lists[2], 40: []}
+    assert db.get_related(41) is None
+    assert db.get_related(40) == []
@@ -0,0 +1,132 @@
+import pytest
+
+from database import Database
+
+
+RANKED = [1, 2, 3, 4, 5, 6, 7]
+
+
+def _walk(page, page_size=2, **kwargs):
+    ids, cursor, pages = [], None, 0
+    while True:
+        items, cursor = page(page_size=page_size, cursor=cursor, **kwargs)
+        ids.extend(item["id"] for item in items)
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+
+def _ranked_items():
+    # The keyword's share of the words decides the relevance; ids 1..7 are
+    # inserted most relevant first so relevance and recency disagree
+    items = []
+    for repeat in range(7, 0, -1):
+        items.append({"type": "Word", "content": " ".join(["hund"] * repeat + ["x"] * (8 - repeat)),
+                      "translation": "dog", "tags": ["A1"] if repeat % 2 else []})
+    items.append({"type": "Word", "content": "katze", "translation": "cat"})
+    return items
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    db = Database(str(tmp_path / "paging.db"))
+    if not db.fts_enabled:
+        db.close()
+        pytest.skip("SQLite without FTS5")
+    db.add_items(_ranked_items())
+    yield db
+    db.close()
+
+
+def test_sqlite_keyword_pages_follow_bm25(sqlite_db):
+    ids, pages = _walk(sqlite_db.search_items_page, keyword="hund")
+    assert ids == RANKED
+    assert ids == [item["id"] for item in sqlite_db.search_items("hund")]
+    assert pages == 4
+    first, cursor = sqlite_db.search_items_page("hund", page_size=2)
+    assert isinstance(cursor[0], float) and cursor[1] == 2
+
+
+def test_sqlite_keyword_pages_with_filters(sqlite_db):
+    ids, _ = _walk(sqlite_db.search_items_page, keyword="hund", tag_filter="A1")
+    assert ids == [1, 3, 5, 7]
+
+
+def test_sqlite_listing_pages_stay_by_recency(sqlite_db):
+    ids, _ = _walk(sqlite_db.get_items_page, page_size=3)
+    assert ids == list(range(8, 0, -1))
+    # Substring-only matches page after the FTS hits
+    ids, _ = _walk(sqlite_db.search_items_page, keyword="atz")
+    assert ids == [8]
+
+
+def test_supabase_keyword_pages_follow_rank():
+    pytest.importorskip("supabase")
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalSupabaseClient
+
+    db = SupabaseDB(client=LocalSupabaseClient())
+    db.add_items(_ranked_items())
+    ids, pages = _walk(db.search_items_page, keyword="hund", columns=("content",))
+    assert ids == RANKED
+    assert pages == 4
+    ids, _ = _walk(db.search_items_page, keyword="hund", tag_filter="A1")
+    assert ids == [1, 3, 5, 7]
+
+
+def test_supabase_without_search_rpc_pages_by_recency():
+    pytest.importorskip("supabase")
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalSupabaseClient
+
+    client = LocalSupabaseClient()
+    del client.functions["search_entries"]
+    db = SupabaseDB(client=client)
+    db.add_items(_ranked_items())
+    with pytest.warns(RuntimeWarning, match="search_entries"):
+        ids, _ = _walk(db.search_items_page, keyword="hund")
+    assert ids == RANKED[::-1]
+    assert "search_entries" in db._missing_functions
+
+
+def _gappy(db, n=25):
+    # Deleted ids leave gaps, so pages can't be addressed by id arithmetic
+    ids, _ = db.add_items([{"type": "Word", "content": f"w{i}", "tags": ["A1"]} for i in range(n)])
+    for item_id in ids[3::4]:
+        db.delete_item(item_id)
+    return [item_id for item_id in ids if item_id not in ids[3::4]]
+
+
+def _assert_chunks(db, expected, chunk_size, **kwargs):
+    chunks = list(db.iter_item_chunks(chunk_size, columns=("content",), **kwargs))
+    assert [item["id"] for chunk in chunks for item in chunk] == expected
+    assert all(0 < len(chunk) <= chunk_size for chunk in chunks)
+    assert all(set(item) == {"id", "content"} for chunk in chunks for item in chunk)
+    assert [item["id"] for item in db.iter_items(chunk_size, columns=("id",), **kwargs)] == expected
+
+
+def test_sqlite_iter_items_pages_by_id(tmp_path):
+    db = Database(str(tmp_path / "iter.db"))
+    expected = _gappy(db)
+    for chunk_size in (1, 4, 18, 100):
+        _assert_chunks(db, expected, chunk_size)
+    db.close()
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_supabase_iter_items_survives_max_rows(prefetch):
+    pytest.importorskip("supabase")
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalSupabaseClient
+
+    # The server caps every response at 3 rows, below the requested chunk size
+    db = SupabaseDB(client=LocalSupabaseClient(max_rows=3))
+    expected = _gappy(db)
+    for chunk_size in (2, 3, 10):
+        requests = db.payload_stats()["requests"]
+        _assert_chunks(db, expected, chunk_size, prefetch=prefetch)
+        # One request per page plus the empty page that ends each scan, twice
+        per_scan = -(-len(expected) // min(chunk_size, 3)) + 1
+        assert db.payload_stats()["requests"] - requests == 2 * per_scan
+    assert len(db.get_all_items(columns=("content",))) == len(expected)
+    assert [item["id"] for item in db.get_all_items(columns=("id",))] == expected[::-1]
@@ -0,0 +1,75 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from embedding_utils import EmbeddingManager, encode_embedding, get_related_items  # noqa: E402
+
+
+def _items(n=60, dim=16, seed=1):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    items = [
+        {"id": i + 1, "type": "Word", "tags": ["A1"] if i % 4 == 0 else ["B1"], "embedding": encode_embedding(v)}
+        for i, v in enumerate(vectors)
+    ]
+    return items, vectors
+
+
+def _brute_force(items, vectors, current, top_k, tags=None):
+    """The per-item cosine loop the matrix top-k replaced"""
+    query = vectors[current["id"] - 1]
+    scored = []
+    for item, vector in zip(items, vectors):
+        if item["id"] == current["id"] or (tags and not set(item["tags"]) & tags):
+            continue
+        scored.append((item["id"], float(query @ vector / (np.linalg.norm(query) * np.linalg.norm(vector)))))
+    scored.sort(key=lambda pair: -pair[1])
+    return scored[:top_k]
+
+
+def test_matches_per_item_cosine_loop():
+    items, vectors = _items()
+    manager = EmbeddingManager()
+    for current in items[:10]:
+        related = get_related_items(current, items, 5, manager)
+        expected = _brute_force(items, vectors, current, 5, set(current["tags"]))
+        assert [item["id"] for item, _ in related] == [item_id for item_id, _ in expected]
+        np.testing.assert_allclose([score for _, score in related], [score for _, score in expected], rtol=1e-5)
+        assert all(set(item["tags"]) & set(current["tags"]) for item, _ in related)
+
+
+def test_without_tags_searches_the_whole_collection():
+    items, vectors = _items()
+    for item in items:
+        item["tags"] = []
+    related = get_related_items(items[0], items, 7, EmbeddingManager())
+    assert [item["id"] for item, _ in related] == [item_id for item_id, _ in _brute_force(items, vectors, items[0], 7)]
+
+
+def test_matrix_is_reused_until_the_collection_changes():
+    items, _ = _items(20)
+    manager = EmbeddingManager()
+    get_related_items(items[0], items, 3, manager)
+    index = manager._index
+    get_related_items(items[1], items, 3, manager)
+    assert manager._index is index
+    assert index.matrix.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(index.matrix, axis=1), 1.0, rtol=1e-5)
+
+    changed = [dict(item) for item in items]
+    changed[4]["embedding"] = items[5]["embedding"]
+    get_related_items(changed[0], changed, 3, manager)
+    assert manager._index is not index
+
+
+def test_items_without_embeddings():
+    items, _ = _items(12)
+    items[4]["embedding"] = None   # tag A1, like items[0]
+    related = get_related_items(items[0], items, 5, EmbeddingManager())
+    assert (items[4]["id"], 0.5) in [(item["id"], score) for item, score in related]
+
+    # A current item without an embedding falls back to tag matches
+    related = get_related_items(items[4], items, 5, EmbeddingManager())
+    assert [item["id"] for item, _ in related] == [1, 9]
+    assert all(score == 1.0 for _, score in related)
+    current = dict(items[4], tags=[])
+    assert get_related_items(current, items, 5, EmbeddingManager()) == []
@@ -0,0 +1,110 @@
+import collections
+import random
+
+import pytest
+
+from database import Database
+from sampling import bucket_weighted_sample, rejection_weighted_sample, review_weight, uniform_id_sample
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "sampling.db"))
+    yield db
+    db.close()
+
+
+def _clustered(db, n, keep):
+    """n items, then delete every id not in keep so the survivors form clusters"""
+    db.add_items([{"type": "Word", "content": f"w{i}", "tags": ["A1"] if i % 2 else ["B1"]} for i in range(n)])
+    db.c.execute(f"DELETE FROM items WHERE id NOT IN ({', '.join(map(str, keep))})")
+    db.c.execute(f"DELETE FROM item_tags WHERE item_id NOT IN ({', '.join(map(str, keep))})")
+    db.conn.commit()
+
+
+def _frequencies(db, draws, **kwargs):
+    random.seed(0)
+    counts = collections.Counter()
+    for _ in range(draws):
+        counts.update(item["id"] for item in db.get_random_items(1, columns=("id",), **kwargs))
+    return counts
+
+
+def _assert_uniform(counts, ids, draws):
+    assert set(counts) == set(ids)
+    expected = draws / len(ids)
+    # Chi-square per degree of freedom is about 1 for a uniform sample; probing
+    # that maps gaps to the next id gives the ids after a gap many times their share
+    chi_square = sum((counts[item_id] - expected) ** 2 / expected for item_id in ids) / (len(ids) - 1)
+    assert chi_square < 2.0, counts
+    assert max(counts.values()) < 1.5 * expected, counts
+
+
+@pytest.mark.parametrize("keep", [
+    list(range(1, 11)) + list(range(391, 401)),     # sparse: two clusters, rank sampling
+    list(range(1, 301)) + list(range(331, 341)),    # dense: probing, a gap of 30 before 331
+])
+def test_uniform_sampling_on_clustered_ids(db, keep):
+    _clustered(db, max(keep), keep)
+    draws = 150 * len(keep)
+    _assert_uniform(_frequencies(db, draws), keep, draws)
+    tagged = [item_id for item_id in keep if item_id % 2 == 0]     # content w{id - 1}, odd i
+    _assert_uniform(_frequencies(db, draws // 2, tag_filter="A1"), tagged, draws // 2)
+
+
+def test_sample_without_duplicates_covers_small_sets(db):
+    _clustered(db, 50, [3, 4, 40, 41, 42])
+    for weighted in (False, True):
+        sample = db.get_random_items(10, columns=("id",), weighted=weighted)
+        assert sorted(item["id"] for item in sample) == [3, 4, 40, 41, 42]
+
+
+def test_weighted_sampling_favours_fewer_reviews(db):
+    _clustered(db, 200, list(range(1, 11)) + list(range(191, 201)))
+    db.update_reviews({item_id: (3, "2000-01-01T00:00:00") for item_id in range(191, 201)})
+    counts = _frequencies(db, 5000, weighted=True)
+    fresh = sum(counts[item_id] for item_id in range(1, 11))
+    reviewed = sum(counts[item_id] for item_id in range(191, 201))
+    # Weights 1 and 1/4
+    assert 3.3 < fresh / reviewed < 4.8
+    assert set(counts) == set(range(1, 11)) | set(range(191, 201))
+
+
+def _exact_first_draw(weights):
+    total = sum(weights.values())
+    return {key: weight / total for key, weight in weights.items()}
+
+
+def test_weighted_helpers_match_the_target_distribution():
+    weights = {key: review_weight(key % 4) for key in range(12)}
+    expected = _exact_first_draw(weights)
+    keys = sorted(weights)
+    rng = random.Random(1)
+    buckets = {}
+    for key in keys:
+        count, weight = buckets.get(key % 4, (0, weights[key]))
+        buckets[key % 4] = (count + 1, weight)
+    members = {reviews: [key for key in keys if key % 4 == reviews] for reviews in buckets}
+
+    rejection = collections.Counter()
+    bucket = collections.Counter()
+    draws = 20000
+    for _ in range(draws):
+        rejection.update(rejection_weighted_sample(1, lambda: rng.choice(keys), weights.get, 1.0, rng))
+        bucket.update(bucket_weighted_sample(1, buckets, lambda reviews, rank: members[reviews][rank], rng))
+    for counts in (rejection, bucket):
+        for key, probability in expected.items():
+            assert abs(counts[key] / draws - probability) < 0.015
+
+    # Without replacement: every key once when k covers the set
+    assert sorted(bucket_weighted_sample(20, buckets, lambda reviews, rank: members[reviews][rank], rng)) == keys
+
+
+def test_uniform_id_sample_rejects_gap_probes():
+    ids = set(range(1, 6)) | {1000}
+    rng = random.Random(2)
+    counts = collections.Counter()
+    ordered = sorted(ids)
+    for _ in range(6000):
+        counts.update(uniform_id_sample(1, len(ids), 1, 1000, ids.__contains__, ordered.__getitem__, rng))
+    assert all(800 < counts[item_id] < 1200 for item_id in ids), counts
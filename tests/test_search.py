@@ -0,0 +1,121 @@
+import sqlite3
+
+import pytest
+
+from database import Database, highlight_snippet, register_functions
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "search.db"))
+    if not db.fts_enabled:
+        db.close()
+        pytest.skip("SQLite without FTS5")
+    db.add_items([
+        {"type": "Word", "content": "Straße", "translation": "street"},
+        {"type": "Word", "content": "über", "translation": "over"},
+        {"type": "Phrase", "content": "zu Hause", "translation": "at home"},
+        {"type": "Word", "content": "Hausaufgabe", "translation": "homework"},
+        {"type": "Word", "content": "Mäuse", "translation": "mice"},
+        {"type": "Word", "content": "Bahnhofstraße", "translation": "station road"},
+        {"type": "Phrase", "content": "100% sicher", "translation": "absolutely sure"},
+        {"type": "Phrase", "content": "1000 Euro", "translation": "a thousand euros"},
+    ])
+    yield db
+    db.close()
+
+
+def _contents(items):
+    return sorted(item["content"] for item in items)
+
+
+@pytest.mark.parametrize("keyword, expected", [
+    ("strasse", ["Bahnhofstraße", "Straße"]),
+    ("STRASSE", ["Bahnhofstraße", "Straße"]),
+    ("straße", ["Bahnhofstraße", "Straße"]),
+    ("ueber", ["über"]),
+    ("über", ["über"]),
+    ("haus", ["Hausaufgabe", "zu Hause"]),
+])
+def test_fts_folds_umlauts_and_prefixes(db, keyword, expected):
+    assert _contents(db.search_items(keyword)) == expected
+
+
+@pytest.mark.parametrize("keyword, expected", [
+    ("ause", ["Mäuse", "zu Hause"]),
+    ("äuse", ["Mäuse"]),
+    ("uber", ["über"]),
+    ("aus gabe", ["Hausaufgabe"]),
+    ("aus", ["Hausaufgabe", "Mäuse", "zu Hause"]),
+    ("100%", ["100% sicher"]),
+    ("100", ["100% sicher", "1000 Euro"]),
+    ("200%", []),
+])
+def test_infix_matches(db, keyword, expected):
+    assert _contents(db.search_items(keyword)) == expected
+    items, cursor = db.search_items_page(keyword, page_size=1)
+    pages = list(items)
+    while cursor is not None:
+        items, cursor = db.search_items_page(keyword, page_size=1, cursor=cursor)
+        pages.extend(items)
+    assert _contents(pages) == expected
+
+
+def test_infix_matches_respect_filters(db):
+    assert _contents(db.search_items("aus", type_filter="Word")) == ["Hausaufgabe", "Mäuse"]
+
+
+def test_fts_hits_rank_before_infix_matches(db):
+    # "straße" is a word prefix of Straße (FTS) but only a substring of Bahnhofstraße
+    assert [item["content"] for item in db.search_items("straße")] == ["Straße", "Bahnhofstraße"]
+    first, cursor = db.search_items_page("straße", page_size=1)
+    assert [item["content"] for item in first] == ["Straße"] and cursor[0] <= 0
+    second, cursor = db.search_items_page("straße", page_size=1, cursor=cursor)
+    assert [item["content"] for item in second] == ["Bahnhofstraße"] and cursor is None
+
+
+def test_snippet_highlights_infix_matches():
+    assert highlight_snippet("zu Hause", "ause") == "zu **Hause**"
+    assert highlight_snippet("über alles", "uber") == "**über** alles"
+
+
+def test_external_connection_needs_registered_functions(db, tmp_path):
+    path = str(tmp_path / "search.db")
+    conn = sqlite3.connect(path)
+    with pytest.raises(sqlite3.OperationalError, match="de_fold"):
+        conn.execute("INSERT INTO items (type, content, translation) VALUES ('Word', 'Fluß', 'river')")
+    conn.rollback()
+    register_functions(conn)
+    conn.execute("INSERT INTO items (type, content, translation) VALUES ('Word', 'Fluß', 'river')")
+    conn.commit()
+    conn.close()
+    assert _contents(db.search_items("fluss")) == ["Fluß"]
+
+
+@pytest.mark.parametrize("keyword, expected", [
+    ("100%", ["100% sicher"]),
+    ("a_b", ["a_b"]),
+    ('"hi"', ['say "hi"']),
+    ("k\\s", ["back\\slash"]),
+    ("o,(p", ["o,(p"]),
+])
+def test_supabase_keyword_filter_matches_literally(keyword, expected):
+    pytest.importorskip("supabase")
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalSupabaseClient
+
+    db = SupabaseDB(client=LocalSupabaseClient())
+    db.add_items([{"type": "Word", "content": content, "translation": ""}
+                  for content in ["100% sicher", "1000 Euro", "a_b", "axb", 'say "hi"', "back\\slash", "backslash",
+                                  "o,(p"]])
+    assert _contents(db.search_items(keyword)) == expected
+
+
+def test_local_like_honours_backslash_escapes():
+    from supabase_local import LocalAPIError, _like
+
+    assert _like("100\\%", "100%") and not _like("100\\%", "1000")
+    assert _like("a\\_b", "a_b") and not _like("a\\_b", "axb")
+    assert _like("%k\\\\s%", "back\\slash") and not _like("%k\\\\s%", "backslash")
+    with pytest.raises(LocalAPIError):
+        _like("abc\\", "abc")
@@ -0,0 +1,79 @@
+import datetime
+
+import pytest
+
+from database import Database
+from database_memory import MemoryDB
+
+
+ITEMS = [
+    {"type": "Word", "content": "Hund", "tags": ["A1", "Tiere"]},
+    {"type": "Word", "content": "Katze", "tags": ["A1", "Tiere", "A1"]},
+    {"type": "Word", "content": "Haus", "tags": []},
+    {"type": "Phrase", "content": "zu Hause", "tags": ["A1"]},
+    {"type": "Phrase", "content": "nach Hause"},
+    {"type": "Sentence", "content": "Der Hund bellt.", "tags": ["B1"]},
+]
+
+
+def _supabase(**kwargs):
+    pytest.importorskip("supabase")
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalSupabaseClient
+
+    client = LocalSupabaseClient(**kwargs)
+    if kwargs:
+        # The fallback path: no item_stats function, and pages smaller than the table
+        del client.functions["item_stats"]
+    return SupabaseDB(client=client)
+
+
+@pytest.fixture(params=[
+    "memory", "sqlite", "supabase",
+    pytest.param("supabase-fallback", marks=pytest.mark.filterwarnings("ignore:.*item_stats:RuntimeWarning")),
+])
+def db(request):
+    db = {
+        "memory": MemoryDB,
+        "sqlite": lambda: Database(":memory:"),
+        "supabase": _supabase,
+        "supabase-fallback": lambda: _supabase(max_rows=2),
+    }[request.param]()
+    yield db
+    db.close()
+
+
+def test_empty_stats(db):
+    assert db.get_stats() == {"total": 0, "by_type": {}, "by_tag": {}, "reviewed_today": 0, "never_reviewed": 0}
+
+
+def test_stats_counts(db):
+    ids, _ = db.add_items(ITEMS)
+    db.update_review(ids[0])
+    db.update_review(ids[0])
+    db.update_review(ids[3])
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat() + "T12:00:00"
+    db.update_reviews({ids[5]: (1, yesterday)})
+    assert db.get_stats() == {
+        "total": 6,
+        "by_type": {"Word": 3, "Phrase": 2, "Sentence": 1},
+        # A tag repeated on one item counts once
+        "by_tag": {"A1": 3, "B1": 1, "Tiere": 2},
+        "reviewed_today": 2,
+        "never_reviewed": 3,
+    }
+    db.delete_item(ids[1])
+    stats = db.get_stats()
+    assert stats["total"] == 5 and stats["by_type"]["Word"] == 2 and stats["by_tag"] == {"A1": 2, "B1": 1, "Tiere": 1}
+
+
+def test_sqlite_stats_aggregate_in_the_database():
+    db = Database(":memory:")
+    db.add_items(ITEMS)
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    db.get_stats()
+    db.conn.set_trace_callback(None)
+    assert statements and all("COUNT(" in statement for statement in statements)
+    assert not any("embedding" in statement for statement in statements)
+    db.close()
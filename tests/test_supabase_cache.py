@@ -0,0 +1,52 @@
+import sys
+
+from database import LIST_COLUMNS
+from database_memory import MemoryDB
+from supabase_cache import CachedSupabaseDB
+
+
+def _db(n=10, **kwargs):
+    backend = MemoryDB()
+    backend.add_items([
+        {"type": "Word", "content": f"w{i}", "tags": ["A1"], "embedding": bytes([i]) * 1000} for i in range(n)
+    ])
+    return CachedSupabaseDB(backend, **kwargs)
+
+
+def test_hits_return_shallow_copies():
+    db = _db()
+    first = db.search_items(tag_filter="A1", columns=LIST_COLUMNS)
+    first.reverse()
+    first[0]["content"] = "changed"
+    first[0]["snippet"] = "extra"
+    second = db.search_items(tag_filter="A1", columns=LIST_COLUMNS)
+    assert db.hits == 1
+    assert second is not first and second[0] is not first[-1]
+    assert [item["content"] for item in second] == [f"w{i}" for i in range(9, -1, -1)]
+    assert "snippet" not in second[0]
+    # Values inside an item are shared with the cache rather than deep-copied
+    assert second[0]["tags"] is db.search_items(tag_filter="A1", columns=LIST_COLUMNS)[0]["tags"]
+
+    page, cursor = db.get_items_page(page_size=3, columns=("id",))
+    page.append({"id": -1})
+    assert len(db.get_items_page(page_size=3, columns=("id",))[0]) == 3
+
+
+def test_embedding_cache_is_bounded_by_bytes():
+    size = sys.getsizeof(bytes(1000))
+    db = _db(max_embedding_bytes=4 * size)
+    fetched = db.get_embeddings(list(range(1, 11)))
+    assert len(fetched) == 10
+    stats = db.cache_stats()
+    assert stats["embeddings"] == 4 and stats["embedding_bytes"] == 4 * size
+    # The most recently fetched ids stay cached
+    misses = db.misses
+    db.get_embeddings([7, 8, 9, 10])
+    assert db.misses == misses
+
+    db.update_item(10, embedding=b"x" * 10)
+    assert db.cache_stats()["embedding_bytes"] == 3 * size
+    assert db.get_embeddings([10]) == {10: b"x" * 10}
+    assert db.cache_stats()["embedding_bytes"] == 3 * size + sys.getsizeof(b"x" * 10)
+    db.clear()
+    assert db.cache_stats()["embedding_bytes"] == 0
@@ -0,0 +1,57 @@
+import warnings
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from database_supabase import SupabaseDB  # noqa: E402
+from review_queue import ReviewQueue  # noqa: E402
+from supabase_local import LocalAPIError, LocalSupabaseClient  # noqa: E402
+
+
+def _db(client):
+    db = SupabaseDB(client=client)
+    db.add_items([{"type": "Word", "content": f"w{i}"} for i in range(3)])
+    return db
+
+
+def _counts(db):
+    return [db.get_item(i, columns=("review_count",))["review_count"] for i in (1, 2, 3)]
+
+
+def test_missing_function_falls_back_and_warns_once():
+    client = LocalSupabaseClient()
+    del client.functions["increment_reviews"]
+    db = _db(client)
+    with pytest.warns(RuntimeWarning, match="increment_reviews") as record:
+        db.update_reviews({1: (2, "2000-01-01T00:00:00")})
+        db.update_reviews({1: (1, "2000-01-02T00:00:00"), 3: (1, "2000-01-02T00:00:00")})
+    assert len([w for w in record if "increment_reviews" in str(w.message)]) == 1
+    assert _counts(db) == [3, 0, 1]
+
+
+def test_other_errors_are_raised_without_fallback():
+    client = LocalSupabaseClient()
+
+    def failing(client, reviews):
+        raise LocalAPIError("canceling statement due to statement timeout")
+
+    client.register_function("increment_reviews", failing)
+    db = _db(client)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        with pytest.raises(LocalAPIError, match="timeout"):
+            db.update_reviews({1: (1, "2000-01-01T00:00:00")})
+    assert _counts(db) == [0, 0, 0]
+    assert not db._missing_functions
+
+    # The write-behind queue keeps the batch and applies it once the server recovers
+    queue = ReviewQueue(db, flush_interval=3600)
+    try:
+        queue.mark(2)
+        assert queue.flush() == 0 and queue.pending() == 1
+        client.functions["increment_reviews"] = LocalSupabaseClient().functions["increment_reviews"]
+        assert queue.flush() == 1
+    finally:
+        queue.close()
+    assert _counts(db) == [0, 1, 0]
@@ -0,0 +1,61 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("supabase")
+
+import database_supabase  # noqa: E402
+from database_supabase import PAYLOAD_SAMPLE_EVERY, SupabaseDB  # noqa: E402
+from supabase_local import LocalSupabaseClient  # noqa: E402
+
+
+def _db():
+    db = SupabaseDB(client=LocalSupabaseClient())
+    db.add_items([{"type": "Word", "content": f"w{i}"} for i in range(20)])
+    return db
+
+
+def test_payload_is_sampled_without_http_sizes(monkeypatch):
+    db = _db()
+    calls = []
+    dumps = json.dumps
+    monkeypatch.setattr(database_supabase.json, "dumps", lambda *a, **kw: calls.append(1) or dumps(*a, **kw))
+    for _ in range(2 * PAYLOAD_SAMPLE_EVERY):
+        db.get_item(1, columns=("id", "content"))
+    stats = db.payload_stats()
+    assert stats["requests"] == 2 * PAYLOAD_SAMPLE_EVERY
+    assert len(calls) == 2
+    size = len(dumps([{"id": 1, "content": "w0"}], separators=(",", ":")))
+    assert stats["payload_bytes"] == 2 * PAYLOAD_SAMPLE_EVERY * size
+
+
+def test_payload_uses_http_response_length(monkeypatch):
+    db = _db()
+    session = SimpleNamespace(event_hooks={"request": [], "response": []})
+    db.supabase.postgrest = SimpleNamespace(session=session)
+    monkeypatch.setattr(database_supabase.json, "dumps", lambda *a, **kw: pytest.fail("json.dumps called"))
+    db.get_item(1)
+    db.get_item(2)
+    assert session.event_hooks["response"] == [db._count_response]
+    for hook in session.event_hooks["response"]:
+        hook(SimpleNamespace(headers={"content-length": "120"}))
+        hook(SimpleNamespace(headers={}, read=lambda: None, content=b"x" * 30))
+    assert db.payload_stats() == {"requests": 2, "payload_bytes": 150}
+
+    # A new session (token refresh) gets the hook too
+    db.supabase.postgrest = SimpleNamespace(session=SimpleNamespace(event_hooks={"response": []}))
+    db.get_item(1)
+    assert db.supabase.postgrest.session.event_hooks["response"] == [db._count_response]
+
+
+def test_request_counter_is_thread_safe():
+    db = _db()
+    threads = [threading.Thread(target=lambda: [db.get_item(1, columns=("id",)) for _ in range(200)])
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert db.payload_stats()["requests"] == 1600
@@ -0,0 +1,184 @@
+import json
+
+import pytest
+
+import model_registry
+from database import Database, ITEM_COLUMNS
+from sync_engine import ENTRIES_WATERMARK, SyncEngine, neighbor_list_refresher
+
+
+@pytest.fixture
+def remote():
+    pytest.importorskip("supabase")
+    from database_supabase import SupabaseDB
+    from supabase_local import LocalSupabaseClient
+    return SupabaseDB(client=LocalSupabaseClient())
+
+
+def _engine(remote, **kwargs):
+    return SyncEngine(Database(":memory:", sync=True), remote, **kwargs)
+
+
+def _remote_row(remote, remote_id):
+    return next((row for row in remote.supabase.tables["entries"] if row["id"] == remote_id), None)
+
+
+def _remote_id(local, item_id):
+    return local.c.execute("SELECT remote_id FROM items WHERE id = ?", (item_id,)).fetchone()[0]
+
+
+def test_sync_bookkeeping_only_in_offline_mode(tmp_path):
+    path = str(tmp_path / "plain.db")
+    db = Database(path)
+    columns = [row[1] for row in db.c.execute("PRAGMA table_info(items)")]
+    assert "remote_id" not in columns and "dirty" not in columns
+    assert not db.sync_enabled
+    item_id = db.add_item("Word", "Hund", "dog", [], [])
+    db.update_item(item_id, translation="hound")
+    db.update_review(item_id)
+    assert db.get_item(item_id, columns=("translation", "review_count")) == {"translation": "hound", "review_count": 1}
+    db.delete_item(item_id)
+    with pytest.raises(ValueError):
+        SyncEngine(db, remote=None)
+    db.close()
+
+    # Once opened for offline mode, every later writer keeps the bookkeeping
+    Database(path, sync=True).close()
+    db = Database(path)
+    assert db.sync_enabled
+    item_id = db.add_item("Word", "Katze", "cat", [], [])
+    db.update_item(item_id, translation="kitten")
+    db.update_review(item_id)
+    assert db.get_unsynced_items()[0][1:] == (None, 1, 1)
+    db.close()
+
+
+def test_pull_resumes_after_the_stored_cursor(remote):
+    remote.add_items([{"type": "Word", "content": f"w{i}"} for i in range(5)])
+    # Rows sharing a timestamp are told apart by id
+    for row in remote.supabase.tables["entries"][:3]:
+        row["updated_at"] = "2026-01-01T00:00:00.000000+00:00"
+    engine = _engine(remote, batch_size=2)
+    assert engine.sync()["pulled"] == 5
+    stamp, last_id = json.loads(engine.local.get_sync_state(ENTRIES_WATERMARK))
+    assert (stamp, last_id) == (remote.supabase.tables["entries"][-1]["updated_at"], 5)
+    # Nothing changed: no row is downloaded again
+    assert engine.sync()["pulled"] == 0
+    remote.update_item(2, translation="zwei")
+    assert engine.sync()["pulled"] == 1
+    assert engine.sync()["pulled"] == 0
+
+
+def test_sync_merges_conflicting_changes(remote):
+    changes = []
+    engine = _engine(remote, on_change=lambda changed, deleted: changes.append((changed, deleted)))
+    local = engine.local
+    edited = local.add_item("Word", "Hund", "dog", [], [])
+    removed = local.add_item("Word", "Katze", "cat", [], [])
+    engine.sync()
+    edited_remote, removed_remote = _remote_id(local, edited), _remote_id(local, removed)
+
+    # Both sides edit and review the same item; the other item is deleted remotely
+    # while it has local edits
+    local.update_item(edited, translation="hound")
+    local.update_review(edited)
+    remote.update_item(edited_remote, translation="the dog")
+    remote.update_reviews({edited_remote: (2, "2026-01-01T00:00:00")})
+    local.update_item(removed, translation="kitten")
+    remote.delete_item(removed_remote)
+
+    # A pull before the push keeps the local edit and merges review counts
+    engine._pull_items()
+    item = local.get_item(edited, columns=("translation", "review_count"))
+    assert item == {"translation": "hound", "review_count": 3}
+
+    changes.clear()
+    result = engine.sync()
+    assert result["deleted_local"] == 1
+    # Last push wins for content, reviews from both sides add up
+    assert _remote_row(remote, edited_remote)["translation"] == "hound"
+    assert _remote_row(remote, edited_remote)["review_count"] == 3
+    assert local.get_item(edited, columns=("translation", "review_count")) == {"translation": "hound",
+                                                                                 "review_count": 3}
+    assert local.get_unsynced_items() == []
+    # The remote delete wins over the local edit
+    assert local.get_item(removed) is None
+    assert _remote_row(remote, removed_remote) is None
+    assert changes == [([edited], [])]
+
+    # Converged: another round moves nothing
+    assert engine.sync() == {"deleted_remote": 0, "pushed": 0, "pulled": 0, "deleted_local": 0}
+
+
+def test_pulled_deletes_drop_related_rows_without_a_callback(remote):
+    engine = _engine(remote)
+    local = engine.local
+    ids = [local.add_item("Word", word, "", [], []) for word in ("eins", "zwei", "drei")]
+    engine.sync()
+    local.set_related_many({ids[0]: [(ids[1], 0.9)], ids[1]: [(ids[0], 0.9), (ids[2], 0.5)], ids[2]: [(ids[1], 0.5)]})
+    remote.delete_item(_remote_id(local, ids[1]))
+    assert engine.sync()["deleted_local"] == 1
+    assert local.get_related_lists() == {ids[0]: [], ids[2]: []}
+    assert local.c.execute("SELECT COUNT(*) FROM related WHERE ? IN (item_id, related_id)", (ids[1],)).fetchone()[0] == 0
+
+
+@pytest.fixture
+def registry_manager():
+    """An EmbeddingManager loaded through model_registry, unloaded afterwards"""
+    pytest.importorskip("numpy")
+    from embedding_utils import EmbeddingManager
+
+    manager = EmbeddingManager()
+    yield lambda: model_registry._get_or_load(model_registry.EMBEDDING_MANAGER, lambda: manager)
+    model_registry._models.pop(model_registry.EMBEDDING_MANAGER, None)
+    model_registry._status[model_registry.EMBEDDING_MANAGER] = model_registry.PENDING
+
+
+def _expected_lists(local, manager):
+    from embedding_utils import get_related_items
+
+    items = local.get_all_items(columns=ITEM_COLUMNS)
+    return {item["id"]: [related["id"] for related, _ in get_related_items(item, items, 5, manager)]
+            for item in items}
+
+
+def test_pulled_rows_get_their_neighbour_lists_recomputed(remote, registry_manager):
+    import numpy as np
+    from embedding_utils import encode_embedding
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(10, 8)).astype(np.float32)
+    remote.add_items([{"type": "Word", "content": f"w{i}", "embedding": encode_embedding(vector)}
+                      for i, vector in enumerate(vectors)])
+    pulls = []
+    local = Database(":memory:", sync=True)
+    engine = SyncEngine(local, remote, on_change=neighbor_list_refresher(local, on_pull=lambda: pulls.append(1)))
+
+    # Before the manager has loaded only on_pull runs
+    engine.sync()
+    assert pulls == [1] and local.get_related_lists() == {}
+    assert not model_registry.is_ready(model_registry.EMBEDDING_MANAGER)
+
+    manager = registry_manager()
+    assert model_registry.is_ready(model_registry.EMBEDDING_MANAGER)
+    manager.embedding_source = local.get_embeddings
+    # More than half of the rows changed remotely: one full rebuild
+    for remote_id in range(1, 11):
+        remote.update_item(remote_id, translation="x")
+    engine.sync()
+    expected = _expected_lists(local, manager)
+    assert {item_id: [rid for rid, _ in pairs] for item_id, pairs in local.get_related_lists().items()} == expected
+
+    # One row moves next to another: its own list and the lists around it are rewritten
+    remote.update_item(1, embedding=encode_embedding(vectors[6] + 0.01))
+    engine.sync()
+    lists = {item_id: [rid for rid, _ in pairs] for item_id, pairs in local.get_related_lists().items()}
+    assert lists[1][0] == 7 and 1 in lists[7]
+    assert lists == _expected_lists(local, manager)
+
+    # A remote delete drops the item from every list and refills the lists that had it
+    remote.delete_item(7)
+    engine.sync()
+    lists = {item_id: [rid for rid, _ in pairs] for item_id, pairs in local.get_related_lists().items()}
+    assert 7 not in lists and all(7 not in related for related in lists.values())
+    assert lists == _expected_lists(local, manager)
@@ -0,0 +1,90 @@
+import json
+import sqlite3
+
+import pytest
+
+from database import Database
+
+
+LEGACY_ROWS = [
+    ("Word", "damals", ["damals", "A2"]),
+    ("Sentence", "Ich weiß, dass er kommt.", ["als + Nebensatz", "B1"]),
+    ("Sentence", "Als ich kam, schlief er.", ["als + Nebensatz"]),
+    ("Word", "Hund", []),
+    ("Word", "Katze", None),
+]
+
+
+@pytest.fixture
+def legacy_path(tmp_path):
+    """A database written before item_tags existed: tags only as JSON text"""
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT, content TEXT, translation TEXT,
+            lemma TEXT, tags TEXT, examples TEXT, created_at TEXT, last_reviewed TEXT,
+            review_count INTEGER DEFAULT 0
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO items (type, content, tags, created_at) VALUES (?, ?, ?, '2025-01-01')",
+        [(type_, content, None if tags is None else json.dumps(tags)) for type_, content, tags in LEGACY_ROWS],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_migration_fills_item_tags(legacy_path):
+    db = Database(legacy_path)
+    assert db.c.execute("PRAGMA user_version").fetchone()[0] >= 1
+    assert db.list_tags() == [("A2", 1), ("B1", 1), ("als + Nebensatz", 2), ("damals", 1)]
+    assert db.c.execute("SELECT item_id, tag FROM item_tags WHERE item_id = 1 ORDER BY tag").fetchall() == [
+        (1, "A2"), (1, "damals")
+    ]
+    db.close()
+    # Reopening does not migrate again
+    db = Database(legacy_path)
+    assert db.c.execute("SELECT COUNT(*) FROM item_tags").fetchone()[0] == 5
+    db.close()
+
+
+def test_tag_filters_match_whole_tags(legacy_path):
+    db = Database(legacy_path)
+    # "als" is part of "damals" and "als + Nebensatz" but neither tag
+    assert db.search_items(tag_filter="als") == []
+    assert sorted(item["id"] for item in db.search_items(tag_filter="als + Nebensatz")) == [2, 3]
+    assert [item["id"] for item in db.search_items(tag_filter="damals")] == [1]
+    for weighted in (False, True):
+        assert sorted(item["id"] for item in db.get_random_items(10, tag_filter="als + Nebensatz",
+                                                                 weighted=weighted)) == [2, 3]
+        assert db.get_random_items(10, tag_filter="als", weighted=weighted) == []
+    db.close()
+
+
+def test_id_set_uses_the_tag_rows():
+    db = Database(":memory:")
+    for i in range(1, 11):
+        db.add_item("Word", f"w{i}", "", [], ["even"] if i % 2 == 0 else ["odd"])
+    count, low, high, contains, at_rank = db._id_set("even")
+    assert (count, low, high) == (5, 2, 10)
+    assert [item_id for item_id in range(1, 11) if contains(item_id)] == [2, 4, 6, 8, 10]
+    assert [at_rank(rank) for rank in range(5)] == [2, 4, 6, 8, 10]
+    assert at_rank(5) is None
+    assert db._id_set("missing")[:3] == (0, None, None)
+    assert db._id_set(None)[:3] == (10, 1, 10)
+    db.close()
+
+
+def test_tag_rows_follow_updates_and_deletes():
+    db = Database(":memory:")
+    item_id = db.add_item("Word", "Hund", "dog", [], ["A1", "Tiere", "A1"])
+    other = db.add_item("Word", "Katze", "cat", [], ["Tiere"])
+    assert db.list_tags() == [("A1", 1), ("Tiere", 2)]
+    db.update_item(item_id, tags=["B1"])
+    assert db.list_tags() == [("B1", 1), ("Tiere", 1)]
+    db.delete_item(other)
+    assert db.list_tags() == [("B1", 1)]
+    assert db.get_item(item_id)["tags"] == ["B1"]
+    db.close()
@@ -1,8 +1,11 @@
 """
 工具函数
 """
+import os
 import random
-from typing import List, Dict
+import tempfile
+import weakref
+from typing import BinaryIO, Iterable, List, Dict
 import json
 import genanki
 
@@ -83,6 +86,40 @@ def create_anki_deck(db_items: List[Dict], deck_name: str = "German Learning") -
         os.unlink(tmp.name)
         return data
 
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def spool_to_file(chunks: Iterable[bytes], suffix: str = "") -> BinaryIO:
+    """
+    把分块产出的字节逐块写入临时文件，返回从头读取该文件的对象
+    
+    写入时内存中只保留一块；返回的是 io.BufferedReader，临时文件在读取对象关闭（或被回收）后删除。
+
+    注意：st.download_button 会对文件对象调用 read()，把整个文件读进内存并保存在 Streamlit
+    的媒体文件存储中，所以下载按钮仍需要与文件大小相当的内存。这里只避免了生成 CSV 时
+    同时保留条目列表、CSV 字符串和编码后的字节，下载本身不是流式的
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        reader = open(path, "rb")
+    except BaseException:
+        _remove_quietly(path)
+        raise
+    try:
+        # POSIX 上文件删除后已打开的对象仍可读取
+        os.remove(path)
+    except OSError:
+        weakref.finalize(reader, _remove_quietly, path)
+    return reader
+
+
 def batch_import_from_text(text: str, type_filter: str = "单词") -> List[Dict]:
     """从文本批量导入（每行一个条目）"""
     lines = [line.strip() for line in text.strip().split('\n') if line.strip()]